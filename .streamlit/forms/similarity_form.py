@@ -1,19 +1,16 @@
+import os
+import sys
 import streamlit as st
 import pandas as pd
-import gspread
-from oauth2client.service_account import ServiceAccountCredentials
 
-# Setup Google Sheets API
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+from sheets_gateway import get_gateway  # noqa: E402
+
+# Setup Google Sheets API (shared gateway, see sheets_gateway.py)
 @st.cache_resource
 def get_gsheet_data():
-    scope = ["https://spreadsheets.google.com/feeds",
-             "https://www.googleapis.com/auth/drive"]
-
-    creds = ServiceAccountCredentials.from_json_keyfile_name("gsheet_key.json", scope)
-    client = gspread.authorize(creds)
-
-    sheet = client.open("Similarity_MCQ").sheet1
-    data = sheet.get_all_records()
+    gw = get_gateway(service_account_file="gsheet_key.json")
+    data = gw.get_all_records("Similarity_MCQ")   # spreadsheet title, first worksheet
     return pd.DataFrame(data)
 
 def main():
@@ -0,0 +1,108 @@
+# benchmarks/bench_save_bulk_responses.py
+"""
+Round trips and latency per submission for db.save_bulk_responses.
+
+Compares the old per-row write path (one student lookup + commit per row)
+against the current set-based path. Network latency to the remote database
+is simulated by sleeping on every statement sent to the driver.
+
+Usage (from repo root):
+    DATABASE_URL=sqlite:////tmp/bench.db python benchmarks/bench_save_bulk_responses.py
+    python benchmarks/bench_save_bulk_responses.py --questions 40 --rtt-ms 20 --runs 5
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+if not os.environ.get("DATABASE_URL"):
+    os.environ["DATABASE_URL"] = "sqlite:///" + os.path.join(tempfile.mkdtemp(), "bench.db")
+
+from sqlalchemy import event  # noqa: E402
+
+import db  # noqa: E402
+
+
+def legacy_save_bulk_responses(rows):
+    """Per-row write path as it was before the set-based rewrite (8-tuples only)."""
+    session = db.SessionLocal()
+    try:
+        responses = []
+        for student_name, email, class_code, subject, subtopic, qno, s_ans, c_ans in rows:
+            student = session.query(db.Student).filter_by(email=email).first()
+            if not student:
+                student = db.Student(name=student_name, email=email, class_code=class_code)
+                session.add(student)
+                session.commit()
+                session.refresh(student)
+            responses.append(db.Response(
+                student_id=student.id, subject=subject, subtopic=subtopic, question_no=qno,
+                student_answer=s_ans, correct_answer=c_ans, is_correct=(s_ans == c_ans),
+            ))
+        if responses:
+            session.bulk_save_objects(responses)
+            session.commit()
+    finally:
+        session.close()
+
+
+class RoundTripMeter:
+    """Counts statements hitting the driver and sleeps `rtt` seconds for each."""
+
+    def __init__(self, engine, rtt):
+        self.count = 0
+        self.rtt = rtt
+        event.listen(engine, "before_cursor_execute", self._on_execute)
+        event.listen(engine, "commit", self._on_execute)
+
+    def _on_execute(self, *args, **kwargs):
+        self.count += 1
+        if self.rtt:
+            time.sleep(self.rtt)
+
+
+def make_submission(tag, n_questions, n_students):
+    rows = []
+    for s in range(n_students):
+        for q in range(1, n_questions + 1):
+            rows.append((
+                f"Student {tag}-{s}", f"{tag}-{s}@bench.local", "BENCH", "Mathematics", "bench_subtopic",
+                f"Q{q}", "A" if q % 3 else "B", "A",
+            ))
+    return rows
+
+
+def run(fn, label, meter, args):
+    trips, elapsed = [], []
+    for i in range(args.runs):
+        # brand-new student each run: worst case for both paths
+        rows = make_submission(f"{label}-{i}", args.questions, args.students)
+        meter.count = 0
+        t0 = time.perf_counter()
+        fn(rows)
+        elapsed.append(time.perf_counter() - t0)
+        trips.append(meter.count)
+    avg_trips = sum(trips) / len(trips)
+    avg_ms = 1000 * sum(elapsed) / len(elapsed)
+    print(f"{label:<8} round trips/submission: {avg_trips:6.1f}   latency/submission: {avg_ms:8.1f} ms")
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--questions", type=int, default=40)
+    ap.add_argument("--students", type=int, default=1, help="distinct students per submission")
+    ap.add_argument("--rtt-ms", type=float, default=20.0, help="simulated round-trip time per statement")
+    ap.add_argument("--runs", type=int, default=5)
+    args = ap.parse_args()
+
+    meter = RoundTripMeter(db.engine, args.rtt_ms / 1000.0)
+    print(f"{args.questions} questions x {args.students} student(s), simulated RTT {args.rtt_ms:.0f} ms, "
+          f"{args.runs} runs, {db.engine.url.get_backend_name()}")
+    run(legacy_save_bulk_responses, "before", meter, args)
+    run(db.save_bulk_responses, "after", meter, args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+# benchmarks/bench_sheets_gateway.py
+"""
+Offline load test for sheets_gateway: a burst of students opening the same
+quiz link at once.
+
+Every simulated student reads the Register and the question bank (titles +
+one batch_get) the way form_page.py's loaders do. The run compares calling
+the backend directly against going through the gateway, on a
+FakeSheetsBackend with simulated latency and an optional 429 rate.
+
+Usage (from repo root):
+    python benchmarks/bench_sheets_gateway.py
+    python benchmarks/bench_sheets_gateway.py --students 80 --latency-ms 300 --error-rate 0.05
+"""
+import argparse
+import os
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sheets_gateway import FakeSheetsBackend, SheetsGateway  # noqa: E402
+
+REGISTER_URL = "fake://register"
+BANK_URL = "fake://bank"
+
+
+def make_books(students, questions):
+    register = [["Tuition_Code", "Student_ID", "StudentName", "Student_Email"]]
+    register += [["T1", f"S{i}", f"Student {i}", f"s{i}@example.com"] for i in range(students)]
+    main = [["SubtopicID", "QuestionID", "QuestionText", "Option_A", "Option_B", "CorrectOption"]]
+    main += [["sub1", f"Q{i}", f"Question {i}", "a", "b", "a"] for i in range(questions)]
+    remedial = [["MainQuestionID", "RemedialQuestionID", "QuestionText", "Option_A", "Option_B", "CorrectOption"]]
+    remedial += [[f"Q{i}", f"R{i}", f"Remedial {i}", "a", "b", "b"] for i in range(questions)]
+    return {REGISTER_URL: {"Register": register}, BANK_URL: {"Main": main, "Remedial": remedial}}
+
+
+def open_quiz(api):
+    api.get_all_records(REGISTER_URL)
+    titles = api.titles(BANK_URL)
+    api.batch_get(BANK_URL, tuple("'%s'" % t for t in titles))
+
+
+def run(api, students):
+    errors = []
+    barrier = threading.Barrier(students)
+
+    def student():
+        barrier.wait()
+        try:
+            open_quiz(api)
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=student) for _ in range(students)]
+    t0 = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return time.perf_counter() - t0, errors
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--students", type=int, default=40)
+    ap.add_argument("--questions", type=int, default=30)
+    ap.add_argument("--latency-ms", type=float, default=200.0)
+    ap.add_argument("--error-rate", type=float, default=0.0)
+    args = ap.parse_args()
+
+    books = make_books(args.students, args.questions)
+    latency = args.latency_ms / 1000.0
+
+    direct = FakeSheetsBackend(books, latency=latency, error_rate=args.error_rate)
+    elapsed, errors = run(direct, args.students)
+    print(f"direct : {sum(direct.calls.values()):4d} backend calls  {elapsed:6.2f}s  {len(errors)} errors")
+
+    backend = FakeSheetsBackend(books, latency=latency, error_rate=args.error_rate)
+    gateway = SheetsGateway(backend)
+    elapsed, errors = run(gateway, args.students)
+    print(f"gateway: {sum(backend.calls.values()):4d} backend calls  {elapsed:6.2f}s  {len(errors)} errors")
+    print(f"         {gateway.stats()}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,221 @@
+# benchmarks/check_mailer.py
+"""
+Offline check for mailer.Mailer against a local SMTP stand-in.
+
+Starts a small threaded SMTP server on 127.0.0.1 whose replies can be
+scripted per scenario, points a Mailer at it and checks:
+  - pooled reuse: one connection carries every message of a burst
+  - reconnect: the server drops the connection, the next send reconnects
+  - retry: a 421 reply is retried and delivered
+  - fail fast: 550 on DATA, 550 on RCPT and 535 on AUTH are not retried
+
+No extra packages (the stand-in speaks just enough SMTP for smtplib).
+Exits non-zero if a check fails; a couple of scenarios wait out one retry
+backoff (~2 s).
+
+Usage (from repo root):
+    python benchmarks/check_mailer.py
+"""
+import os
+import socketserver
+import sys
+import threading
+import time
+from collections import deque
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from mailer import Mailer  # noqa: E402
+
+
+class StandInSMTP(socketserver.ThreadingTCPServer):
+    """
+    SMTP server for tests. Counts connections and accepted messages.
+
+    data_replies: replies to hand out for DATA, in order (then "250 OK")
+    rcpt_reply / auth_reply: fixed replies for RCPT TO / AUTH
+    drop_after: close the connection after this many accepted messages on it
+    """
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, data_replies=(), rcpt_reply="250 OK", auth_reply="235 OK", drop_after=0):
+        super().__init__(("127.0.0.1", 0), _Session)
+        self.data_replies = deque(data_replies)
+        self.rcpt_reply = rcpt_reply
+        self.auth_reply = auth_reply
+        self.drop_after = drop_after
+        self.connections = 0
+        self.messages = []
+        self.lock = threading.Lock()
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+
+    @property
+    def port(self):
+        return self.server_address[1]
+
+    def next_data_reply(self):
+        with self.lock:
+            return self.data_replies.popleft() if self.data_replies else "250 OK"
+
+    def close(self):
+        self.shutdown()
+        self.server_close()
+
+
+class _Session(socketserver.StreamRequestHandler):
+    def reply(self, line):
+        self.wfile.write((line + "\r\n").encode("ascii"))
+
+    def handle(self):
+        server = self.server
+        with server.lock:
+            server.connections += 1
+        accepted = 0
+        self.reply("220 stand-in ready")
+        while True:
+            raw = self.rfile.readline()
+            if not raw:
+                return
+            cmd = raw.decode("ascii", "replace").strip()
+            verb = cmd.split(" ", 1)[0].upper()
+            if verb == "EHLO":
+                self.reply("250-stand-in")
+                self.reply("250 AUTH PLAIN")
+            elif verb == "HELO":
+                self.reply("250 stand-in")
+            elif verb == "AUTH":
+                self.reply(server.auth_reply)
+            elif verb == "MAIL":
+                self.reply("250 OK")
+            elif verb == "RCPT":
+                self.reply(server.rcpt_reply)
+            elif verb == "DATA":
+                self.reply("354 end with <CRLF>.<CRLF>")
+                lines = []
+                while True:
+                    line = self.rfile.readline()
+                    if not line or line == b".\r\n":
+                        break
+                    lines.append(line)
+                reply = server.next_data_reply()
+                self.reply(reply)
+                if reply.startswith("250"):
+                    with server.lock:
+                        server.messages.append(b"".join(lines))
+                    accepted += 1
+                    if server.drop_after and accepted >= server.drop_after:
+                        return   # hang up without QUIT, like an idle-timeout on the server
+            elif verb == "RSET" or verb == "NOOP":
+                self.reply("250 OK")
+            elif verb == "QUIT":
+                self.reply("221 bye")
+                return
+            else:
+                self.reply("502 not implemented")
+
+
+def make_mailer(server, **overrides):
+    cfg = {
+        "server": "127.0.0.1", "port": server.port, "starttls": False,
+        "from_email": "quiz@example.com", "pool_size": 1, "rate_per_minute": 6000,
+        "max_attempts": 3, "timeout": 5,
+    }
+    cfg.update(overrides)
+    return Mailer(config=cfg)
+
+
+def send_all(mailer, count, timeout=20.0):
+    ids = [mailer.send(f"student{i}@example.com", f"Report {i}", "Attached.",
+                       attachments=[("report.pdf", b"%PDF-1.4 stand-in", "application/pdf")])
+           for i in range(count)]
+    mailer.flush(timeout)
+    return ids
+
+
+def records(mailer, delivery_id):
+    return [r for r in mailer.deliveries(1000) if r["id"] == delivery_id]
+
+
+# =============================================================
+# Scenarios
+# =============================================================
+
+def check_pooled_reuse():
+    server = StandInSMTP()
+    mailer = make_mailer(server)
+    try:
+        ids = send_all(mailer, 5)
+        assert all(mailer.status(i) == "sent" for i in ids), mailer.deliveries()
+        assert len(server.messages) == 5, server.messages
+        assert server.connections == 1, f"{server.connections} connections for 5 messages"
+    finally:
+        mailer.stop(1)
+        server.close()
+
+
+def check_reconnect_after_drop():
+    server = StandInSMTP(drop_after=1)
+    mailer = make_mailer(server)
+    try:
+        first, second = send_all(mailer, 2)
+        assert mailer.status(first) == "sent" and mailer.status(second) == "sent", mailer.deliveries()
+        assert len(server.messages) == 2, server.messages
+        assert server.connections == 2, f"{server.connections} connections"
+    finally:
+        mailer.stop(1)
+        server.close()
+
+
+def check_retry_on_4xx():
+    server = StandInSMTP(data_replies=["421 try again later"])
+    mailer = make_mailer(server)
+    try:
+        (delivery,) = send_all(mailer, 1)
+        assert mailer.status(delivery) == "sent", mailer.deliveries()
+        assert records(mailer, delivery)[-1]["attempts"] == 2, records(mailer, delivery)
+        assert len(server.messages) == 1
+    finally:
+        mailer.stop(1)
+        server.close()
+
+
+def check_fail_fast(name, server, **overrides):
+    mailer = make_mailer(server, **overrides)
+    try:
+        (delivery,) = send_all(mailer, 1)
+        last = records(mailer, delivery)[-1]
+        assert last["status"] == "failed" and last["attempts"] == 1, f"{name}: {last}"
+        assert not server.messages
+    finally:
+        mailer.stop(1)
+        server.close()
+
+
+def main():
+    checks = [
+        ("pooled reuse", check_pooled_reuse),
+        ("reconnect after drop", check_reconnect_after_drop),
+        ("retry on 421", check_retry_on_4xx),
+        ("fail fast on 550 DATA",
+         lambda: check_fail_fast("550 DATA", StandInSMTP(data_replies=["550 rejected"]))),
+        ("fail fast on 550 RCPT",
+         lambda: check_fail_fast("550 RCPT", StandInSMTP(rcpt_reply="550 no such user"))),
+        ("fail fast on 535 AUTH",
+         lambda: check_fail_fast("535 AUTH", StandInSMTP(auth_reply="535 bad credentials"),
+                                 username="quiz", password="wrong")),
+    ]
+    failed = 0
+    for name, check in checks:
+        t0 = time.perf_counter()
+        try:
+            check()
+            print(f"ok    {name:<24} {time.perf_counter() - t0:5.2f}s")
+        except AssertionError as e:
+            failed += 1
+            print(f"FAIL  {name:<24} {e}")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
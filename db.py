@@ -1,20 +1,68 @@
-from sqlalchemy import create_engine, Column, Integer, String, Boolean, ForeignKey
+from sqlalchemy import create_engine, Column, Integer, String, Boolean, ForeignKey, Index
 from sqlalchemy.orm import sessionmaker, declarative_base, relationship
+import json
+import os
 import streamlit as st
 import pandas as pd
-from sqlalchemy import func
-from sqlalchemy import Date, DateTime, Float
+from sqlalchemy import func, insert, select, update, or_, inspect, text, case, true
+from sqlalchemy import Date, DateTime, Float, Text
+from sqlalchemy.exc import IntegrityError
 from datetime import datetime, date
 
+from grading import grade_pairs
+from query_cache import VersionedQueryCache
+
 
 # =============================================================
 # Database setup
 # =============================================================
-DATABASE_URL = st.secrets["db"]["url"]
+# DATABASE_URL env var lets scripts (benchmarks, maintenance jobs) run outside Streamlit.
+DATABASE_URL = os.environ.get("DATABASE_URL") or st.secrets["db"]["url"]
 engine = create_engine(DATABASE_URL, pool_pre_ping=True)
 SessionLocal = sessionmaker(bind=engine)
 Base = declarative_base()
 
+
+def normalize_key(value) -> str:
+    """Lower-cased, trimmed lookup key stored in the *_norm columns."""
+    return str(value or "").strip().lower()
+
+
+# =============================================================
+# Read-helper cache (see query_cache.py)
+# =============================================================
+# Versions are per ("class", class_code_norm, subject_norm) and, for helpers
+# keyed by student rather than batch, per ("student", email_norm, subject_norm).
+# save_bulk_responses bumps both after commit. Sheet syncs run in another
+# process (manage.py sync-sheets), so the content hashes in sheet_sync act as
+# a generation: when one changes, this process drops its cache.
+def _mirror_generation():
+    db = SessionLocal()
+    try:
+        return tuple(db.execute(select(SheetSync.source, SheetSync.content_hash).order_by(SheetSync.source)).all())
+    finally:
+        db.close()
+
+
+query_cache = VersionedQueryCache(max_entries=512, max_age=300, generation=_mirror_generation, check_every=30)
+
+
+def _class_scope(batch_code, subject, *args, **kwargs):
+    return [("class", normalize_key(batch_code), normalize_key(subject))]
+
+
+def _student_scope(student_email, subject, *args, **kwargs):
+    return [("student", normalize_key(student_email), normalize_key(subject))]
+
+
+def _class_student_scope(batch_code, subject, student_email, *args, **kwargs):
+    return _class_scope(batch_code, subject) + _student_scope(student_email, subject)
+
+
+def query_cache_stats() -> dict:
+    """Hit/miss/eviction counters of the read-helper cache."""
+    return query_cache.stats()
+
 # =============================================================
 # ORM Models
 # =============================================================
@@ -24,6 +72,9 @@ class Student(Base):
     name = Column(String(100))
     email = Column(String(100), unique=True, index=True)
     class_code = Column(String(20))
+    # normalized lookup keys (normalize_key), filled at write time
+    email_norm = Column(String(100), index=True)
+    class_code_norm = Column(String(20), index=True)
 
     responses = relationship("Response", back_populates="student", cascade="all, delete-orphan")
 
@@ -45,6 +96,25 @@ class Response(Base):
     student = relationship("Student", back_populates="responses")
     question_id = Column(Integer, ForeignKey("questions.id"))
     question = relationship("Question", back_populates="responses")
+    # normalized lookup keys (normalize_key), filled at write time.
+    # class_code_norm is the student's batch at submission time, denormalized so
+    # dashboard filters are covered by a single composite index.
+    class_code_norm = Column(String(20))
+    subject_norm = Column(String(100))
+    subtopic_norm = Column(String(100))
+    # watermark for delta fetches (get_performance_delta); id is the cursor
+    created_at = Column(DateTime, default=datetime.utcnow, index=True)
+    # client-generated id of the quiz submission; (submission_id, question_no) is
+    # unique so a double submit or a retried write-queue job never duplicates rows
+    submission_id = Column(String(36))
+
+    __table_args__ = (
+        Index("ix_responses_class_subject_subtopic", "class_code_norm", "subject_norm", "subtopic_norm"),
+        Index("ix_responses_class_subject_id", "class_code_norm", "subject_norm", "id"),
+        Index("ix_responses_student_subject_subtopic", "student_id", "subject_norm", "subtopic_norm"),
+        Index("ix_responses_class_subject_quiz", "class_code_norm", "subject_norm", "quiz_id"),
+        Index("uq_responses_submission_question", "submission_id", "question_no", unique=True),
+    )
 
 class DashboardNotify(Base):
     __tablename__ = "dashboard_notify"
@@ -54,6 +124,13 @@ class DashboardNotify(Base):
     subtopic = Column(String(100), index=True)
     notified = Column(Boolean, default=False)
 
+    __table_args__ = (
+        # one row per class quiz; mark_and_check_teacher_notified relies on it.
+        # ensure_schema() drops older duplicate rows before creating it.
+        Index("uq_dashboard_notify_key", "batch_code", "subject", "subtopic", unique=True,
+              info={"dedupe_on_create": True}),
+    )
+
 class Question(Base):
     __tablename__ = "questions"
     id = Column(Integer, primary_key=True, index=True)
@@ -63,6 +140,23 @@ class Question(Base):
     question_text = Column(String(1000))
     # optional relationship
     responses = relationship("Response", back_populates="question")
+    # mirror of a bank sheet row (sheet_sync.py). subject is the bank key
+    # (e.g. "ssc_maths_geometry"), kind "Main" or "Remedial", source_key the
+    # question id as compiled by quiz_model; data is the raw row as JSON.
+    bank = Column(String(100))
+    kind = Column(String(20))
+    source_key = Column(String(100))
+    main_question_id = Column(String(50))
+    row_no = Column(Integer)
+    data = Column(Text)
+    row_hash = Column(String(40))
+    active = Column(Boolean, default=True)
+    synced_at = Column(DateTime)
+
+    __table_args__ = (
+        Index("uq_questions_source", "bank", "kind", "source_key", unique=True),
+        Index("ix_questions_bank_kind_row", "bank", "kind", "active", "row_no"),
+    )
            
 class Observation(Base):
     __tablename__ = "observations"
@@ -85,6 +179,85 @@ class Observation(Base):
                              
     student = relationship("Student", backref="observations")
 
+
+class PerformanceRollup(Base):
+    """
+    Correct/incorrect counters per (batch, subject, subtopic, student, quiz),
+    maintained in the same transaction as save_bulk_responses so dashboards
+    never scan raw responses. quiz_key is "" for responses without a quiz_id.
+    Rebuild/check with:  python manage.py rebuild-rollup
+    """
+    __tablename__ = "performance_rollup"
+    id = Column(Integer, primary_key=True)
+    class_code_norm = Column(String(20), nullable=False)
+    subject_norm = Column(String(100), nullable=False)
+    subtopic_norm = Column(String(100), nullable=False)
+    student_id = Column(Integer, ForeignKey("students.id", ondelete="CASCADE"), nullable=False)
+    quiz_key = Column(String(100), nullable=False, default="")
+    # display values as first submitted
+    subject = Column(String(100))
+    subtopic = Column(String(100))
+    correct = Column(Integer, nullable=False, default=0)
+    incorrect = Column(Integer, nullable=False, default=0)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    __table_args__ = (
+        Index("uq_rollup_key", "class_code_norm", "subject_norm", "subtopic_norm", "student_id", "quiz_key",
+              unique=True),
+        Index("ix_rollup_student", "student_id", "subject_norm"),
+    )
+
+class Attempt(Base):
+    """
+    One row per (student, subject, subtopic, attempt_type). The unique key is
+    what enforces a single Main attempt: it is checked with a point lookup at
+    verification (has_attempted) and written in the same transaction as the
+    submission's responses (save_submissions), so a duplicate is rejected.
+    The student is identified by register keys (Tuition_Code, Student_ID).
+    """
+    __tablename__ = "attempts"
+    id = Column(Integer, primary_key=True)
+    tuition_code_norm = Column(String(20), nullable=False)
+    student_ref_norm = Column(String(50), nullable=False)
+    subject_norm = Column(String(100), nullable=False)
+    subtopic_norm = Column(String(100), nullable=False)
+    attempt_type = Column(String(20), nullable=False)
+    student_email = Column(String(100))
+    submission_id = Column(String(36))  # Response.submission_id of the accepted submission
+    started_at = Column(DateTime)       # when the student was verified
+    submitted_at = Column(DateTime)     # when the form was submitted
+    created_at = Column(DateTime, default=datetime.utcnow)   # when it reached the DB
+
+    __table_args__ = (
+        Index("uq_attempt_key", "tuition_code_norm", "student_ref_norm", "subject_norm", "subtopic_norm",
+              "attempt_type", unique=True),
+    )
+
+class RegisterEntry(Base):
+    """Mirror of the Register sheet (sheet_sync.py), one row per (Tuition_Code, Student_ID)."""
+    __tablename__ = "register_entries"
+    id = Column(Integer, primary_key=True)
+    tuition_code = Column(String(50), nullable=False)   # stripped, as the register index keys it
+    student_id = Column(String(50), nullable=False)
+    row_no = Column(Integer)
+    data = Column(Text)                                   # the sheet row as JSON
+    row_hash = Column(String(40))
+    active = Column(Boolean, default=True)
+    synced_at = Column(DateTime)
+
+    __table_args__ = (
+        Index("uq_register_key", "tuition_code", "student_id", unique=True),
+    )
+
+class SheetSync(Base):
+    """Last synced content hash per mirrored sheet, so an unchanged sheet costs no diff."""
+    __tablename__ = "sheet_sync"
+    id = Column(Integer, primary_key=True)
+    source = Column(String(200), nullable=False, unique=True)   # "bank:<key>:Main", "register"
+    content_hash = Column(String(40))
+    row_count = Column(Integer)
+    synced_at = Column(DateTime)
+
 # NOTE: create_all() will create missing tables, but it WILL NOT add new columns
 # to existing tables. If you are adding quiz_id to an existing database, run a
 # migration (Alembic) or execute an ALTER TABLE manually (examples below).
@@ -97,58 +270,892 @@ Base.metadata.create_all(bind=engine)
 #   ALTER TABLE responses ADD COLUMN quiz_id VARCHAR(100);
 #   CREATE INDEX ix_responses_quiz_id ON responses (quiz_id);
 # SQLite (dev-only): use a migration tool (Alembic) or recreate table.
+#
+# For columns/indexes added after the first deploy (e.g. the *_norm keys) run
+#   python manage.py migrate
+# once per deploy; it also fills the new keys for existing rows, and on first run
+# builds the performance rollup and backfills attempts (see ensure_schema).
+
+
+def ensure_schema():
+    """
+    Add model columns and indexes missing from existing tables, then fill the
+    *_norm lookup columns of rows written before they existed (the db helpers
+    filter on them, so old rows are invisible until this runs), build the
+    performance rollup if it has never been built, and record attempts for
+    submissions saved before the attempts table existed.
+    Only additive (ALTER TABLE ... ADD COLUMN / CREATE INDEX / UPDATE of NULL
+    keys); never drops anything and is safe to re-run. Returns the actions taken.
+    """
+    Base.metadata.create_all(bind=engine)
+    actions = []
+    insp = inspect(engine)
+    with engine.begin() as conn:
+        for table in Base.metadata.sorted_tables:
+            existing_cols = {c["name"] for c in insp.get_columns(table.name)}
+            for col in table.columns:
+                if col.name in existing_cols:
+                    continue
+                col_type = col.type.compile(dialect=engine.dialect)
+                conn.execute(text(f"ALTER TABLE {table.name} ADD COLUMN {col.name} {col_type}"))
+                actions.append(f"added column {table.name}.{col.name}")
+            existing_idx = {i["name"] for i in insp.get_indexes(table.name)}
+            for idx in table.indexes:
+                if idx.name not in existing_idx:
+                    if idx.unique and idx.info.get("dedupe_on_create"):
+                        removed = _dedupe_rows(conn, table, [c.name for c in idx.columns])
+                        if removed:
+                            actions.append(f"removed {removed} duplicate row(s) from {table.name}")
+                    idx.create(bind=conn)
+                    actions.append(f"created index {idx.name}")
+    students, responses = backfill_normalized_keys()
+    if students or responses:
+        actions.append(f"filled *_norm keys for {students} student(s), {responses} response(s)")
+    if _rollup_missing():
+        # dashboards read only the rollup; build it from responses saved before it existed
+        written, mismatches = rebuild_performance_rollup()
+        actions.append(f"built performance_rollup: {written} row(s), {len(mismatches)} mismatch(es)")
+    if _attempts_missing():
+        # has_attempted reads only the attempts table; record submissions saved before it existed
+        inserted, unmatched = backfill_attempts()
+        actions.append(f"recorded {inserted} earlier Main attempt(s)"
+                       + (f"; {unmatched} not in the Register mirror (run sync-sheets, then backfill-attempts)"
+                          if unmatched else ""))
+    return actions
+
+
+def _attempts_missing() -> bool:
+    """True when responses exist but no attempt has been recorded yet (never backfilled)."""
+    db = SessionLocal()
+    try:
+        has_attempts = db.execute(select(Attempt.id).limit(1)).first() is not None
+        return not has_attempts and db.execute(select(Response.id).limit(1)).first() is not None
+    finally:
+        db.close()
+
+
+def backfill_attempts():
+    """
+    Record a Main attempt for every (student, subject, subtopic) that already
+    has responses, so students who submitted before the attempts table existed
+    can't take the quiz again. Attempts are keyed by the register Student_ID,
+    which responses don't store: students are matched through the Register
+    mirror (sync-sheets) on tuition code + email. One grouped SELECT over
+    responses and one ignore-duplicates insert; safe to re-run.
+    Returns (attempts_inserted, groups_not_in_register).
+    """
+    db = SessionLocal()
+    try:
+        register = {}
+        for tuition_code, student_ref, data in db.execute(
+            select(RegisterEntry.tuition_code, RegisterEntry.student_id, RegisterEntry.data)
+        ):
+            email = normalize_key((json.loads(data) if data else {}).get("Student_Email"))
+            if email:
+                register[(normalize_key(tuition_code), email)] = student_ref
+
+        group_cols = (Response.class_code_norm, Student.email_norm, Student.email,
+                      Response.subject_norm, Response.subtopic_norm)
+        groups = db.execute(
+            select(*group_cols, func.min(Response.created_at), func.min(Response.submission_id))
+            .join(Student, Student.id == Response.student_id)
+            .group_by(*group_cols)
+        ).all()
+
+        rows, unmatched = [], 0
+        for class_norm, email_norm, email, subject_norm, subtopic_norm, first_at, submission_id in groups:
+            student_ref = register.get((class_norm or "", email_norm or normalize_key(email)))
+            if student_ref is None:
+                unmatched += 1
+                continue
+            row = _attempt_key(class_norm, student_ref, subject_norm, subtopic_norm, "Main")
+            row.update(student_email=email, submission_id=submission_id,
+                       submitted_at=first_at, created_at=datetime.utcnow())
+            rows.append(row)
+
+        count = select(func.count(Attempt.id))
+        before = db.execute(count).scalar()
+        _insert_ignore_duplicates(db, Attempt, rows, list(_attempt_key("", "", "", "", "")))
+        inserted = db.execute(count).scalar() - before
+        db.commit()
+        return inserted, unmatched
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+
+def _rollup_missing() -> bool:
+    """True when responses exist but PerformanceRollup has no rows (never built)."""
+    db = SessionLocal()
+    try:
+        has_rollup = db.execute(select(PerformanceRollup.id).limit(1)).first() is not None
+        return not has_rollup and db.execute(select(Response.id).limit(1)).first() is not None
+    finally:
+        db.close()
+
+
+def _dedupe_rows(conn, table, cols):
+    """Delete all but the lowest-id row per non-NULL value of `cols`."""
+    not_null = " AND ".join(f"{c} IS NOT NULL" for c in cols)
+    group = ", ".join(cols)
+    # derived table so MySQL accepts a subquery on the table being deleted from
+    return conn.execute(text(
+        f"DELETE FROM {table.name} WHERE {not_null} AND id NOT IN ("
+        f"SELECT keep_id FROM (SELECT MIN(id) AS keep_id FROM {table.name} "
+        f"WHERE {not_null} GROUP BY {group}) AS keep)"
+    )).rowcount
+
+
+def backfill_normalized_keys():
+    """
+    Fill the *_norm lookup columns for rows written before they existed.
+    Set-based UPDATEs; safe to re-run. Returns (students_updated, responses_updated).
+    """
+    db = SessionLocal()
+    try:
+        students = db.execute(
+            update(Student)
+            .where(or_(Student.email_norm.is_(None), Student.class_code_norm.is_(None)))
+            .values(email_norm=func.lower(func.trim(Student.email)),
+                    class_code_norm=func.lower(func.trim(Student.class_code)))
+            .execution_options(synchronize_session=False)
+        ).rowcount
+        student_class = (
+            select(Student.class_code_norm)
+            .where(Student.id == Response.student_id)
+            .scalar_subquery()
+        )
+        responses = db.execute(
+            update(Response)
+            .where(or_(Response.class_code_norm.is_(None),
+                       Response.subject_norm.is_(None),
+                       Response.subtopic_norm.is_(None)))
+            .values(class_code_norm=student_class,
+                    subject_norm=func.lower(func.trim(Response.subject)),
+                    subtopic_norm=func.lower(func.trim(Response.subtopic)))
+            .execution_options(synchronize_session=False)
+        ).rowcount
+        db.commit()
+        query_cache.clear()
+        return students, responses
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+
+def backfill_question_ids():
+    """
+    Link responses saved without a question_id (before it was filled, or before
+    their bank was synced) to the questions mirror. One UPDATE per resolved
+    (subject, subtopic, question_no); safe to re-run. Returns rows updated.
+    Stored responses don't record their bank, so it is looked up by subject.
+    """
+    db = SessionLocal()
+    try:
+        groups = db.execute(
+            select(Response.subject, Response.subtopic, Response.question_no)
+            .where(Response.question_id.is_(None)).distinct()
+        ).all()
+        _question_misses.clear()
+        ids = _resolve_question_ids(
+            db, [{"subject": s, "subtopic": t, "question_no": q} for s, t, q in groups])
+        updated = 0
+        for (subject, subtopic, qno), qid in zip(groups, ids):
+            if qid is None:
+                continue
+            updated += db.execute(
+                update(Response)
+                .where(Response.question_id.is_(None), Response.subject == subject,
+                       Response.subtopic == subtopic, Response.question_no == qno)
+                .values(question_id=qid)
+                .execution_options(synchronize_session=False)
+            ).rowcount
+        db.commit()
+        if updated:
+            query_cache.clear()
+        return updated
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+
+def _rollup_source_query():
+    """Rollup rows recomputed from raw responses (INSERT ... SELECT source)."""
+    class_key = func.coalesce(Response.class_code_norm, "")
+    quiz_key = func.coalesce(Response.quiz_id, "")
+    return (
+        select(
+            class_key.label("class_code_norm"),
+            func.coalesce(Response.subject_norm, "").label("subject_norm"),
+            func.coalesce(Response.subtopic_norm, "").label("subtopic_norm"),
+            Response.student_id,
+            quiz_key.label("quiz_key"),
+            func.min(Response.subject).label("subject"),
+            func.min(Response.subtopic).label("subtopic"),
+            _correct_count().label("correct"),
+            _incorrect_count().label("incorrect"),
+        )
+        .where(Response.student_id.isnot(None))
+        .group_by(class_key, Response.subject_norm, Response.subtopic_norm, Response.student_id, quiz_key)
+    )
+
+
+def check_performance_rollup():
+    """
+    Compare PerformanceRollup with counts recomputed from raw responses.
+    Returns a list of (key, expected, actual) mismatches; empty means consistent.
+    """
+    db = SessionLocal()
+    try:
+        expected = {
+            tuple(r[:5]): (int(r.correct), int(r.incorrect))
+            for r in db.execute(_rollup_source_query()).all()
+        }
+        R = PerformanceRollup
+        actual = {
+            (r[0], r[1], r[2], r[3], r[4]): (int(r[5]), int(r[6]))
+            for r in db.execute(select(
+                R.class_code_norm, R.subject_norm, R.subtopic_norm, R.student_id, R.quiz_key, R.correct, R.incorrect
+            )).all()
+        }
+        mismatches = []
+        for key in expected.keys() | actual.keys():
+            if expected.get(key) != actual.get(key):
+                mismatches.append((key, expected.get(key), actual.get(key)))
+        return mismatches
+    finally:
+        db.close()
+
+
+def rebuild_performance_rollup():
+    """
+    Regenerate PerformanceRollup from raw responses in one transaction, then
+    check it. Returns (rows_written, mismatches).
+    """
+    cols = ["class_code_norm", "subject_norm", "subtopic_norm", "student_id", "quiz_key",
+            "subject", "subtopic", "correct", "incorrect"]
+    db = SessionLocal()
+    try:
+        db.execute(PerformanceRollup.__table__.delete())
+        db.execute(insert(PerformanceRollup).from_select(cols, _rollup_source_query()))
+        written = db.query(func.count(PerformanceRollup.id)).scalar()
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+    query_cache.clear()
+    return written, check_performance_rollup()
+
+
+# =============================================================
+# Dialect-aware upsert
+# =============================================================
+
+def _dialect_insert(table):
+    """Return the dialect's INSERT construct supporting upserts, or None."""
+    name = engine.dialect.name
+    if name == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert as dialect_insert
+    elif name in ("mysql", "mariadb"):
+        from sqlalchemy.dialects.mysql import insert as dialect_insert
+    elif name == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert as dialect_insert
+    else:
+        return None
+    return dialect_insert(table)
+
+
+def _upsert_increment(db, model, rows, key_cols, counter_cols):
+    """
+    Batch insert `rows` (list of dicts); on a key conflict add counter_cols to
+    the existing row instead. One executemany on PostgreSQL/MySQL/SQLite.
+    """
+    if not rows:
+        return
+    table = model.__table__
+    stmt = _dialect_insert(table)
+    if stmt is None:
+        # generic fallback: UPDATE, then INSERT when no row matched
+        for row in rows:
+            cond = [table.c[k] == row[k] for k in key_cols]
+            res = db.execute(
+                update(table).where(*cond).values({c: table.c[c] + row[c] for c in counter_cols})
+            )
+            if not res.rowcount:
+                db.execute(insert(table), [row])
+        return
+    if engine.dialect.name in ("mysql", "mariadb"):
+        stmt = stmt.on_duplicate_key_update({c: table.c[c] + stmt.inserted[c] for c in counter_cols})
+    else:
+        stmt = stmt.on_conflict_do_update(
+            index_elements=key_cols,
+            set_={c: table.c[c] + stmt.excluded[c] for c in counter_cols},
+        )
+    db.execute(stmt, rows)
+
+
+def _is_duplicate_key(exc) -> bool:
+    """True if an IntegrityError is a unique-key violation (not a NOT NULL / FK failure)."""
+    orig = getattr(exc, "orig", None)
+    code = getattr(orig, "pgcode", None) or getattr(orig, "sqlstate", None)
+    if code:
+        return code == "23505"
+    errno = getattr(orig, "errno", None)
+    args = getattr(orig, "args", ())
+    if errno is None and args and isinstance(args[0], int):
+        errno = args[0]
+    if errno is not None:
+        return errno == 1062   # MySQL ER_DUP_ENTRY
+    msg = str(orig).lower()
+    return "unique" in msg or "duplicate" in msg
+
+
+def _insert_ignore_duplicates(db, model, rows, key_cols):
+    """
+    Batch insert `rows`, silently skipping any that hit the unique key on
+    key_cols (ON CONFLICT DO NOTHING / ON DUPLICATE KEY no-op). One executemany.
+    """
+    if not rows:
+        return
+    table = model.__table__
+    stmt = _dialect_insert(table)
+    if stmt is None:
+        for row in rows:
+            try:
+                with db.begin_nested():
+                    db.execute(insert(table), [row])
+            except IntegrityError as e:
+                if not _is_duplicate_key(e):
+                    raise
+        return
+    if engine.dialect.name in ("mysql", "mariadb"):
+        stmt = stmt.on_duplicate_key_update({"id": table.c.id})
+    else:
+        stmt = stmt.on_conflict_do_nothing(index_elements=key_cols)
+    db.execute(stmt, rows)
+
+
+def _insert_new_responses(db, rows) -> list:
+    """
+    Insert response rows, skipping (submission_id, question_no) pairs that are
+    already stored. Returns one flag per row: True if this call inserted it, so
+    the rollup never counts a row a concurrent writer stored first.
+    """
+    table = Response.__table__
+    keyed = [i for i, r in enumerate(rows) if r["submission_id"]]
+    plain = [i for i, r in enumerate(rows) if not r["submission_id"]]
+    inserted = [False] * len(rows)
+    if plain:
+        # no submission id, no unique key to hit
+        db.execute(insert(table), [rows[i] for i in plain])
+        for i in plain:
+            inserted[i] = True
+    if not keyed:
+        return inserted
+
+    name = engine.dialect.name
+    stmt = _dialect_insert(table)
+    if name in ("postgresql", "sqlite"):
+        # RETURNING only yields the rows that were not skipped by DO NOTHING
+        stmt = (stmt.on_conflict_do_nothing(index_elements=["submission_id", "question_no"])
+                .returning(table.c.submission_id, table.c.question_no))
+        stored = {(sid, str(qno)) for sid, qno in db.execute(stmt, [rows[i] for i in keyed]).all()}
+        for i in keyed:
+            inserted[i] = (rows[i]["submission_id"], str(rows[i]["question_no"])) in stored
+    elif name in ("mysql", "mariadb"):
+        # no RETURNING, and INSERT IGNORE would also swallow bad values and FK
+        # failures. A locking read of these submissions' key ranges blocks
+        # concurrent inserts into them until commit, so whatever it doesn't find
+        # is ours to insert with a plain INSERT. A duplicate that still slips in
+        # (READ COMMITTED has no gap locks) raises; the retry drops saved rows.
+        sub_ids = list({rows[i]["submission_id"] for i in keyed})
+        stored = {
+            (sid, str(qno)) for sid, qno in db.execute(
+                select(Response.submission_id, Response.question_no)
+                .where(Response.submission_id.in_(sub_ids)).with_for_update()
+            ).all()
+        }
+        new = [i for i in keyed if (rows[i]["submission_id"], str(rows[i]["question_no"])) not in stored]
+        if new:
+            db.execute(insert(table), [rows[i] for i in new])
+        for i in new:
+            inserted[i] = True
+    else:
+        for i in keyed:
+            inserted[i] = _insert_if_absent(db, Response, rows[i], ["submission_id", "question_no"])
+    return inserted
+
+
+def _insert_if_absent(db, model, row, key_cols) -> bool:
+    """Single-statement insert-if-absent on a unique key. True if this call inserted the row."""
+    table = model.__table__
+    stmt = _dialect_insert(table)
+    if stmt is None or engine.dialect.name in ("mysql", "mariadb"):
+        # MySQL: INSERT IGNORE would also hide bad values and FK failures, and a
+        # no-op upsert reports the same row count for a duplicate as for an insert
+        try:
+            with db.begin_nested():
+                db.execute(insert(table).values(**row))
+            return True
+        except IntegrityError as e:
+            if not _is_duplicate_key(e):
+                raise
+            return False
+    stmt = stmt.on_conflict_do_nothing(index_elements=key_cols)
+    return db.execute(stmt.values(**row)).rowcount == 1
 
 
 # =============================================================
 # Persistence helpers
 # =============================================================
 
-def save_bulk_responses(rows):
+def _parse_bulk_row(row):
+    """Unpack one 8- or 9-tuple into a dict of normalized fields."""
+    if len(row) == 8:
+        student_name, email, class_code, subject, subtopic, qno, s_ans, c_ans = row
+        quiz_id = None
+    elif len(row) == 9:
+        student_name, email, class_code, subject, subtopic, qno, s_ans, c_ans, quiz_id = row
+    else:
+        raise ValueError("Each row must be an 8- or 9-tuple. Got length=" + str(len(row)))
+
+    # normalize strings a bit
+    return {
+        "student_name": student_name,
+        "email": email,
+        "email_norm": normalize_key(email),
+        "class_code": (class_code or "").strip(),
+        "subject": (subject or "").strip(),
+        "subtopic": (subtopic or "").strip(),
+        "question_no": qno,
+        "student_answer": s_ans,
+        "correct_answer": c_ans,
+        "quiz_id": (quiz_id or "").strip() or None,
+        "submission_id": None,
+        "bank": None,
+    }
+
+
+def _resolve_student_ids(db, parsed):
     """
-    Save multiple responses.
+    Map every distinct normalized email in `parsed` to a student id using
+    set-based queries: one IN lookup, one bulk insert for the missing students,
+    one IN lookup for their new ids. Runs inside the caller's transaction.
+    """
+    emails = list(dict.fromkeys(p["email_norm"] for p in parsed))
+    ids = dict(db.execute(
+        select(Student.email_norm, Student.id).where(Student.email_norm.in_(emails))
+    ).all())
+
+    missing = {}
+    for p in parsed:
+        if p["email_norm"] not in ids and p["email_norm"] not in missing:
+            # first row wins for name/class_code, same as the old per-row path
+            missing[p["email_norm"]] = {
+                "name": p["student_name"],
+                "email": p["email"],
+                "class_code": p["class_code"],
+                "email_norm": p["email_norm"],
+                "class_code_norm": normalize_key(p["class_code"]),
+            }
+
+    if missing:
+        # skip only the emails a concurrent writer inserted first; every other new student is kept
+        _insert_ignore_duplicates(db, Student, list(missing.values()), ["email"])
+        # match on the raw email too: rows created before backfill_normalized_keys ran
+        # have no email_norm yet but still hold the unique email
+        raw = [m["email"] for m in missing.values()]
+        found = db.execute(
+            select(Student.email, Student.id)
+            .where(or_(Student.email_norm.in_(list(missing)), Student.email.in_(raw)))
+        ).all()
+        for email, sid in found:
+            ids.setdefault(normalize_key(email), sid)
+    return ids
+
+
+def _apply_rollup_deltas(db, response_rows, parsed):
+    """Fold the new responses into PerformanceRollup (same transaction as the insert)."""
+    deltas = {}
+    for r, p in zip(response_rows, parsed):
+        key = (r["class_code_norm"], r["subject_norm"], r["subtopic_norm"], r["student_id"], r["quiz_id"] or "")
+        d = deltas.get(key)
+        if d is None:
+            d = deltas[key] = {
+                "class_code_norm": key[0], "subject_norm": key[1], "subtopic_norm": key[2],
+                "student_id": key[3], "quiz_key": key[4],
+                "subject": p["subject"], "subtopic": p["subtopic"],
+                "correct": 0, "incorrect": 0, "updated_at": datetime.utcnow(),
+            }
+        if r["is_correct"]:
+            d["correct"] += 1
+        else:
+            d["incorrect"] += 1
+    _upsert_increment(
+        db, PerformanceRollup, list(deltas.values()),
+        key_cols=["class_code_norm", "subject_norm", "subtopic_norm", "student_id", "quiz_key"],
+        counter_cols=["correct", "incorrect"],
+    )
+
+
+def _drop_saved_rows(db, parsed):
+    """
+    Remove rows whose (submission_id, question_no) is already stored or repeated
+    in this batch, so the rollup only counts rows that are really new.
+    """
+    sub_ids = list({p["submission_id"] for p in parsed if p["submission_id"]})
+    if not sub_ids:
+        return parsed
+    seen = {
+        (sid, str(qno)) for sid, qno in db.execute(
+            select(Response.submission_id, Response.question_no).where(Response.submission_id.in_(sub_ids))
+        ).all()
+    }
+    fresh = []
+    for p in parsed:
+        if p["submission_id"]:
+            key = (p["submission_id"], str(p["question_no"]))
+            if key in seen:
+                continue
+            seen.add(key)
+        fresh.append(p)
+    return fresh
+
+
+# (bank, subtopic_norm, question_no) -> questions.id, shared by every save in the process.
+# Ids of mirrored questions never change (removed rows are only deactivated), so hits
+# are kept; misses (bank not synced yet) are retried after QUESTION_MISS_TTL seconds.
+QUESTION_MISS_TTL = 300
+_question_ids = {}
+_question_misses = {}
+
+
+def _bank_for_subject(subject) -> str:
+    """Bank key the questions mirror uses for a response's subject (see question_bank.BANK_MAP)."""
+    from question_bank import BANK_MAP
+    key = normalize_key(subject)
+    return BANK_MAP[key][0] if key in BANK_MAP else key
+
+
+def _resolve_question_ids(db, parsed):
+    """
+    questions.id for each parsed row (None when not mirrored), from the
+    process-wide map; everything not cached yet is resolved in one IN query.
+    Rows carry the bank the quiz was served from ("bank", the qsheet key);
+    only rows without one fall back to guessing it from the subject.
+    """
+    now = datetime.utcnow().timestamp()
+    keys = [(p.get("bank") or _bank_for_subject(p["subject"]), normalize_key(p["subtopic"]), str(p["question_no"]).strip())
+            for p in parsed]
+    wanted = {k for k in keys if k not in _question_ids and now - _question_misses.get(k, 0) > QUESTION_MISS_TTL}
+    if wanted:
+        banks = {k[0] for k in wanted}
+        qnos = {k[2] for k in wanted}
+        found = {}
+        for qid, bank, subtopic, qno, kind in db.execute(
+            select(Question.id, Question.bank, Question.subtopic, Question.question_no, Question.kind)
+            .where(Question.bank.in_(banks), Question.question_no.in_(qnos), Question.active.is_(True))
+            # Main first: responses are Main answers; a remedial row may reuse a main id
+            .order_by(case((Question.kind == "Main", 0), else_=1), Question.id)
+        ):
+            found.setdefault((bank, normalize_key(subtopic), qno), qid)
+        if len(_question_ids) > 50000:
+            _question_ids.clear()
+            _question_misses.clear()
+        for k in wanted:
+            if k in found:
+                _question_ids[k] = found[k]
+                _question_misses.pop(k, None)
+            else:
+                _question_misses[k] = now
+    return [_question_ids.get(k) for k in keys]
+
+
+def _write_responses(db, parsed):
+    """Insert parsed rows and fold them into the rollup, inside the caller's transaction."""
+    parsed = _drop_saved_rows(db, parsed)
+    if not parsed:
+        return []
+    student_ids = _resolve_student_ids(db, parsed)
+    question_ids = _resolve_question_ids(db, parsed)
+    # the whole batch graded at once, same rule as the quiz page (grading.py)
+    correct = grade_pairs([p["student_answer"] for p in parsed], [p["correct_answer"] for p in parsed])
+    response_rows = [
+        {
+            "student_id": student_ids[p["email_norm"]],
+            "question_id": question_id,
+            "subject": p["subject"],
+            "subtopic": p["subtopic"],
+            "class_code_norm": normalize_key(p["class_code"]),
+            "subject_norm": normalize_key(p["subject"]),
+            "subtopic_norm": normalize_key(p["subtopic"]),
+            "question_no": p["question_no"],
+            "student_answer": p["student_answer"],
+            "correct_answer": p["correct_answer"],
+            "is_correct": bool(ok),
+            "quiz_id": p["quiz_id"],
+            "submission_id": p["submission_id"],
+        }
+        for p, question_id, ok in zip(parsed, question_ids, correct)
+    ]
+    # the unique key also covers a concurrent writer racing past _drop_saved_rows;
+    # only rows this call actually inserted are folded into the rollup
+    inserted = _insert_new_responses(db, response_rows)
+    response_rows = [r for r, ok in zip(response_rows, inserted) if ok]
+    parsed = [p for p, ok in zip(parsed, inserted) if ok]
+    if response_rows:
+        _apply_rollup_deltas(db, response_rows, parsed)
+    return parsed
+
+
+def save_bulk_responses(rows, submission_id=None, bank=None):
+    """
+    Save multiple responses in a single transaction.
 
     Backward-compatible input formats:
       - 8-tuple: (student_name, email, class_code, subject, subtopic, qno, s_ans, c_ans)
       - 9-tuple: (student_name, email, class_code, subject, subtopic, qno, s_ans, c_ans, quiz_id)
+
+    Round trips are constant per submission: students are resolved with IN
+    queries (see _resolve_student_ids) and all responses go in one executemany.
+    With a submission_id, saving the same submission again is a no-op. `bank` is
+    the qsheet key the questions were served from (links question_id).
+    """
+    save_submissions([{"rows": rows, "submission_id": submission_id, "bank": bank}])
+
+
+def _as_datetime(value):
+    if value is None or isinstance(value, datetime):
+        return value
+    try:
+        return datetime.fromisoformat(str(value))
+    except ValueError:
+        return None
+
+
+def _attempt_key(tuition_code, student_id, subject, subtopic, attempt_type):
+    return {
+        "tuition_code_norm": normalize_key(tuition_code),
+        "student_ref_norm": normalize_key(student_id),
+        "subject_norm": normalize_key(subject),
+        "subtopic_norm": normalize_key(subtopic),
+        "attempt_type": (attempt_type or "").strip(),
+    }
+
+
+def _attempt_row(attempt, submission_id=None):
+    row = _attempt_key(attempt.get("tuition_code"), attempt.get("student_id"), attempt.get("subject"),
+                       attempt.get("subtopic"), attempt.get("attempt_type", "Main"))
+    row.update(
+        student_email=attempt.get("student_email"),
+        submission_id=submission_id,
+        started_at=_as_datetime(attempt.get("started_at")),
+        submitted_at=_as_datetime(attempt.get("submitted_at")) or datetime.utcnow(),
+        created_at=datetime.utcnow(),
+    )
+    return row
+
+
+def save_submissions(submissions):
     """
+    Save several quiz submissions in one transaction (the write queue's batch).
+
+    Each submission is {"rows": [bulk tuples], "attempt": {...} or None,
+    "submission_id": str or None, "bank": qsheet key or None}. When an attempt is given it is inserted
+    first; if that (student, subject, subtopic, attempt_type) is already
+    recorded the whole submission is skipped. Rows carrying a submission_id
+    are upserted on (submission_id, question_no), so resubmits, reruns and
+    write-queue retries never double-write. Returns the number saved.
+    """
+    db = SessionLocal()
+    accepted, saved = [], 0
+    try:
+        for sub in submissions:
+            submission_id = (sub.get("submission_id") or "").strip() or None
+            bank = (sub.get("bank") or "").strip().lower() or None
+            parsed = [_parse_bulk_row(row) for row in sub.get("rows") or []]
+            for p in parsed:
+                p["submission_id"] = submission_id
+                p["bank"] = bank
+            attempt = sub.get("attempt")
+            if attempt:
+                try:
+                    with db.begin_nested():
+                        db.execute(insert(Attempt), [_attempt_row(attempt, submission_id)])
+                except IntegrityError as e:
+                    if not _is_duplicate_key(e):
+                        raise
+                    continue   # already attempted
+            accepted.extend(parsed)
+            saved += 1
+        if accepted:
+            accepted = _write_responses(db, accepted)
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+    if accepted:
+        _invalidate_cached_reads(accepted)
+    return saved
+
+
+def has_attempted(tuition_code: str, student_id: str, subject: str, subtopic: str, attempt_type: str = "Main") -> bool:
+    """Indexed point lookup on the attempts unique key."""
+    key = _attempt_key(tuition_code, student_id, subject, subtopic, attempt_type)
+    db = SessionLocal()
+    try:
+        found = db.execute(
+            select(Attempt.id).where(*[getattr(Attempt, k) == v for k, v in key.items()]).limit(1)
+        ).first()
+        return found is not None
+    finally:
+        db.close()
+
+
+def _invalidate_cached_reads(parsed):
+    """Bump the cache versions touched by a committed submission."""
+    scopes = set()
+    for p in parsed:
+        subject_norm = normalize_key(p["subject"])
+        scopes.add(("class", normalize_key(p["class_code"]), subject_norm))
+        scopes.add(("student", p["email_norm"], subject_norm))
+    query_cache.bump(*scopes)
+
+
+# =============================================================
+# Sheet mirrors (question banks + register, filled by sheet_sync.py)
+# =============================================================
+
+def get_sync_hash(source):
     db = SessionLocal()
     try:
-        responses = []
+        return db.execute(select(SheetSync.content_hash).where(SheetSync.source == source)).scalar()
+    finally:
+        db.close()
+
+
+def get_sync_state(source):
+    """(synced_at, row_count) of the last sync of `source`, or None if never synced."""
+    db = SessionLocal()
+    try:
+        row = db.execute(select(SheetSync.synced_at, SheetSync.row_count).where(SheetSync.source == source)).first()
+        return tuple(row) if row else None
+    finally:
+        db.close()
+
+
+def mark_synced(source):
+    """Record that `source` was checked just now and found unchanged."""
+    db = SessionLocal()
+    try:
+        db.execute(update(SheetSync).where(SheetSync.source == source).values(synced_at=datetime.utcnow()))
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+
+def sync_mirror_rows(model, scope, rows, key_cols, source, content_hash) -> dict:
+    """
+    Make the active rows of `model` within `scope` (column -> value filters)
+    match `rows`, keyed by key_cols. Only rows whose row_hash or position
+    changed are written; rows gone from the sheet are deactivated, not
+    deleted (responses may reference them). One transaction; records the
+    sheet's content hash under `source`. Returns counts.
+    """
+    now = datetime.utcnow()
+    table = model.__table__
+    counts = {"inserted": 0, "updated": 0, "deactivated": 0, "unchanged": 0}
+    db = SessionLocal()
+    try:
+        existing = {}
+        for r in db.execute(
+            select(table.c.id, table.c.row_hash, table.c.row_no, table.c.active, *[table.c[k] for k in key_cols])
+            .where(*[table.c[c] == v for c, v in scope.items()])
+        ):
+            existing[tuple(r[4:])] = r
+        inserts, updates, seen = [], [], set()
         for row in rows:
-            if len(row) == 8:
-                student_name, email, class_code, subject, subtopic, qno, s_ans, c_ans = row
-                quiz_id = None
-            elif len(row) == 9:
-                student_name, email, class_code, subject, subtopic, qno, s_ans, c_ans, quiz_id = row
+            key = tuple(row[k] for k in key_cols)
+            seen.add(key)
+            old = existing.get(key)
+            if old is None:
+                inserts.append({**scope, **row, "active": True, "synced_at": now})
+            elif old.row_hash != row["row_hash"] or old.row_no != row["row_no"] or not old.active:
+                updates.append({**row, "id": old.id, "active": True, "synced_at": now})
             else:
-                raise ValueError("Each row must be an 8- or 9-tuple. Got length=" + str(len(row)))
-
-            # normalize strings a bit
-            subject = (subject or "").strip()
-            subtopic = (subtopic or "").strip()
-            class_code = (class_code or "").strip()
-            quiz_id = (quiz_id or "").strip() or None
-
-            student = db.query(Student).filter_by(email=email).first()
-            if not student:
-                student = Student(name=student_name, email=email, class_code=class_code)
-                db.add(student)
-                db.commit()
-                db.refresh(student)
-
-            responses.append(Response(
-                student_id=student.id,
-                subject=subject,
-                subtopic=subtopic,
-                question_no=qno,
-                student_answer=s_ans,
-                correct_answer=c_ans,
-                is_correct=(s_ans == c_ans),
-                quiz_id=quiz_id,
-            ))
-        if responses:
-            db.bulk_save_objects(responses)
-            db.commit()
+                counts["unchanged"] += 1
+        gone = [{"id": r.id, "active": False, "synced_at": now}
+                for key, r in existing.items() if key not in seen and r.active]
+        if inserts:
+            db.execute(insert(model), inserts)
+        if updates or gone:
+            # ORM bulk UPDATE by primary key (executemany)
+            db.execute(update(model), updates + gone)
+        counts.update(inserted=len(inserts), updated=len(updates), deactivated=len(gone))
+
+        state = db.execute(select(SheetSync).where(SheetSync.source == source)).scalar_one_or_none()
+        if state is None:
+            db.add(SheetSync(source=source, content_hash=content_hash, row_count=len(rows), synced_at=now))
+        else:
+            state.content_hash, state.row_count, state.synced_at = content_hash, len(rows), now
+        db.commit()
+        if inserts or updates or gone:
+            query_cache.clear()   # cached helpers join question text from the mirror
+        return counts
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+
+def get_bank_records(bank):
+    """
+    (main_records, remedial_records) for a mirrored bank in sheet order, as
+    lists of row dicts; None if the bank has never been synced.
+    """
+    db = SessionLocal()
+    try:
+        synced = db.execute(select(SheetSync.id).where(SheetSync.source == f"bank:{bank}:Main")).first()
+        if synced is None:
+            return None
+        out = {"Main": [], "Remedial": []}
+        for kind, data in db.execute(
+            select(Question.kind, Question.data)
+            .where(Question.bank == bank, Question.active.is_(True))
+            .order_by(Question.kind, Question.row_no)
+        ):
+            out.setdefault(kind, []).append(json.loads(data))
+        return out["Main"], out["Remedial"]
+    finally:
+        db.close()
+
+
+def get_register_entry(tuition_code, student_id):
+    """Register row (dict) for the stripped keys, or None. Point lookup on uq_register_key."""
+    db = SessionLocal()
+    try:
+        data = db.execute(
+            select(RegisterEntry.data).where(
+                RegisterEntry.tuition_code == str(tuition_code or "").strip(),
+                RegisterEntry.student_id == str(student_id or "").strip(),
+                RegisterEntry.active.is_(True),
+            )
+        ).scalar()
+        return json.loads(data) if data else None
     finally:
         db.close()
 
@@ -157,87 +1164,230 @@ def save_bulk_responses(rows):
 # Query helpers for dashboard (Subtopic-based)
 # =============================================================
 
+# Server-side correct/incorrect counters. A NULL is_correct counts as incorrect.
+def _correct_count():
+    return func.sum(case((Response.is_correct == True, 1), else_=0))  # noqa: E712
+
+
+def _incorrect_count():
+    return func.sum(case((Response.is_correct == True, 0), else_=1))  # noqa: E712
+
+
+def _int_columns(df: pd.DataFrame, cols) -> pd.DataFrame:
+    """SUM() comes back as Decimal on some drivers; keep the int contract."""
+    for c in cols:
+        df[c] = df[c].fillna(0).astype(int)
+    return df
+
+
+PERFORMANCE_COLUMNS = ["Student_Name","Student_Email","Tuition_Code","Subject","Subtopic","Correct","Incorrect"]
+
+
+def _batch_performance_query(db, batch_code, subject, subtopic=None):
+    R = PerformanceRollup
+    q = (
+        db.query(
+            Student.name.label("Student_Name"),
+            Student.email.label("Student_Email"),
+            Student.class_code.label("Tuition_Code"),
+            func.min(R.subject).label("Subject"),
+            func.min(R.subtopic).label("Subtopic"),
+            func.sum(R.correct).label("Correct"),
+            func.sum(R.incorrect).label("Incorrect"),
+        )
+        .join(R, Student.id == R.student_id)
+        .filter(
+            R.class_code_norm == normalize_key(batch_code),
+            R.subject_norm == normalize_key(subject),
+        )
+    )
+    if subtopic:
+        q = q.filter(R.subtopic_norm == normalize_key(subtopic))
+    return q.group_by(Student.id, Student.name, Student.email, Student.class_code, R.subject_norm, R.subtopic_norm)
+
+
+def _query_batch_performance(db, batch_code, subject, subtopic=None) -> pd.DataFrame:
+    rows = _batch_performance_query(db, batch_code, subject, subtopic).all()
+    if not rows:
+        return pd.DataFrame(columns=PERFORMANCE_COLUMNS)
+    return _int_columns(pd.DataFrame(rows, columns=PERFORMANCE_COLUMNS), ["Correct", "Incorrect"])
+
+
+@query_cache.cached(_class_scope)
 def get_batch_performance(batch_code: str, subject: str, subtopic: str = None) -> pd.DataFrame:
+    """
+    Per-student, per-subtopic correct/incorrect counts for a batch and subject,
+    read from PerformanceRollup (one row per group is transferred).
+
+    Columns: Student_Name, Student_Email, Tuition_Code, Subject, Subtopic, Correct, Incorrect
+    """
+    db = SessionLocal()
+    try:
+        return _query_batch_performance(db, batch_code, subject, subtopic)
+    finally:
+        db.close()
+
+
+@query_cache.cached(_class_student_scope)
+def get_student_summary(batch_code: str, subject: str, student_email: str) -> pd.DataFrame:
+    """
+    Return per-subtopic summary for a student in a subject within a batch.
+
+    Columns: Subtopic, Correct, Incorrect, Total
+    """
+    db = SessionLocal()
+    try:
+        R = PerformanceRollup
+        rows = (
+            db.query(func.min(R.subtopic), func.sum(R.correct), func.sum(R.incorrect))
+              .join(Student, Student.id == R.student_id)
+              .filter(
+                  R.class_code_norm == normalize_key(batch_code),
+                  R.subject_norm == normalize_key(subject),
+                  Student.email_norm == normalize_key(student_email),
+              )
+              .group_by(R.subtopic_norm)
+              .all()
+        )
+        if not rows:
+            return pd.DataFrame(columns=["Subtopic","Correct","Incorrect","Total"])
+        summary = _int_columns(pd.DataFrame(rows, columns=["Subtopic","Correct","Incorrect"]), ["Correct", "Incorrect"])
+        summary["Total"] = summary["Correct"] + summary["Incorrect"]
+        return summary
+    finally:
+        db.close()
+
+
+def get_batch_performance_with_cursor(batch_code: str, subject: str, subtopic: str = None):
+    """
+    Like get_batch_performance, plus the response-id watermark to pass to
+    get_performance_delta.
+
+    The watermark and the rollup are read in ONE statement (watermark LEFT
+    JOIN grouped rollup), so they come from the same snapshot under any
+    isolation level, including PostgreSQL's READ COMMITTED: a response is
+    either in the frame and <= cursor, or in neither.
+
+    Caveat: the cursor is an id watermark, not a commit order. A transaction
+    that took a lower id but commits after a higher id was read is never
+    returned by get_performance_delta; callers must periodically do a full
+    reload (teacher_dashboard.load_live_performance does every 600 s).
+
+    Returns (DataFrame, cursor)
+    """
+    db = SessionLocal()
+    try:
+        wm = select(func.coalesce(func.max(Response.id), 0).label("cursor")).where(
+            Response.class_code_norm == normalize_key(batch_code),
+            Response.subject_norm == normalize_key(subject),
+        )
+        if subtopic:
+            wm = wm.where(Response.subtopic_norm == normalize_key(subtopic))
+        wm = wm.subquery()
+        perf = _batch_performance_query(db, batch_code, subject, subtopic).subquery()
+        rows = db.execute(
+            select(wm.c.cursor, *[perf.c[c] for c in PERFORMANCE_COLUMNS])
+            .select_from(wm.outerjoin(perf, true()))
+        ).all()
+        cursor = int(rows[0][0] or 0) if rows else 0
+        # an empty rollup still yields the one watermark row, with NULL columns
+        rows = [r[1:] for r in rows if r[1 + PERFORMANCE_COLUMNS.index("Correct")] is not None]
+        if not rows:
+            return pd.DataFrame(columns=PERFORMANCE_COLUMNS), cursor
+        return _int_columns(pd.DataFrame(rows, columns=PERFORMANCE_COLUMNS), ["Correct", "Incorrect"]), cursor
+    finally:
+        db.close()
+
+
+def get_performance_delta(batch_code: str, subject: str, subtopic: str = None, after_id: int = 0):
+    """
+    Aggregated counts for responses with id > after_id only (one range probe on
+    ix_responses_class_subject_id). Same columns as get_batch_performance.
+    Rows committed out of id order (lower id, later commit) are missed; see
+    get_batch_performance_with_cursor.
+
+    Returns (DataFrame, new_cursor); new_cursor == after_id when nothing is new.
+    """
     db = SessionLocal()
     try:
         q = (
             db.query(
-                Student.name.label("Student_Name"),
-                Student.email.label("Student_Email"),
-                Student.class_code.label("Tuition_Code"),
-                Response.subject.label("Subject"),
-                Response.subtopic.label("Subtopic"),
-                Response.is_correct.label("is_correct"),
+                Student.name,
+                Student.email,
+                Student.class_code,
+                func.min(Response.subject),
+                func.min(Response.subtopic),
+                _correct_count(),
+                _incorrect_count(),
+                func.max(Response.id),
             )
-            .join(Response, Student.id == Response.student_id)
+            .join(Student, Student.id == Response.student_id)
             .filter(
-                func.lower(Student.class_code) == func.lower(batch_code.strip()),
-                func.lower(Response.subject) == func.lower(subject.strip())
+                Response.class_code_norm == normalize_key(batch_code),
+                Response.subject_norm == normalize_key(subject),
+                Response.id > int(after_id or 0),
             )
         )
         if subtopic:
-            q = q.filter(func.lower(Response.subtopic) == func.lower(subtopic.strip()))
-
+            q = q.filter(Response.subtopic_norm == normalize_key(subtopic))
+        q = q.group_by(Student.id, Student.name, Student.email, Student.class_code,
+                       Response.subject_norm, Response.subtopic_norm)
         rows = q.all()
         if not rows:
-            return pd.DataFrame(columns=[
-                "Student_Name","Student_Email","Tuition_Code","Subject","Subtopic","Correct","Incorrect"
-            ])
-
-        df = pd.DataFrame(rows, columns=[
-            "Student_Name","Student_Email","Tuition_Code","Subject","Subtopic","is_correct"
-        ])
-        perf = (
-            df.groupby(["Student_Name","Student_Email","Tuition_Code","Subject","Subtopic"], as_index=False)
-              .agg(Correct=("is_correct", lambda x: int(x.sum())),
-                   Incorrect=("is_correct", lambda x: int((~x).sum())))
-        )
-        return perf
+            return pd.DataFrame(columns=PERFORMANCE_COLUMNS), int(after_id or 0)
+        df = pd.DataFrame(rows, columns=PERFORMANCE_COLUMNS + ["_max_id"])
+        cursor = max(int(after_id or 0), int(df["_max_id"].max()))
+        return _int_columns(df.drop(columns=["_max_id"]), ["Correct", "Incorrect"]), cursor
     finally:
         db.close()
 
 
-def get_student_summary(batch_code: str, subject: str, student_email: str) -> pd.DataFrame:
-    """
-    Return per-subtopic summary for a student in a subject within a batch.
-
-    Columns: Subtopic, Correct, Incorrect, Total
-    """
-    perf = get_batch_performance(batch_code, subject, subtopic=None)
-    if perf.empty:
-        return pd.DataFrame(columns=["Subtopic","Correct","Incorrect","Total"])
-    sdf = perf[perf["Student_Email"].str.lower().str.strip() == student_email.lower().strip()]
-
-    if sdf.empty:
-        return pd.DataFrame(columns=["Subtopic","Correct","Incorrect","Total"])
-
-    summary = (
-        sdf.groupby("Subtopic", as_index=False)
-           .agg(Correct=("Correct","sum"), Incorrect=("Incorrect","sum"))
+def merge_performance_delta(base: pd.DataFrame, delta: pd.DataFrame) -> pd.DataFrame:
+    """Add a get_performance_delta frame onto a get_batch_performance frame."""
+    if delta is None or delta.empty:
+        return base
+    if base is None or base.empty:
+        return delta.reset_index(drop=True)
+    both = pd.concat([base, delta], ignore_index=True)
+    keys = [both["Student_Email"].map(normalize_key), both["Subtopic"].map(normalize_key)]
+    merged = both.groupby(keys, sort=False).agg(
+        Student_Name=("Student_Name", "first"),
+        Student_Email=("Student_Email", "first"),
+        Tuition_Code=("Tuition_Code", "first"),
+        Subject=("Subject", "first"),
+        Subtopic=("Subtopic", "first"),
+        Correct=("Correct", "sum"),
+        Incorrect=("Incorrect", "sum"),
     )
-    summary["Total"] = summary["Correct"] + summary["Incorrect"]
-    return summary
+    return _int_columns(merged.reset_index(drop=True)[PERFORMANCE_COLUMNS], ["Correct", "Incorrect"])
 
 
+@query_cache.cached(_student_scope)
 def get_student_responses(student_email: str, subject: str, subtopic: str) -> pd.DataFrame:
     db = SessionLocal()
     try:
         q = (
             db.query(
                 Response.question_no,
+                Question.question_text,
                 Response.student_answer,
                 Response.correct_answer,
                 Response.is_correct,
             )
             .join(Student, Student.id == Response.student_id)
+            # question text from the synced bank mirror (NULL for unlinked rows)
+            .outerjoin(Question, Question.id == Response.question_id)
             .filter(
-                func.lower(Student.email) == func.lower(student_email.strip()),
-                func.lower(Response.subject) == func.lower(subject.strip()),
-                func.lower(Response.subtopic) == func.lower(subtopic.strip()),
+                Student.email_norm == normalize_key(student_email),
+                Response.subject_norm == normalize_key(subject),
+                Response.subtopic_norm == normalize_key(subtopic),
             )
+            .order_by(Response.id)
         )
         rows = q.all()
-        return pd.DataFrame(rows, columns=["Question_No","Student_Answer","Correct_Answer","Is_Correct"])
+        df = pd.DataFrame(rows, columns=["Question_No","Question","Student_Answer","Correct_Answer","Is_Correct"])
+        df["Question"] = df["Question"].fillna("")
+        return df
     finally:
         db.close()
 
@@ -246,6 +1396,7 @@ def get_student_responses(student_email: str, subject: str, subtopic: str) -> pd
 # Quiz-based helpers (for per-main-quiz charts)
 # =============================================================
 
+@query_cache.cached(_class_student_scope)
 def get_student_quiz_summary(batch_code: str, subject: str, student_email: str) -> pd.DataFrame:
     """
     Per-quiz summary for a student.
@@ -253,31 +1404,29 @@ def get_student_quiz_summary(batch_code: str, subject: str, student_email: str)
     """
     db = SessionLocal()
     try:
+        R = PerformanceRollup
         q = (
-            db.query(Response.quiz_id, Response.is_correct)
-              .join(Student, Student.id == Response.student_id)
+            db.query(R.quiz_key, func.sum(R.correct), func.sum(R.incorrect))
+              .join(Student, Student.id == R.student_id)
               .filter(
-                  Student.class_code == batch_code,
-                  Student.email == student_email,
-                  Response.subject.ilike(subject),
-                  Response.quiz_id.isnot(None),
+                  R.class_code_norm == normalize_key(batch_code),
+                  Student.email_norm == normalize_key(student_email),
+                  R.subject_norm == normalize_key(subject),
+                  R.quiz_key != "",
               )
+              .group_by(R.quiz_key)
         )
         rows = q.all()
-        df = pd.DataFrame(rows, columns=["Quiz_ID", "is_correct"]) if rows else pd.DataFrame(columns=["Quiz_ID","is_correct"])
-        if df.empty:
+        if not rows:
             return pd.DataFrame(columns=["Quiz_ID","Correct","Incorrect","Total"])
-        out = (
-            df.groupby("Quiz_ID", as_index=False)
-              .agg(Correct=("is_correct", lambda x: int(x.sum())),
-                   Incorrect=("is_correct", lambda x: int((~x).sum())))
-        )
+        out = _int_columns(pd.DataFrame(rows, columns=["Quiz_ID","Correct","Incorrect"]), ["Correct", "Incorrect"])
         out["Total"] = out["Correct"] + out["Incorrect"]
         return out
     finally:
         db.close()
 
 
+@query_cache.cached(_class_scope)
 def get_class_quiz_summary(batch_code: str, subject: str) -> pd.DataFrame:
     """
     Class-wide per-quiz totals.
@@ -285,33 +1434,31 @@ def get_class_quiz_summary(batch_code: str, subject: str) -> pd.DataFrame:
     """
     db = SessionLocal()
     try:
+        R = PerformanceRollup
         q = (
-            db.query(Response.quiz_id, Response.is_correct)
-              .join(Student, Student.id == Response.student_id)
+            db.query(R.quiz_key, func.sum(R.correct), func.sum(R.incorrect))
               .filter(
-                  Student.class_code == batch_code,
-                  Response.subject.ilike(subject),
-                  Response.quiz_id.isnot(None),
+                  R.class_code_norm == normalize_key(batch_code),
+                  R.subject_norm == normalize_key(subject),
+                  R.quiz_key != "",
               )
+              .group_by(R.quiz_key)
         )
         rows = q.all()
-        df = pd.DataFrame(rows, columns=["Quiz_ID", "is_correct"]) if rows else pd.DataFrame(columns=["Quiz_ID","is_correct"])
-        if df.empty:
+        if not rows:
             return pd.DataFrame(columns=["Quiz_ID","Class_Correct","Class_Incorrect","Class_Total","Class_AccuracyPct"])
-        out = (
-            df.groupby("Quiz_ID", as_index=False)
-              .agg(Class_Correct=("is_correct", lambda x: int(x.sum())),
-                   Class_Incorrect=("is_correct", lambda x: int((~x).sum())))
+        out = _int_columns(
+            pd.DataFrame(rows, columns=["Quiz_ID","Class_Correct","Class_Incorrect"]),
+            ["Class_Correct", "Class_Incorrect"],
         )
         out["Class_Total"] = out["Class_Correct"] + out["Class_Incorrect"]
-        out["Class_AccuracyPct"] = out.apply(
-            lambda r: (r.Class_Correct / r.Class_Total * 100) if r.Class_Total > 0 else float("nan"), axis=1
-        )
+        out["Class_AccuracyPct"] = (out["Class_Correct"] / out["Class_Total"].where(out["Class_Total"] > 0)) * 100
         return out
     finally:
         db.close()
 
 
+@query_cache.cached(_student_scope)
 def get_student_quiz_responses(student_email: str, subject: str, quiz_id: str) -> pd.DataFrame:
     """
     Per-question detail for a specific student's quiz attempt.
@@ -328,8 +1475,8 @@ def get_student_quiz_responses(student_email: str, subject: str, quiz_id: str) -
             )
             .join(Student, Student.id == Response.student_id)
             .filter(
-                Student.email == student_email,
-                Response.subject.ilike(subject),
+                Student.email_norm == normalize_key(student_email),
+                Response.subject_norm == normalize_key(subject),
                 Response.quiz_id == quiz_id,
             )
         )
@@ -343,25 +1490,39 @@ def get_student_quiz_responses(student_email: str, subject: str, quiz_id: str) -
 # Teacher notification flag
 # =============================================================
 
+# keys already known to be notified in this process (entries are never un-notified)
+_notified_keys = set()
+
+
 def mark_and_check_teacher_notified(batch_code: str, subject: str, subtopic: str) -> bool:
     """
     Returns True if this is the first submission (we just marked as notified).
     Returns False if teacher was already notified before.
+
+    Atomic across sessions and processes: one insert-if-absent on the
+    (batch_code, subject, subtopic) unique index decides who was first.
+    Values are compared normalized (normalize_key), so case or whitespace
+    variants count as the same quiz. Keys seen once are remembered
+    in-process, so repeat calls skip the DB.
     """
+    key = (normalize_key(batch_code), normalize_key(subject), normalize_key(subtopic))
+    if key in _notified_keys:
+        return False
     db = SessionLocal()
     try:
-        entry = (
-            db.query(DashboardNotify)
-              .filter_by(batch_code=batch_code, subject=subject, subtopic=subtopic)
-              .first()
+        first = _insert_if_absent(
+            db, DashboardNotify,
+            {"batch_code": key[0], "subject": key[1], "subtopic": key[2], "notified": True},
+            key_cols=["batch_code", "subject", "subtopic"],
         )
-        if entry:
-            return False
-        db.add(DashboardNotify(batch_code=batch_code, subject=subject, subtopic=subtopic, notified=True))
         db.commit()
-        return True
+    except Exception:
+        db.rollback()
+        raise
     finally:
         db.close()
+    _notified_keys.add(key)
+    return first
 
 def save_observation(class_code: str, email: str, obs_date: date, params: dict, teacher_email: str = None, notes: str = None):
     """
@@ -369,10 +1530,11 @@ def save_observation(class_code: str, email: str, obs_date: date, params: dict,
     """
     db = SessionLocal()
     try:
-        student = db.query(Student).filter(func.lower(Student.email) == func.lower(email.strip())).first()
+        student = db.query(Student).filter(Student.email_norm == normalize_key(email)).first()
         if not student:
             # try creating student from class_code and email if not present
-            student = Student(name=None, email=email.strip(), class_code=class_code.strip())
+            student = Student(name=None, email=email.strip(), class_code=class_code.strip(),
+                              email_norm=normalize_key(email), class_code_norm=normalize_key(class_code))
             db.add(student)
             db.commit()
             db.refresh(student)
@@ -403,7 +1565,7 @@ def save_observation(class_code: str, email: str, obs_date: date, params: dict,
 def get_latest_observation(class_code: str, email: str):
     db = SessionLocal()
     try:
-        student = db.query(Student).filter(func.lower(Student.email) == func.lower(email.strip())).first()
+        student = db.query(Student).filter(Student.email_norm == normalize_key(email)).first()
         if not student:
             return None
         obs = (
@@ -420,7 +1582,7 @@ def get_latest_observation(class_code: str, email: str):
 def get_observations_history(class_code: str, email: str) -> pd.DataFrame:
     db = SessionLocal()
     try:
-        student = db.query(Student).filter(func.lower(Student.email) == func.lower(email.strip())).first()
+        student = db.query(Student).filter(Student.email_norm == normalize_key(email)).first()
         if not student:
             return pd.DataFrame()
         q = db.query(Observation).filter(Observation.student_id == student.id).order_by(Observation.observation_date.asc())
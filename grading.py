@@ -0,0 +1,86 @@
+# grading.py
+"""
+One grading engine for every quiz path (quiz page, DB writes, dashboards).
+
+Answers are compared after a single normalization (normalize_answer:
+trimmed, inner whitespace collapsed, case-folded; None/NaN -> ""), and an
+empty answer never counts as correct. A quiz's answer key is normalized
+once, when its bank snapshot compiles the quiz (quiz_model.Quiz.key);
+submissions are then graded in batches as array operations.
+
+    result = grade_batch(quiz.key, [answers_1, answers_2])
+    result.awarded      # marks per submission x question
+    result.earned       # total marks per submission
+    result.total        # marks available
+    grade_pairs(df["student_answer"], df["correct_answer"])   # bool array, row-aligned
+"""
+import numpy as np
+import pandas as pd
+
+
+def normalize_answer(value) -> str:
+    if value is None or (isinstance(value, float) and value != value):
+        return ""
+    return " ".join(str(value).split()).casefold()
+
+
+def normalize_answers(values) -> np.ndarray:
+    """normalize_answer over a sequence or Series, as vectorized string ops."""
+    s = values if isinstance(values, pd.Series) else pd.Series(list(values), dtype=object)
+    if s.empty:
+        return np.array([], dtype=object)
+    return s.fillna("").astype(str).str.split().str.join(" ").str.casefold().to_numpy(dtype=object)
+
+
+class AnswerKey:
+    """Normalized answers and marks for one quiz, in question order."""
+    __slots__ = ("qids", "answers", "marks")
+
+    def __init__(self, qids, answers, marks):
+        self.qids = tuple(qids)
+        self.answers = normalize_answers(answers)
+        self.marks = np.asarray(list(marks), dtype=np.int64)
+
+    @classmethod
+    def from_questions(cls, questions):
+        return cls([q.qid for q in questions], [q.answer for q in questions], [q.marks for q in questions])
+
+    @property
+    def total(self) -> int:
+        return int(self.marks.sum())
+
+    def __len__(self):
+        return len(self.qids)
+
+
+class BatchResult:
+    __slots__ = ("key", "correct", "awarded", "earned")
+
+    def __init__(self, key, correct, awarded):
+        self.key = key
+        self.correct = correct              # bool, submissions x questions
+        self.awarded = awarded              # marks, submissions x questions
+        self.earned = awarded.sum(axis=1)   # marks per submission
+
+    @property
+    def total(self) -> int:
+        return self.key.total
+
+    def wrong_ids(self, i):
+        return [qid for qid, ok in zip(self.key.qids, self.correct[i]) if not ok]
+
+
+def grade_batch(key, submissions) -> BatchResult:
+    """Grade answer dicts ({qid: answer}) against `key`, all at once."""
+    n, m = len(submissions), len(key)
+    raw = [answers.get(qid) for answers in submissions for qid in key.qids]
+    given = normalize_answers(raw).reshape(n, m)
+    correct = (given == key.answers) & (given != "")
+    return BatchResult(key, correct, correct * key.marks)
+
+
+def grade_pairs(student_answers, correct_answers) -> np.ndarray:
+    """Row-aligned correctness for (student answer, correct answer) pairs."""
+    given = normalize_answers(student_answers)
+    expected = normalize_answers(correct_answers)
+    return (given == expected) & (given != "")
@@ -0,0 +1,120 @@
+# gsheets.py
+"""
+Process-wide Google Sheets client and cached Spreadsheet/Worksheet handles.
+
+Streamlit re-executes a page on every widget interaction; building
+Credentials + gspread.authorize and calling open_by_url()/worksheets() at
+page level repeats the OAuth and metadata round trips on every click.
+Here the client is built once per service account and handles are kept per
+spreadsheet URL for `ttl` seconds.
+
+    from gsheets import get_client, get_worksheet
+    ws = get_worksheet(url, "Main")          # case-insensitive title
+    ws = get_worksheet(url)                  # first worksheet
+"""
+import threading
+import time
+
+import gspread
+from google.auth.transport.requests import Request
+from google.oauth2.service_account import Credentials
+
+SCOPES = ["https://spreadsheets.google.com/feeds", "https://www.googleapis.com/auth/drive"]
+HANDLE_TTL = 600          # seconds a Spreadsheet handle / worksheet list is reused
+REFRESH_MARGIN = 300      # refresh the access token this many seconds before expiry
+
+_lock = threading.RLock()
+_clients = {}             # account key -> (gspread.Client, Credentials)
+_books = {}               # url -> (loaded_at, Spreadsheet, [Worksheet])
+
+
+def _load_credentials(service_account_info=None, service_account_file=None):
+    if service_account_file:
+        return Credentials.from_service_account_file(service_account_file, scopes=SCOPES)
+    if service_account_info is None:
+        import streamlit as st
+        service_account_info = st.secrets["gcp_service_account"]
+    return Credentials.from_service_account_info(dict(service_account_info), scopes=SCOPES)
+
+
+def _ensure_fresh(creds):
+    """Refresh the token ahead of expiry so concurrent sessions don't all hit a 401 at once."""
+    expiry = getattr(creds, "expiry", None)
+    if creds.valid and expiry is not None and (expiry.timestamp() - time.time()) > REFRESH_MARGIN:
+        return
+    creds.refresh(Request())
+
+
+def get_client(service_account_info=None, service_account_file=None) -> gspread.Client:
+    """
+    Cached gspread client. Defaults to st.secrets["gcp_service_account"];
+    pass service_account_file for scripts such as register_bot.py.
+    """
+    if service_account_file:
+        key = ("file", service_account_file)
+    elif service_account_info is not None:
+        key = ("info", dict(service_account_info).get("client_email"))
+    else:
+        key = ("secrets", None)
+    with _lock:
+        if key not in _clients:
+            creds = _load_credentials(service_account_info, service_account_file)
+            _clients[key] = (gspread.authorize(creds), creds)
+        client, creds = _clients[key]
+        _ensure_fresh(creds)
+        return client
+
+
+def _book_entry(url, ttl, client):
+    with _lock:
+        entry = _books.get(url)
+        if entry and time.monotonic() - entry[0] < ttl:
+            return entry
+    client = client or get_client()
+    # a full URL, or a spreadsheet title (e.g. the standalone similarity form)
+    book = client.open_by_url(url) if "://" in url else client.open(url)
+    entry = (time.monotonic(), book, book.worksheets())
+    with _lock:
+        _books[url] = entry
+    return entry
+
+
+def is_cached(url, ttl=HANDLE_TTL) -> bool:
+    """True if open_spreadsheet/list_worksheets would answer without an API request."""
+    with _lock:
+        entry = _books.get(url)
+        return bool(entry) and time.monotonic() - entry[0] < ttl
+
+
+def open_spreadsheet(url, ttl=HANDLE_TTL, client=None):
+    """Spreadsheet handle for `url` (or spreadsheet title), reused for `ttl` seconds."""
+    return _book_entry(url, ttl, client)[1]
+
+
+def list_worksheets(url, ttl=HANDLE_TTL, client=None):
+    return list(_book_entry(url, ttl, client)[2])
+
+
+def get_worksheet(url, title=None, ttl=HANDLE_TTL, client=None):
+    """
+    Worksheet by case-insensitive title, or the first worksheet when title is None.
+    Raises gspread.WorksheetNotFound if no tab matches.
+    """
+    _, book, sheets = _book_entry(url, ttl, client)
+    if title is None:
+        return sheets[0]
+    wanted = title.strip().lower()
+    for ws in sheets:
+        if ws.title.strip().lower() == wanted:
+            return ws
+    # tab may have been added after the handle was cached
+    return book.worksheet(title)
+
+
+def invalidate(url=None):
+    """Drop cached handles for one spreadsheet, or all."""
+    with _lock:
+        if url is None:
+            _books.clear()
+        else:
+            _books.pop(url, None)
@@ -0,0 +1,349 @@
+# image_cache.py
+"""
+Question-image fetching with a shared on-disk cache and parallel prefetch.
+
+Images are stored content-addressed (sha256 of the bytes) under
+IMAGE_CACHE_DIR, with a small per-URL pointer file, so every worker process
+and every restart reuses the same copies and identical images stored under
+different URLs are kept once. Total size is bounded; the least recently
+used blobs (by mtime, touched on every hit) are evicted first.
+
+    prefetch(urls)              # start fetching in the background pool
+    fetch_image_bytes(url)      # bytes or None; waits for an in-flight prefetch
+    get_variant(url, "display") # downscaled/recompressed copy for st.image
+    get_variant(url, "pdf")     # smaller copy embedded in PDF reports
+
+Derived variants are cached on disk like originals (keyed by variant + URL).
+A URL that fails to download is not retried for FAILURE_TTL seconds (per
+process), so a dead link costs one timeout, not one per page render.
+Pillow is optional: without it the original bytes are served unchanged.
+"""
+import hashlib
+import io
+import logging
+import os
+import re
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+log = logging.getLogger(__name__)
+
+CACHE_DIR = os.environ.get(
+    "IMAGE_CACHE_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), ".image_cache")
+)
+MAX_CACHE_BYTES = int(os.environ.get("IMAGE_CACHE_MAX_BYTES", 512 * 1024 * 1024))
+FETCH_TIMEOUT = 6
+PREFETCH_WORKERS = 8
+EVICT_EVERY = 60.0   # seconds between eviction sweeps
+FAILURE_TTL = 120.0  # seconds a failed URL is answered with None without refetching
+
+# name -> (max width px, format, quality). Only ever downscales.
+VARIANTS = {
+    "display": (800, "WEBP", 80),   # phones; browsers render WebP
+    "pdf": (480, "JPEG", 70),       # ReportLab-friendly, flattened onto white
+}
+
+try:
+    from PIL import Image as PILImage
+except ImportError:  # optional dependency
+    PILImage = None
+
+
+def normalize_img_url(value: str) -> str:
+    """Turn Drive 'file/d/<id>/view' share links into direct-download URLs."""
+    v = str(value or "").strip()
+    if not v: return ""
+    if "drive.google.com" in v and "id=" not in v:
+        m = re.search(r"/d/([a-zA-Z0-9_-]+)", v)
+        if m:
+            fid = m.group(1)
+            return f"https://drive.google.com/uc?export=view&id={fid}"
+    return v
+
+
+def _sha(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+class DiskImageCache:
+    def __init__(self, root=CACHE_DIR, max_bytes=MAX_CACHE_BYTES):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.blob_dir = os.path.join(root, "blobs")
+        self.url_dir = os.path.join(root, "urls")
+        os.makedirs(self.blob_dir, exist_ok=True)
+        os.makedirs(self.url_dir, exist_ok=True)
+        self._last_evict = 0.0
+        self._evict_lock = threading.Lock()
+
+    # ---------- paths ----------
+    def blob_path(self, digest: str) -> str:
+        return os.path.join(self.blob_dir, digest[:2], digest)
+
+    def _url_path(self, key: str) -> str:
+        return os.path.join(self.url_dir, _sha(key.encode("utf-8")))
+
+    # ---------- atomic writes (safe across processes) ----------
+    def _write_atomic(self, path: str, data: bytes):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), prefix=".tmp-")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(tmp, path)
+        except Exception:
+            try:
+                os.unlink(tmp)
+            except OSError:
+                pass
+            raise
+
+    # ---------- content-addressed blobs ----------
+    def get_blob(self, digest: str):
+        path = self.blob_path(digest)
+        try:
+            with open(path, "rb") as f:
+                data = f.read()
+        except OSError:
+            return None
+        try:
+            os.utime(path, None)   # LRU touch
+        except OSError:
+            pass
+        return data
+
+    def put_blob(self, data: bytes) -> str:
+        digest = _sha(data)
+        path = self.blob_path(digest)
+        if not os.path.exists(path):
+            self._write_atomic(path, data)
+        self._maybe_evict()
+        return digest
+
+    # ---------- key -> blob pointers ----------
+    def get(self, key: str):
+        """Bytes stored under `key` (a URL or derived-variant key), or None."""
+        try:
+            with open(self._url_path(key), "r") as f:
+                digest = f.read().strip()
+        except OSError:
+            return None
+        return self.get_blob(digest)   # None if the blob was evicted
+
+    def has(self, key: str) -> bool:
+        try:
+            with open(self._url_path(key), "r") as f:
+                return os.path.exists(self.blob_path(f.read().strip()))
+        except OSError:
+            return False
+
+    def put(self, key: str, data: bytes) -> str:
+        digest = self.put_blob(data)
+        self._write_atomic(self._url_path(key), digest.encode("ascii"))
+        return digest
+
+    # ---------- size-bounded LRU eviction ----------
+    def _maybe_evict(self):
+        now = time.monotonic()
+        if now - self._last_evict < EVICT_EVERY or not self._evict_lock.acquire(blocking=False):
+            return
+        try:
+            self._last_evict = now
+            self.evict()
+        finally:
+            self._evict_lock.release()
+
+    def evict(self):
+        blobs, total = [], 0
+        for dirpath, _, files in os.walk(self.blob_dir):
+            for name in files:
+                if name.startswith(".tmp-"):
+                    continue
+                path = os.path.join(dirpath, name)
+                try:
+                    st_ = os.stat(path)
+                except OSError:
+                    continue
+                blobs.append((st_.st_mtime, st_.st_size, path))
+                total += st_.st_size
+        if total <= self.max_bytes:
+            return 0
+        removed = 0
+        for _, size, path in sorted(blobs):
+            if total <= self.max_bytes * 0.9:
+                break
+            try:
+                os.unlink(path)
+                total -= size
+                removed += 1
+            except OSError:
+                pass
+        if removed:
+            self._drop_dangling_pointers()
+        return removed
+
+    def _drop_dangling_pointers(self):
+        """Remove url pointers whose blob is gone (evicted above or by another process)."""
+        dropped = 0
+        for name in os.listdir(self.url_dir):
+            if name.startswith(".tmp-"):
+                continue
+            path = os.path.join(self.url_dir, name)
+            try:
+                with open(path, "r") as f:
+                    digest = f.read().strip()
+                if not os.path.exists(self.blob_path(digest)):
+                    os.unlink(path)
+                    dropped += 1
+            except OSError:
+                pass
+        return dropped
+
+
+_cache = None
+_pool = ThreadPoolExecutor(max_workers=PREFETCH_WORKERS, thread_name_prefix="img-prefetch")
+_inflight = {}
+_inflight_lock = threading.RLock()   # done-callbacks may run while held
+_failures = {}                       # url -> monotonic time of the last failed download
+
+
+def get_disk_cache() -> DiskImageCache:
+    global _cache
+    if _cache is None:
+        _cache = DiskImageCache()
+    return _cache
+
+
+def _recently_failed(url) -> bool:
+    failed_at = _failures.get(url)
+    return failed_at is not None and time.monotonic() - failed_at < FAILURE_TTL
+
+
+def _download(url):
+    try:
+        r = requests.get(url, timeout=FETCH_TIMEOUT)
+        if r.status_code == 200 and r.content:
+            get_disk_cache().put(url, r.content)
+            # derive the on-screen variant while we're already in the pool
+            _derive_and_store(url, r.content, "display")
+            _failures.pop(url, None)
+            return r.content
+        log.info("image fetch failed for %s: HTTP %s", url, r.status_code)
+    except Exception as e:
+        log.info("image fetch failed for %s: %r", url, e)
+    with _inflight_lock:
+        if len(_failures) > 10000:
+            now = time.monotonic()
+            for u in [u for u, t in _failures.items() if now - t >= FAILURE_TTL]:
+                del _failures[u]
+        _failures[url] = time.monotonic()
+    return None
+
+
+# =============================================================
+# Derived variants (resize + re-encode)
+# =============================================================
+
+def derive_variant(data: bytes, max_width: int, fmt: str, quality: int) -> bytes:
+    """Downscale to max_width and re-encode. Returns the original if that isn't smaller."""
+    if PILImage is None or not data:
+        return data
+    try:
+        img = PILImage.open(io.BytesIO(data))
+        img.load()
+    except Exception:
+        return data
+    if img.width > max_width:
+        height = max(1, round(img.height * max_width / img.width))
+        img = img.resize((max_width, height), PILImage.LANCZOS)
+    if fmt == "JPEG":
+        if img.mode in ("RGBA", "LA", "P"):
+            rgba = img.convert("RGBA")
+            flat = PILImage.new("RGB", rgba.size, (255, 255, 255))
+            flat.paste(rgba, mask=rgba.split()[-1])
+            img = flat
+        elif img.mode != "RGB":
+            img = img.convert("RGB")
+    elif img.mode not in ("RGB", "RGBA"):
+        img = img.convert("RGBA")
+    out = io.BytesIO()
+    try:
+        img.save(out, format=fmt, quality=quality, optimize=True)
+    except Exception:
+        return data
+    derived = out.getvalue()
+    return derived if len(derived) < len(data) else data
+
+
+def _variant_key(url, variant):
+    return f"variant:{variant}:{VARIANTS[variant]}:{url}"
+
+
+def _derive_and_store(url, data, variant):
+    max_width, fmt, quality = VARIANTS[variant]
+    derived = derive_variant(data, max_width, fmt, quality)
+    get_disk_cache().put(_variant_key(url, variant), derived)
+    return derived
+
+
+def get_variant(url, variant="display"):
+    """Cached downscaled copy of the image at `url` ("display" or "pdf"). None on failure."""
+    url = normalize_img_url(url)
+    if not url:
+        return None
+    cache = get_disk_cache()
+    data = cache.get(_variant_key(url, variant))
+    if data is not None:
+        return data
+    original = fetch_image_bytes(url)
+    if original is None:
+        return None
+    return _derive_and_store(url, original, variant)
+
+
+def _submit(url):
+    """Future for `url`, reusing an in-flight download if there is one."""
+    with _inflight_lock:
+        fut = _inflight.get(url)
+        if fut is None:
+            fut = _pool.submit(_download, url)
+            _inflight[url] = fut
+            fut.add_done_callback(lambda _f, u=url: _drop_inflight(u))
+        return fut
+
+
+def _drop_inflight(url):
+    with _inflight_lock:
+        _inflight.pop(url, None)
+
+
+def prefetch(urls):
+    """Start background downloads for every not-yet-cached URL (Drive links normalized)."""
+    cache = get_disk_cache()
+    started = 0
+    for raw in dict.fromkeys(list(urls) if urls is not None else []):
+        url = normalize_img_url(raw)
+        if url and not cache.has(url) and not _recently_failed(url):
+            _submit(url)
+            started += 1
+    return started
+
+
+def fetch_image_bytes(url, timeout=FETCH_TIMEOUT + 2):
+    """Image bytes from the disk cache, an in-flight prefetch, or a fresh download. None on failure."""
+    url = normalize_img_url(url)
+    if not url:
+        return None
+    data = get_disk_cache().get(url)
+    if data is not None:
+        return data
+    if _recently_failed(url):
+        return None
+    try:
+        return _submit(url).result(timeout=timeout)
+    except Exception:
+        return None
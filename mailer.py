@@ -0,0 +1,307 @@
+# mailer.py
+"""
+Process-wide email dispatcher with pooled SMTP connections.
+
+Messages are queued and sent by a few worker threads. Each worker keeps one
+authenticated SMTP connection open and reuses it for every message it
+sends, reconnecting after idle time or a disconnect, so a class finishing a
+quiz together costs a couple of TLS handshakes rather than one per email.
+Sends are rate limited (token bucket, provider limit), transient failures
+(disconnects, timeouts, 4xx replies) are retried with backoff, permanent
+ones (5xx replies, failed logins, refused recipients) fail at once, and
+every message's outcome is recorded in a bounded delivery log.
+
+    from mailer import get_mailer
+    get_mailer().send(to, subject, body,
+                      attachments=[("report.pdf", pdf_bytes, "application/pdf")])
+    get_mailer().deliveries()   # recent delivery records, newest last
+
+Config comes from st.secrets["smtp"] (server, port, username, password,
+from_email, plus optional starttls, rate_per_minute, pool_size); with a
+password but no username, from_email is the login name. Pass a
+dict to Mailer() directly to point it at a local SMTP stand-in
+(benchmarks/check_mailer.py does that to exercise reuse, reconnects and retries).
+"""
+import atexit
+import errno
+import logging
+import queue
+import random
+import smtplib
+import socket
+import ssl
+import threading
+import time
+import uuid
+from collections import deque
+from email.message import EmailMessage
+
+log = logging.getLogger(__name__)
+
+DEFAULTS = {
+    "server": "smtp.gmail.com",
+    "port": 587,
+    "username": "",
+    "password": "",
+    "from_email": "",
+    "starttls": True,
+    "timeout": 20,
+    "pool_size": 2,            # concurrent connections / worker threads
+    "rate_per_minute": 60,     # provider send limit across all workers
+    "max_attempts": 5,
+    "idle_timeout": 120,       # close a connection unused this long
+}
+
+# connection trouble worth retrying; replies are judged by their code instead
+TRANSIENT_ERRORS = (
+    smtplib.SMTPServerDisconnected,
+    socket.timeout,
+    socket.gaierror,
+    ConnectionError,
+    ssl.SSLEOFError,           # connection cut mid-TLS, unlike a failed handshake
+    ssl.SSLZeroReturnError,
+)
+NETWORK_ERRNOS = {errno.ENETDOWN, errno.ENETUNREACH, errno.EHOSTDOWN, errno.EHOSTUNREACH}
+
+
+def load_smtp_config(overrides=None) -> dict:
+    """Merged SMTP settings: DEFAULTS < st.secrets["smtp"] < overrides."""
+    cfg = dict(DEFAULTS)
+    if overrides is None:
+        try:
+            import streamlit as st
+            overrides = dict(st.secrets.get("smtp", {}))
+        except Exception:
+            overrides = {}
+    cfg.update({k: v for k, v in overrides.items() if v not in (None, "")})
+    cfg["port"] = int(cfg["port"])
+    cfg["from_email"] = cfg["from_email"] or cfg["username"]
+    if not cfg["username"] and cfg["password"]:
+        # older secrets only set from_email + password and logged in as from_email
+        cfg["username"] = cfg["from_email"]
+    if isinstance(cfg["starttls"], str):
+        cfg["starttls"] = cfg["starttls"].strip().lower() not in ("0", "false", "no")
+    return cfg
+
+
+def _is_transient(exc) -> bool:
+    """
+    Retry connection errors and 4xx replies only. 5xx replies, failed logins,
+    refused recipients and other SMTP/TLS errors (all OSError subclasses)
+    would fail the same way again.
+    """
+    if isinstance(exc, (smtplib.SMTPAuthenticationError, smtplib.SMTPRecipientsRefused)):
+        return False
+    if isinstance(exc, smtplib.SMTPResponseException):
+        return 400 <= exc.smtp_code < 500
+    if isinstance(exc, TRANSIENT_ERRORS):
+        return True
+    if isinstance(exc, (smtplib.SMTPException, ssl.SSLError)):
+        return False
+    return isinstance(exc, OSError) and exc.errno in NETWORK_ERRNOS
+
+
+class RateLimiter:
+    """Token bucket shared by all workers."""
+
+    def __init__(self, per_minute):
+        self.rate = max(per_minute, 1) / 60.0
+        self.capacity = max(1.0, min(per_minute, 10))
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+class _Connection:
+    """One persistent, authenticated SMTP session owned by a single worker."""
+
+    def __init__(self, cfg):
+        self.cfg = cfg
+        self.smtp = None
+        self.last_used = 0.0
+
+    def _open(self):
+        cfg = self.cfg
+        smtp = smtplib.SMTP(cfg["server"], cfg["port"], timeout=cfg["timeout"])
+        smtp.ehlo()
+        if cfg["starttls"]:
+            smtp.starttls()
+            smtp.ehlo()
+        if cfg["username"]:
+            smtp.login(cfg["username"], cfg["password"])
+        self.smtp = smtp
+
+    def close(self):
+        if self.smtp is not None:
+            try:
+                self.smtp.quit()
+            except Exception:
+                pass
+            self.smtp = None
+
+    def send(self, msg):
+        if self.smtp is not None and time.monotonic() - self.last_used > self.cfg["idle_timeout"]:
+            self.close()   # server has probably dropped it already
+        if self.smtp is None:
+            self._open()
+        try:
+            self.smtp.send_message(msg)
+        except smtplib.SMTPServerDisconnected:
+            self.smtp = None
+            raise
+        self.last_used = time.monotonic()
+
+
+class Mailer:
+    def __init__(self, config=None, log_size=500):
+        self.cfg = load_smtp_config(config)
+        self.limiter = RateLimiter(self.cfg["rate_per_minute"])
+        self._queue = queue.Queue()
+        self._log = deque(maxlen=log_size)
+        self._log_lock = threading.Lock()
+        self._workers = []
+        self._start_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._retrying = 0          # messages waiting out a retry delay
+        self._retry_lock = threading.Lock()
+
+    # ---------- public API ----------
+    def build_message(self, to, subject, body, attachments=()):
+        msg = EmailMessage()
+        msg["Subject"] = subject
+        msg["From"] = self.cfg["from_email"]
+        msg["To"] = to
+        msg.set_content(body)
+        for filename, data, mime in attachments:
+            maintype, _, subtype = (mime or "application/octet-stream").partition("/")
+            msg.add_attachment(data, maintype=maintype, subtype=subtype, filename=filename)
+        return msg
+
+    def send(self, to, subject, body, attachments=()) -> str:
+        """Queue one email; returns its delivery id. Never blocks on SMTP."""
+        msg = self.build_message(to, subject, body, attachments)
+        delivery_id = uuid.uuid4().hex[:12]
+        self._record(delivery_id, to, subject, "queued", 0)
+        self._ensure_started()
+        self._queue.put((delivery_id, msg, 0))
+        return delivery_id
+
+    def deliveries(self, limit=100):
+        with self._log_lock:
+            return list(self._log)[-limit:]
+
+    def status(self, delivery_id):
+        with self._log_lock:
+            for rec in reversed(self._log):
+                if rec["id"] == delivery_id:
+                    return rec["status"]
+        return None
+
+    def pending(self) -> int:
+        return self._queue.unfinished_tasks + self._retrying
+
+    def flush(self, timeout=30.0) -> bool:
+        """Wait until every queued message is sent or given up on."""
+        deadline = time.monotonic() + timeout
+        while self.pending() and time.monotonic() < deadline:
+            time.sleep(0.05)
+        return not self.pending()
+
+    def stop(self, timeout=10.0):
+        self.flush(timeout)
+        self._stop.set()
+        for _ in self._workers:
+            self._queue.put(None)
+        for t in self._workers:
+            t.join(timeout)
+
+    # ---------- internals ----------
+    def _record(self, delivery_id, to, subject, status, attempts, error=None):
+        with self._log_lock:
+            self._log.append({
+                "id": delivery_id, "to": to, "subject": subject, "status": status,
+                "attempts": attempts, "error": error, "at": time.time(),
+            })
+        if status == "failed":
+            log.warning("email %s to %s failed after %s attempts: %s", delivery_id, to, attempts, error)
+
+    def _ensure_started(self):
+        if self._workers:
+            return
+        with self._start_lock:
+            if not self._workers:
+                for i in range(max(1, int(self.cfg["pool_size"]))):
+                    t = threading.Thread(target=self._run, name=f"mailer-{i}", daemon=True)
+                    t.start()
+                    self._workers.append(t)
+
+    def _run(self):
+        conn = _Connection(self.cfg)
+        while not self._stop.is_set():
+            try:
+                item = self._queue.get(timeout=self.cfg["idle_timeout"])
+            except queue.Empty:
+                conn.close()
+                continue
+            if item is None:
+                self._queue.task_done()
+                break
+            try:
+                self._deliver(conn, *item)
+            finally:
+                self._queue.task_done()
+        conn.close()
+
+    def _deliver(self, conn, delivery_id, msg, attempts):
+        self.limiter.acquire()
+        attempts += 1
+        try:
+            conn.send(msg)
+        except Exception as e:
+            conn.close()
+            if _is_transient(e) and attempts < self.cfg["max_attempts"]:
+                self._record(delivery_id, msg["To"], msg["Subject"], "retrying", attempts, repr(e))
+                delay = min(60.0, 2.0 ** attempts) * random.uniform(0.8, 1.2)
+                self._schedule_retry(delay, (delivery_id, msg, attempts))
+                return
+            self._record(delivery_id, msg["To"], msg["Subject"], "failed", attempts, repr(e))
+            return
+        self._record(delivery_id, msg["To"], msg["Subject"], "sent", attempts)
+
+    def _schedule_retry(self, delay, item):
+        def _requeue():
+            self._queue.put(item)
+            with self._retry_lock:
+                self._retrying -= 1
+
+        with self._retry_lock:
+            self._retrying += 1
+        t = threading.Timer(delay, _requeue)
+        t.daemon = True
+        t.start()
+
+
+_mailer = None
+_mailer_lock = threading.Lock()
+
+
+def get_mailer() -> Mailer:
+    global _mailer
+    if _mailer is None:
+        with _mailer_lock:
+            if _mailer is None:
+                _mailer = Mailer()
+                atexit.register(_mailer.stop)
+    return _mailer
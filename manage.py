@@ -0,0 +1,114 @@
+# manage.py
+"""
+Maintenance commands for the quiz database.
+
+Run from the repo root (reads DATABASE_URL env var, else .streamlit/secrets.toml):
+    python manage.py migrate          # after every deploy: add missing columns / indexes,
+                                      # then fill *_norm keys for existing rows and
+                                      # build performance_rollup / attempts if empty
+    python manage.py backfill-keys    # only fill normalized *_norm lookup columns
+    python manage.py backfill-question-ids   # link old responses to synced questions
+    python manage.py backfill-attempts       # record Main attempts for earlier submissions
+    python manage.py rebuild-rollup   # regenerate performance_rollup from responses and check it
+    python manage.py check-rollup     # only check performance_rollup against responses
+    python manage.py sync-sheets      # mirror question banks + Register into SQL (see sheet_sync.py)
+"""
+import argparse
+import time
+
+import db
+
+
+def cmd_migrate(args):
+    actions = db.ensure_schema()
+    for a in actions:
+        print(a)
+    print(f"migrate: {len(actions)} change(s)")
+
+
+def cmd_backfill_keys(args):
+    students, responses = db.backfill_normalized_keys()
+    print(f"backfill-keys: {students} student(s), {responses} response(s) updated")
+
+
+def cmd_backfill_question_ids(args):
+    updated = db.backfill_question_ids()
+    print(f"backfill-question-ids: {updated} response(s) linked")
+
+
+def cmd_backfill_attempts(args):
+    inserted, unmatched = db.backfill_attempts()
+    print(f"backfill-attempts: {inserted} attempt(s) recorded, "
+          f"{unmatched} student/subtopic group(s) not found in the Register mirror")
+    return 1 if unmatched else 0
+
+
+def _report_mismatches(mismatches):
+    for key, expected, actual in mismatches[:20]:
+        print(f"  mismatch {key}: responses={expected} rollup={actual}")
+    if len(mismatches) > 20:
+        print(f"  ... {len(mismatches) - 20} more")
+
+
+def cmd_rebuild_rollup(args):
+    written, mismatches = db.rebuild_performance_rollup()
+    print(f"rebuild-rollup: {written} row(s) written, {len(mismatches)} mismatch(es)")
+    _report_mismatches(mismatches)
+    return 1 if mismatches else 0
+
+
+def cmd_check_rollup(args):
+    mismatches = db.check_performance_rollup()
+    print(f"check-rollup: {len(mismatches)} mismatch(es)")
+    _report_mismatches(mismatches)
+    return 1 if mismatches else 0
+
+
+def cmd_sync_sheets(args):
+    from sheet_sync import sync_all
+    while True:
+        results = sync_all(force=args.force, banks=args.only in (None, "banks"),
+                           register=args.only in (None, "register"))
+        failed = 0
+        for source, outcome in results:
+            if isinstance(outcome, dict):
+                outcome = ", ".join(f"{k}={v}" for k, v in outcome.items())
+            elif outcome.startswith("error"):
+                failed += 1
+            print(f"  {source}: {outcome}")
+        print(f"sync-sheets: {len(results)} sheet(s), {failed} failed")
+        if not args.every:
+            return 1 if failed else 0
+        time.sleep(args.every)
+
+
+COMMANDS = {
+    "migrate": cmd_migrate,
+    "backfill-keys": cmd_backfill_keys,
+    "backfill-question-ids": cmd_backfill_question_ids,
+    "backfill-attempts": cmd_backfill_attempts,
+    "rebuild-rollup": cmd_rebuild_rollup,
+    "check-rollup": cmd_check_rollup,
+    "sync-sheets": cmd_sync_sheets,
+}
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    sub = ap.add_subparsers(dest="command", required=True)
+    sub.add_parser("migrate", help="add missing columns and indexes and fill new keys (run after each deploy)")
+    sub.add_parser("backfill-keys", help="fill normalized lookup columns for existing rows")
+    sub.add_parser("backfill-question-ids", help="link responses to questions synced by sync-sheets")
+    sub.add_parser("backfill-attempts", help="record Main attempts for responses saved before the attempts table")
+    sub.add_parser("rebuild-rollup", help="regenerate performance_rollup from raw responses and check it")
+    sub.add_parser("check-rollup", help="check performance_rollup against raw responses")
+    p = sub.add_parser("sync-sheets", help="mirror question banks and the Register into SQL tables")
+    p.add_argument("--only", choices=["banks", "register"], help="sync just the banks or just the Register")
+    p.add_argument("--force", action="store_true", help="diff rows even if a sheet's content hash is unchanged")
+    p.add_argument("--every", type=float, default=0, help="keep running, syncing every N seconds")
+    args = ap.parse_args()
+    return COMMANDS[args.command](args) or 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -1,46 +1,37 @@
 # pages/form_page.py
 import streamlit as st
-import pandas as pd
-import gspread
-from google.oauth2.service_account import Credentials
 from datetime import datetime
 import time
-import io
 import matplotlib.pyplot as plt
-from matplotlib.ticker import MaxNLocator
 import threading
-import requests
+import uuid
+import logging
 import base64
-import random
-import hashlib
 
 # DB helpers
-from db import save_bulk_responses
-from db import mark_and_check_teacher_notified
-
-# PDF / email libs unchanged
-from reportlab.pdfgen import canvas
-from reportlab.lib.pagesizes import A4
-from reportlab.lib.utils import ImageReader
-from reportlab.platypus import (
-    SimpleDocTemplate,
-    Table,
-    TableStyle,
-    Paragraph,
-    Spacer,
-    Image,
-)
-from reportlab.lib import colors
-from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-from reportlab.pdfbase import pdfmetrics
-from reportlab.pdfbase.ttfonts import TTFont
-from reportlab.pdfbase.cidfonts import UnicodeCIDFont
-
-import smtplib
-from email.message import EmailMessage
-from email.mime.text import MIMEText
-from email.mime.multipart import MIMEMultipart
-from email.mime.application import MIMEApplication
+from db import mark_and_check_teacher_notified, has_attempted
+# Durable background writer for DB saves and sheet appends
+from write_queue import get_write_queue, QueueFull
+# Responses-sheet rows: buffered across sessions, quota-aware
+from sheet_writer import queue_rows
+# Sheets gateway: coalesced, rate-limited, retried (fake backend for offline runs)
+from sheets_gateway import get_gateway
+# Register indexed by (Tuition_Code, Student_ID), refreshed in the background
+from register_index import get_register_index
+# Main + Remedial banks, indexed by SubtopicID / MainQuestionID, refreshed in the background
+from question_bank import get_question_bank, BANK_MAP
+# Questions compiled once per bank load (ids, options, answer key, marks)
+from quiz_model import grade
+from grading import normalize_answer
+# Browser-side quiz runtime (one rerun per submission)
+from quiz_component import client_quiz, take_submission, rearm_quiz
+# Shared on-disk image cache + parallel prefetch
+from image_cache import get_variant, prefetch as prefetch_images
+# PDF reports built in a process pool, cached by content hash
+from reports import performance_chart, report_key, submit_report, report_status, report_bytes, wait_for_report
+
+# Pooled, rate-limited SMTP dispatcher for report emails
+from mailer import get_mailer
 
 st.set_page_config(page_title="Quiz Form", layout="centered")
 ss = st.session_state
@@ -90,33 +81,10 @@ if "remedial_page" not in ss:
     ss["remedial_page"] = 0
 
 # ---------- Helpers: caching, image fetch, background worker ----------
-@st.cache_data(ttl=600)
-def load_sheet_df(sheet_url, worksheet_name):
-    """Cached load of a worksheet by name for 10 minutes."""
-    book = client.open_by_url(sheet_url)
-    # defensive: find worksheet case-insensitively
-    for w in book.worksheets():
-        if w.title.strip().lower() == worksheet_name.strip().lower():
-            return pd.DataFrame(w.get_all_records())
-    # fallback
-    ws = book.worksheet(worksheet_name)
-    return pd.DataFrame(ws.get_all_records())
-
-@st.cache_data(ttl=3600)
-def fetch_image_bytes(url):
-    """Download image and cache bytes. Returns None on failure."""
-    if not url:
-        return None
-    try:
-        r = requests.get(url, timeout=6)
-        if r.status_code == 200:
-            return r.content
-    except Exception:
-        return None
-    return None
-
 def run_in_background(fn, *args, **kwargs):
-    """Fire-and-forget: run fn in separate thread to avoid blocking UI."""
+    """Fire-and-forget: run fn in separate thread to avoid blocking UI.
+       Only for waiting on report PDFs now; DB saves and sheet appends go
+       through write_queue and emails through mailer."""
     try:
         t = threading.Thread(target=fn, args=args, kwargs=kwargs, daemon=True)
         t.start()
@@ -127,111 +95,37 @@ def run_in_background(fn, *args, **kwargs):
         except Exception:
             pass
 
-# ---------- PDF builder (single canonical function) ----------
-def build_pdf_bytes(subject, subtopic_id, res, fig, ss_snapshot):
-    """Single PDF builder used for both download and emails.
-       Keeps fig small (reduced DPI) to speed serialization."""
-    buffer = io.BytesIO()
-    doc = SimpleDocTemplate(buffer, pagesize=A4)
-    elements = []
-    styles = getSampleStyleSheet()
-    normal = ParagraphStyle("NormalUnicode", parent=styles["Normal"], fontName="Helvetica", fontSize=10)
-
-    info = ss_snapshot.get("student_info", {})
-    elements.append(Paragraph(f"Quiz Report: {subject} — {subtopic_id}", styles["Title"]))
-    elements.append(Paragraph(f"Student: {info.get('StudentName','Unknown')} ({info.get('Student_ID','')})", styles["Normal"]))
-    elements.append(Paragraph(f"Date: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}", styles["Normal"]))
-    elements.append(Spacer(1, 12))
-
-    if fig:
-        # save fig with smaller dpi to reduce size/cost
-        chart_buf = io.BytesIO()
-        fig.savefig(chart_buf, format="PNG", bbox_inches="tight", dpi=80)
-        chart_buf.seek(0)
-        elements.append(Image(chart_buf, width=360, height=180))
-        elements.append(Spacer(1, 16))
-
-    table_data = [[
-        Paragraph("Q.No", normal),
-        Paragraph("Question", normal),
-        Paragraph("Your Answer", normal),
-        Paragraph("Correct Answer", normal),
-    ]]
-    for q in res.get("questions", []):
-        table_data.append([
-            Paragraph(str(q.get("qid","")), normal),
-            Paragraph(str(q.get("question","")), normal),
-            Paragraph(str(q.get("student","")), normal),
-            Paragraph(str(q.get("correct","")), normal),
-        ])
-    table = Table(table_data, repeatRows=1, colWidths=[50, 220, 120, 120])
-    table.setStyle(TableStyle([
-        ('BACKGROUND', (0,0), (-1,0), colors.lightgrey),
-        ('GRID', (0,0), (-1,-1), 0.5, colors.black),
-        ('FONTSIZE', (0,0), (-1,-1), 9),
-    ]))
-    elements.append(table)
-
-    earned = res.get("earned", 0); total = res.get("total", 0)
-    elements.append(Spacer(1, 12))
-    elements.append(Paragraph(f"Score: {earned}/{total}", styles["Heading2"]))
-
-    doc.build(elements)
-    buffer.seek(0)
-    return buffer.read()
-
-# ---------- Email helpers (unchanged semantics) ----------
+# ---------- Report PDF (built in the report process pool) ----------
+@st.fragment(run_every=1.0)
+def report_progress(key):
+    """Polls the report build without blocking the page; full rerun once it's ready."""
+    status = report_status(key)
+    if status == "done":
+        st.rerun()
+    elif status == "error":
+        st.error("Could not build the PDF report. Please try again.")
+    else:
+        st.info("⏳ Preparing your PDF report…")
+
+def send_report_when_ready(key, send):
+    """Background thread: wait for the shared PDF bytes, then send(pdf_bytes)."""
+    send(wait_for_report(key, timeout=180))
+
+# ---------- Email helpers (queued on the shared mailer) ----------
 def send_report_to_student(to_email, pdf_bytes):
-    msg = EmailMessage()
-    msg["Subject"] = "Your Quiz Report"
-    msg["From"] = "noreply@myschool.com"
-    msg["To"] = to_email
-    msg.set_content("Attached is your quiz performance report.")
-    msg.add_attachment(pdf_bytes, maintype="application", subtype="pdf", filename="quiz_report.pdf")
-    smtp_cfg = st.secrets.get("smtp", {})
-    try:
-        with smtplib.SMTP(smtp_cfg.get("server"), int(smtp_cfg.get("port"))) as server:
-            server.starttls()
-            server.login(smtp_cfg.get("username"), smtp_cfg.get("password"))
-            server.send_message(msg)
-    except Exception as e:
-        # swallow here; caller will show friendly message
-        raise
+    return get_mailer().send(
+        to_email, "Your Quiz Report", "Attached is your quiz performance report.",
+        attachments=[("quiz_report.pdf", pdf_bytes, "application/pdf")],
+    )
 
 def send_report_to_parent(parent_email, pdf_bytes, student_name):
-    from_email = st.secrets["smtp"]["from_email"]
-    password = st.secrets["smtp"]["password"]
-    msg = MIMEMultipart()
-    msg["From"] = from_email
-    msg["To"] = parent_email
-    msg["Subject"] = f"Quiz Report for {student_name}"
-    msg.attach(MIMEText("Please find attached the quiz report.", "plain"))
-    part = MIMEApplication(pdf_bytes, Name="report.pdf")
-    part["Content-Disposition"] = 'attachment; filename="report.pdf"'
-    msg.attach(part)
-    try:
-        server = smtplib.SMTP("smtp.gmail.com", 587)
-        server.starttls()
-        server.login(from_email, password)
-        server.sendmail(from_email, parent_email, msg.as_string())
-        server.quit()
-    except Exception as e:
-        raise
+    return get_mailer().send(
+        parent_email, f"Quiz Report for {student_name}", "Please find attached the quiz report.",
+        attachments=[("report.pdf", pdf_bytes, "application/pdf")],
+    )
 
 def send_email_simple(to, subject, body):
-    smtp_cfg = st.secrets.get("smtp", {})
-    msg = EmailMessage()
-    msg["Subject"] = subject
-    msg["From"] = smtp_cfg.get("from_email")
-    msg["To"] = to
-    msg.set_content(body)
-    try:
-        with smtplib.SMTP(smtp_cfg.get("server"), smtp_cfg.get("port")) as server:
-            server.starttls()
-            server.login(smtp_cfg.get("username"), smtp_cfg.get("password"))
-            server.send_message(msg)
-    except Exception:
-        raise
+    return get_mailer().send(to, subject, body)
 
 # ---------- small utilities (kept) ----------
 def get_params():
@@ -246,65 +140,48 @@ def get_params():
         return v
     return pick
 
-def normalize_img_url(value: str) -> str:
-    v = str(value or "").strip()
-    if not v: return ""
-    if "drive.google.com" in v and "id=" not in v:
-        import re
-        m = re.search(r"/d/([a-zA-Z0-9_-]+)", v)
-        if m:
-            fid = m.group(1)
-            return f"https://drive.google.com/uc?export=view&id={fid}"
-    return v
-
-def stable_shuffle(items, seed_str):
-    seq = list(items)
-    h = int(hashlib.md5(seed_str.encode("utf-8")).hexdigest(), 16)
-    rnd = random.Random(h)
-    rnd.shuffle(seq)
-    return seq
-
-def get_correct_value(row):
-    if "CorrectOption" in row and str(row.get("CorrectOption","")).strip():
-        return str(row.get("CorrectOption","")).strip()
-    if "Correct_Answer" in row and str(row.get("Correct_Answer","")).strip():
-        return str(row.get("Correct_Answer","")).strip()
-    return str(row.get("CorrectAnswer","")).strip()
-
 def safe_str(v):
     return str(v) if v is not None else ""
 
-def all_answered_main(q_rows):
-    for row in q_rows:
-        qid = str(row.QuestionID).strip()
-        ans = ss["main_user_answers"].get(qid)
-        if not ans:
-            return False
-    return True
+def student_quiz(key, quiz, seed_prefix):
+    """This student's option order for a compiled quiz, computed once per session."""
+    view = ss.get(key)
+    if view is None or view.quiz is not quiz or view.seed != seed_prefix:
+        view = ss[key] = quiz.for_student(seed_prefix)
+    return view
+
+def render_review_options(disp_opts, student_ans, correct):
+    # compare the way grading.py does, so review always agrees with the score
+    student_ans, correct = normalize_answer(student_ans), normalize_answer(correct)
+    for opt in disp_opts:
+        norm_opt = normalize_answer(opt)
+        if norm_opt == student_ans:
+            if norm_opt == correct:
+                st.markdown(
+                    f"<div style='background-color: rgba(0,255,0,0.15); padding:4px; border-radius:5px; display:flex; justify-content:space-between;'><span>{opt}</span><span>✅ Correct</span></div>",
+                    unsafe_allow_html=True
+                )
+            else:
+                st.markdown(
+                    f"<div style='background-color: rgba(255,0,0,0.15); padding:4px; border-radius:5px; display:flex; justify-content:space-between;'><span>{opt}</span><span>❌ Incorrect</span></div>",
+                    unsafe_allow_html=True
+                )
+        elif norm_opt == correct:
+            st.markdown(f"<div style='display:flex; justify-content:space-between;'><span>{opt}</span><span>✅ Correct</span></div>", unsafe_allow_html=True)
+        else:
+            st.markdown(f"<div>{opt}</div>", unsafe_allow_html=True)
 
 # ---------- PARAMS & BANK (unchanged) ----------
 param = get_params()
 subject = param("subject", "").strip()
 subtopic_id = param("subtopic_id", "").strip()
 bank = param("bank", subject).strip().lower()
+# ui=client: whole quiz runs in the browser component and submits once (quiz_component.py)
+client_runtime = param("ui", "").strip().lower() == "client"
+unlock_code = param("unlock_code", "").strip()
 
-bank_map = {
-    "mathematics": ("ssc_maths_geometry", "ssc_maths_geometry_r"),
-    "maths": ("ssc_maths_geometry", "ssc_maths_geometry_r"),
-    "geometry": ("ssc_maths_geometry", "ssc_maths_geometry_r"),
-    "algebra": ("ssc_maths_algebra", "ssc_maths_algebra_r"),
-    "ssc_maths_geometry": ("ssc_maths_geometry", "ssc_maths_geometry_r"),
-    "ssc_maths_algebra": ("ssc_maths_algebra", "ssc_maths_algebra_r"),
-    "science": ("ssc_science_part_1", "ssc_science_part_1_r"),
-    "science1": ("ssc_science_part_1", "ssc_science_part_1_r"),
-    "science_1": ("ssc_science_part_1", "ssc_science_part_1_r"),
-    "science2": ("ssc_science_part_2", "ssc_science_part_2_r"),
-    "science_2": ("ssc_science_part_2", "ssc_science_part_2_r"),
-    "ssc_science_part_1": ("ssc_science_part_1", "ssc_science_part_1_r"),
-    "ssc_science_part_2": ("ssc_science_part_2", "ssc_science_part_2_r"),
-    "english": ("ssc_english", "ssc_english_r"),
-    "ssc_english": ("ssc_english", "ssc_english_r"),
-}
+# subject -> sheet keys (shared with the Sheets -> SQL sync, see question_bank.py)
+bank_map = BANK_MAP
 
 if not subject or not subtopic_id:
     st.error("❌ Missing `subject` or `subtopic_id` in URL.")
@@ -323,20 +200,18 @@ except KeyError as e:
     st.error(f"❌ Missing sheet key in secrets.toml: {e}")
     st.stop()
 
-# ---------- Google auth & client ----------
-scope = ["https://spreadsheets.google.com/feeds","https://www.googleapis.com/auth/drive"]
+# ---------- Google auth & client (built once per process, see sheets_gateway.py) ----------
 try:
-    creds = Credentials.from_service_account_info(st.secrets["gcp_service_account"], scopes=scope)
+    # the client is built lazily; connect() builds and authorizes it here so a
+    # bad service account gets this message rather than a traceback later
+    sheets = get_gateway().connect()
 except Exception:
     st.error("Missing/invalid `gcp_service_account` in secrets.")
     st.stop()
-client = gspread.authorize(creds)
 
-# ---------- register sheet (unchanged) ----------
+# ---------- register (SQL mirror of the sheet, see sheet_sync.py; sheet until first sync) ----------
 try:
-    reg_book = client.open_by_url(st.secrets["google"]["register_sheet_url"])
-    reg_ws = reg_book.worksheets()[0]
-    register_df = pd.DataFrame(reg_ws.get_all_records())
+    register_index = get_register_index(st.secrets["google"]["register_sheet_url"], mirrored=True)
 except Exception:
     st.error("Unable to load Register sheet. Check URL and sharing with service account.")
     st.stop()
@@ -359,13 +234,13 @@ if verify_submit:
     if not tuition_code.strip() or not student_id.strip() or not student_password.strip():
         st.error("⚠ Please fill in Tuition Code, Student ID and Password.")
     else:
-        mask = (
-            (register_df["Tuition_Code"].astype(str).str.strip() == tuition_code.strip()) &
-            (register_df["Student_ID"].astype(str).str.strip() == student_id.strip()) &
-            (register_df["Password"].astype(str).str.strip() == student_password.strip())
-        )
-        if mask.any():
-            student_row = register_df[mask].iloc[0]
+        try:
+            # loads lazily: the sheet index on first use, or a point query on the mirror
+            student_row = register_index.verify(tuition_code, student_id, student_password)
+        except Exception:
+            st.error("Unable to load Register sheet. Check URL and sharing with service account.")
+            st.stop()
+        if student_row is not None:
             st.success(f"✅ Verified: {student_row['Student_Name']} ({student_row['Tuition_Name']})")
             ss["student_verified"] = True
             ss["student_info"] = {
@@ -382,23 +257,17 @@ if verify_submit:
                 "Student_ID": student_id.strip(),
                 "Password": student_password.strip(),  
             }
-            # 🔎 --- NEW: Check if student already attempted this quiz ---
-#            try:
-#                resp_records = responses_ws.get_all_records()
-#                resp_df = pd.DataFrame(resp_records)
-#                
-#                already_main = (
-#                    (resp_df["Student_ID"].astype(str).str.strip() == student_id.strip()) &
-#                    (resp_df["Tuition_Code"].astype(str).str.strip() == tuition_code.strip()) &
-#                    (resp_df["Subtopic"].astype(str).str.strip() == subtopic_id) &
-#                    (resp_df["Attempt_Type"].astype(str).str.strip() == "Main")
-#                ).any()
-#                
-#                if already_main:
-#                    st.error("❌ You have already submitted this Main Quiz. Please wait for your teacher to share another form.")
-#                    st.stop()
-#            except Exception as e:
-#                st.warning(f"⚠ Could not verify previous attempts: {e}")           
+            ss["quiz_started_at"] = datetime.utcnow().isoformat()
+            # 🔎 --- Check if student already attempted this quiz (indexed lookup on attempts) ---
+            try:
+                already_main = has_attempted(tuition_code, student_id, subject, subtopic_id, "Main")
+            except Exception as e:
+                already_main = False
+                st.warning(f"⚠ Could not verify previous attempts: {e}")
+            if already_main:
+                ss["student_verified"] = False
+                st.error("❌ You have already submitted this Main Quiz. Please wait for your teacher to share another form.")
+                st.stop()
         else:
             st.error("❌ Invalid Tuition Code or Student ID. Please try again.")
 
@@ -486,50 +355,45 @@ window.addEventListener("blur", triggerCheatLock, { passive: true });
 }
 </style>
 """
-st.markdown(ANTI_CHEAT_JS, unsafe_allow_html=True)
+if not client_runtime:
+    # the client runtime carries its own copy of the lock inside the component
+    st.markdown(ANTI_CHEAT_JS, unsafe_allow_html=True)
 
-# ---------- LOAD MAIN QUESTIONS (lazy remedial load: only main now) ----------
+# ---------- LOAD QUESTION BANK (Main + Remedial from the SQL mirror, cached & indexed; see question_bank.py) ----------
 try:
-    q_book = client.open_by_url(qsheet_url)
-    main_ws = None
-    for w in q_book.worksheets():
-        if w.title.strip().lower() == "main":
-            main_ws = w
-            break
-    if main_ws is None:
-        main_ws = q_book.worksheet("Main")
-    # load only main now (remedial will be loaded later on-demand)
-    main_df = pd.DataFrame(main_ws.get_all_records())
+    question_bank = get_question_bank(qsheet_url, bank_key=qsheet_key).get()
 except Exception as e:
     st.error("Unable to load Main worksheet. Check names & sharing.")
     st.stop()
 
-main_df.columns = main_df.columns.str.strip()
-main_df["SubtopicID"] = main_df["SubtopicID"].astype(str).str.strip()
-main_questions = main_df[main_df["SubtopicID"] == subtopic_id].copy()
-if main_questions.empty:
+main_quiz = question_bank.main_quiz(subtopic_id)
+# start downloading every image of this subtopic (main + its remedials) right away
+prefetch_images(main_quiz.images)
+if question_bank.remedial_has_main_ids:
+    prefetch_images(question_bank.remedial_quiz(main_quiz.ids).images)
+if not len(main_quiz):
     st.warning("No questions found for the subtopic.")
     st.stop()
 
-# ---------- Responses sheet (unchanged) ----------
-try:
-    resp_book = client.open_by_url(rsheet_url)
-    responses_ws = resp_book.worksheets()[0]
-except Exception:
-    st.error("Unable to open Responses sheet. Check URL & sharing.")
-    st.stop()
+# ---------- Responses sheet: checked once per session, not on every rerun ----------
+if ss.get("responses_sheet_ok") != rsheet_url:
+    try:
+        sheets.titles(rsheet_url)
+        ss["responses_sheet_ok"] = rsheet_url
+    except Exception:
+        st.error("Unable to open Responses sheet. Check URL & sharing.")
+        st.stop()
 
-def append_response_row(timestamp, student_id_v, student_name, tuition_code_v,
-                        chapter_v, subtopic_v, qnum, given, correct, awarded, attempt_type):
-    """Append to Google sheet in background for best-effort."""
-    def _append():
-        try:
-            responses_ws.append_row([timestamp, student_id_v, student_name, tuition_code_v,
-                                     chapter_v, subtopic_v, qnum, given, correct, awarded, attempt_type])
-        except Exception:
-            pass
-    # fire-and-forget so UI is not blocked
-    run_in_background(_append)
+write_queue = get_write_queue()
+
+def response_row(timestamp, student_id_v, student_name, tuition_code_v,
+                 chapter_v, subtopic_v, qnum, given, correct, awarded, attempt_type):
+    return [timestamp, student_id_v, student_name, tuition_code_v,
+            chapter_v, subtopic_v, qnum, given, correct, awarded, attempt_type]
+
+def append_response_rows(rows):
+    """Queue rows for the Responses sheet (durable; batched with other sessions)."""
+    queue_rows(rsheet_url, rows)
 
 # ---------- HEADER & seeds ----------
 st.title(f"📄 {subject.title()} — {subtopic_id.replace('_',' ')}")
@@ -538,79 +402,79 @@ seed_base = f"{info.get('Student_ID','anon')}::{subtopic_id}"
 
 # ---------- MAIN QUIZ UI (mostly unchanged, with image caching) ----------
 st.header("Main Quiz (Attempt 1)")
-q_rows = list(main_questions.itertuples(index=False))
+main_view = student_quiz("main_view", main_quiz, seed_base + "::OPT::")
 
 ss.setdefault("main_user_answers", {})
 ss.setdefault("main_submitted", False)
 ss.setdefault("main_results", {})
+# one id per main attempt: a double submit or a retried DB write reuses it
+ss.setdefault("main_submission_id", uuid.uuid4().hex)
+
+def reject_main_submit(msg):
+    """
+    Refuse a Main submit. The client runtime disabled itself when it posted,
+    so re-arm it and carry the message over the rerun that delivers that.
+    """
+    if client_runtime:
+        rearm_quiz("main_client_quiz")
+        ss["main_flash"] = msg
+        st.rerun()
+    st.error(msg)
 
 if not ss["main_submitted"]:
-    with st.form("main_quiz"):
-        for i, row in enumerate(q_rows, start=1):
-            rowd  = row._asdict()
-            qid   = str(rowd.get("QuestionID","")).strip()
-            qtext = str(rowd.get("QuestionText","")).strip()
-            img   = normalize_img_url(rowd.get("ImageURL",""))
-
-            opts = [str(rowd.get("Option_A","") or "").strip(),
-                    str(rowd.get("Option_B","") or "").strip(),
-                    str(rowd.get("Option_C","") or "").strip(),
-                    str(rowd.get("Option_D","") or "").strip()]
-            opts = [o for o in opts if o]
-            disp_opts = stable_shuffle(opts, seed_base + f"::OPT::{qid}")
-
-            st.markdown(f"**{qid}**<br>{qtext}", unsafe_allow_html=True)  #st.markdown(qtext)
-            if img:
-                img_bytes = fetch_image_bytes(img)
-                if img_bytes:
-                    st.image(img_bytes, use_container_width=True)
-                else:
-                    # fallback: show URL (non-blocking)
-                    st.markdown(f"_Image could not be loaded — {img}_")
-
-            prev = ss["main_user_answers"].get(qid, None)
-            sel = st.radio(
-                "Select your answer:",
-                options=disp_opts,
-                key=f"main_{qid}",
-                index=disp_opts.index(prev) if prev in disp_opts else None
-            )
-            ss["main_user_answers"][qid] = sel
-            st.markdown("---")
+    flash = ss.pop("main_flash", None)
+    if flash:
+        st.error(flash)
+    if client_runtime:
+        answers = take_submission(client_quiz(
+            main_view, key="main_client_quiz", submit_label="Submit Main Quiz", unlock_code=unlock_code))
+        submit_main = answers is not None
+        if submit_main:
+            ss["main_user_answers"] = answers
+    else:
+        with st.form("main_quiz"):
+            for q, disp_opts in main_view:
+                qid, img = q.qid, q.image
+                st.markdown(f"**{qid}**<br>{q.text}", unsafe_allow_html=True)  #st.markdown(qtext)
+                if img:
+                    img_bytes = get_variant(img, "display")
+                    if img_bytes:
+                        st.image(img_bytes, use_container_width=True)
+                    else:
+                        # fallback: show URL (non-blocking)
+                        st.markdown(f"_Image could not be loaded — {img}_")
+
+                prev = ss["main_user_answers"].get(qid, None)
+                sel = st.radio(
+                    "Select your answer:",
+                    options=list(disp_opts),
+                    key=f"main_{qid}",
+                    index=disp_opts.index(prev) if prev in disp_opts else None
+                )
+                ss["main_user_answers"][qid] = sel
+                st.markdown("---")
 
-        submit_main = st.form_submit_button("Submit Main Quiz")
+            submit_main = st.form_submit_button("Submit Main Quiz")
 
     if submit_main:
-        if not all_answered_main(q_rows):
-            st.error("Please answer all questions before submitting (all are compulsory).")
+        if main_view.missing(ss["main_user_answers"]):
+            reject_main_submit("Please answer all questions before submitting (all are compulsory).")
+        elif has_attempted(ss["student_info"].get("Tuition_Code", ""), ss["student_info"].get("Student_ID", ""),
+                           subject, subtopic_id, "Main"):
+            # e.g. submitted from another tab; the DB unique key would skip it anyway
+            reject_main_submit("❌ You have already submitted this Main Quiz.")
         else:
-            total_marks = 0
-            earned_marks = 0
-            wrong_ids = []
+            graded = grade(main_quiz, ss["main_user_answers"])
             question_results = []
             bulk_rows = []
 
-            for _, q in main_questions.iterrows():
-                qid     = str(q.get("QuestionID","")).strip()
-                qtext   = str(q.get("QuestionText","")).strip()
-                img     = normalize_img_url(q.get("ImageURL",""))
-                correct = get_correct_value(q)
-                given   = str(ss["main_user_answers"].get(qid,"")).strip()
-                marks   = int(q.get("Marks") or 1)
-
-                total_marks += marks
-                awarded = marks if (given and given == correct) else 0
-                earned_marks += awarded
-                if awarded == 0:
-                    wrong_ids.append(qid)
-
+            for q, given, awarded in graded.rows:
                 question_results.append({
-                    "qid": qid,
-                    "question": qtext,
-                    "image": img,
-                    "options": [o for o in [q.get("Option_A"), q.get("Option_B"),
-                                            q.get("Option_C"), q.get("Option_D")] if o],
-                    "correct": correct,
+                    "qid": q.qid,
+                    "question": q.text,
+                    "image": q.image,
+                    "options": list(q.options),
+                    "correct": q.answer,
                     "student": given
                 })
 
@@ -620,19 +484,56 @@ if not ss["main_submitted"]:
                     ss["student_info"].get("Tuition_Code", ""),
                     subject,
                     subtopic_id,
-                    qid,
+                    q.qid,
                     given,
-                    correct
+                    q.answer
                 ))
 
             if bulk_rows:
-                # Save to DB in background (so UI isn't blocked by DB)
-                run_in_background(save_bulk_responses, bulk_rows)
+                # Spool for the background writer (so UI isn't blocked by DB)
+                # the attempt row is written in the same transaction; a duplicate is skipped
+                try:
+                    write_queue.enqueue("db_responses", {
+                        "rows": bulk_rows,
+                        "submission_id": ss["main_submission_id"],
+                        "bank": qsheet_key,   # the bank these questions were served from
+                        "attempt": {
+                            "tuition_code": ss["student_info"].get("Tuition_Code", ""),
+                            "student_id": ss["student_info"].get("Student_ID", ""),
+                            "student_email": ss["student_info"].get("StudentEmail", ""),
+                            "subject": subject,
+                            "subtopic": subtopic_id,
+                            "attempt_type": "Main",
+                            "started_at": ss.get("quiz_started_at"),
+                            "submitted_at": datetime.utcnow().isoformat(),
+                        },
+                    })
+                except QueueFull:
+                    # nothing recorded yet; the same submission id is reused on the retry
+                    reject_main_submit("⚠ Could not save your answers right now. Please submit again in a moment.")
+                    st.stop()
+
+            # first Main submission of this class quiz: tell the teacher once
+            # (atomic across sessions and processes, see db.mark_and_check_teacher_notified)
+            teacher_email = ss["student_info"].get("TeacherEmail", "")
+            if teacher_email:
+                try:
+                    if mark_and_check_teacher_notified(ss["student_info"].get("Tuition_Code", ""), subject, subtopic_id):
+                        send_email_simple(
+                            teacher_email,
+                            f"First submission: {subject} / {subtopic_id.replace('_', ' ')}",
+                            f"{ss['student_info'].get('StudentName', 'A student')} "
+                            f"({ss['student_info'].get('Tuition_Code', '')}) has submitted the Main quiz. "
+                            "Results for the class are now on the Teacher Dashboard.",
+                        )
+                except Exception as e:
+                    # never block the student's submission on the teacher notification
+                    logging.getLogger(__name__).warning("teacher notification failed: %r", e)
 
             ss["main_results"] = {
-                "total": total_marks,
-                "earned": earned_marks,
-                "wrong_ids": wrong_ids,
+                "total": graded.total,
+                "earned": graded.earned,
+                "wrong_ids": graded.wrong_ids,
                 "questions": question_results
             }
             ss["main_submitted"] = True
@@ -653,42 +554,17 @@ if ss.get("main_submitted", False):
     st.markdown("### Main Quiz Review")
     st.success(f"Score: {earned}/{total}")
 
-    for q in res.get("questions", []):
-        qid   = str(q.get("qid", "")).strip()
-        qtext = str(q.get("question", "")).strip()
-        qimg  = q.get("image", "")
-        correct = q.get("correct", "")
-        opts = q.get("options", [])
-
-        disp_opts = stable_shuffle(opts, f"MAIN::{qid}")
-
-        st.markdown(f"**{qid}**<br>{qtext}", unsafe_allow_html=True)
-        if qimg:
-            img_bytes = fetch_image_bytes(qimg)
+    answers_by_id = {q.get("qid"): q.get("student", "") for q in res.get("questions", [])}
+    for q, disp_opts in main_view:
+        st.markdown(f"**{q.qid}**<br>{q.text}", unsafe_allow_html=True)
+        if q.image:
+            img_bytes = get_variant(q.image, "display")
             if img_bytes:
                 st.image(img_bytes, use_container_width=True)
             else:
                 st.markdown("_Image could not be loaded_")
 
-        student_ans = q.get("student", "")
-
-        for opt in disp_opts:
-            if opt == student_ans:
-                if opt == correct:
-                    st.markdown(
-                        f"<div style='background-color: rgba(0,255,0,0.15); padding:4px; border-radius:5px; display:flex; justify-content:space-between;'><span>{opt}</span><span>✅ Correct</span></div>",
-                        unsafe_allow_html=True
-                    )
-                else:
-                    st.markdown(
-                        f"<div style='background-color: rgba(255,0,0,0.15); padding:4px; border-radius:5px; display:flex; justify-content:space-between;'><span>{opt}</span><span>❌ Incorrect</span></div>",
-                        unsafe_allow_html=True
-                    )
-            elif opt == correct:
-                st.markdown(f"<div style='display:flex; justify-content:space-between;'><span>{opt}</span><span>✅ Correct</span></div>", unsafe_allow_html=True)
-            else:
-                st.markdown(f"<div>{opt}</div>", unsafe_allow_html=True)
-
+        render_review_options(disp_opts, answers_by_id.get(q.qid, ""), q.answer)
         st.markdown("---")
 
     st.success(f"Final Score: {earned}/{total}")
@@ -707,74 +583,61 @@ if ss.get("main_submitted", False):
     sbg     = st.get_option("theme.secondaryBackgroundColor") or ("#F5F5F5" if base == "light" else "#262730")
     error   = "#E53935" if base == "light" else "#FF6B6B"
 
-    fig, ax = plt.subplots(figsize=(5.5, 3.2), constrained_layout=True)
-    fig.patch.set_facecolor(bg)
-    ax.set_facecolor(sbg)
-
-    labels = ["Correct", "Incorrect"]
-    values = [correct_q, incorrect_q]
-    bars = ax.bar(labels, values, edgecolor=text, linewidth=0.6)
-
-    # tint bars with theme colors
-    bars[0].set_color(primary)
-    bars[1].set_color(error)
-
-    ymax = max(values + [1])
-    ax.set_ylim(0, ymax + 1)
-    ax.yaxis.set_major_locator(MaxNLocator(nbins=6, integer=True))
-    ax.grid(axis="y", linestyle="--", linewidth=0.7, alpha=0.3)
-
-    ax.set_title("Main Performance", color=text, fontsize=14, weight="bold", pad=10)
-    ax.set_ylabel("Number of Questions", color=text, fontsize=11)
-    ax.tick_params(axis="x", colors=text, labelsize=11)
-    ax.tick_params(axis="y", colors=text, labelsize=10)
-
-    for spine in ["top", "right"]:
-        ax.spines[spine].set_visible(False)
-    for spine in ["left", "bottom"]:
-        ax.spines[spine].set_color(text)
-        ax.spines[spine].set_alpha(0.25)
+    chart = {
+        "correct": correct_q,
+        "incorrect": incorrect_q,
+        "colors": {"primary": primary, "error": error, "text": text, "bg": bg, "sbg": sbg},
+    }
+    fig = performance_chart(correct_q, incorrect_q, chart["colors"])
+    st.pyplot(fig)
 
-    for r in bars:
-        h = r.get_height()
-        ax.annotate(f"{int(h)}", xy=(r.get_x() + r.get_width() / 2, h), xytext=(0, 5),
-                    textcoords="offset points", ha="center", va="bottom",
-                    color=text, fontsize=11, weight="bold")
+    # PDF is built once per (subject, subtopic, results, student) in the report
+    # process pool, and only after Download or Email is clicked; download and
+    # both emails share the same bytes. The key is just a hash, cheap per render.
+    report_args = (subject, subtopic_id, res, ss["student_info"], chart)
+    main_report_key = report_key(*report_args)
+    report_name = f"report_{ss['student_info'].get('Student_ID','')}_{subtopic_id}.pdf"
 
-    st.pyplot(fig)
-        # Streamlit returns True only on click; this block is rarely triggered in some versions,
-    
-    # Provide explicit download and email builders (build on demand)
     if st.button("Build & Download PDF Report"):
-        # build pdf (blocking but user triggered)
-        pdf_bytes = build_pdf_bytes(subject, subtopic_id, res, fig, ss)
-        st.download_button(
-            "Download ready PDF",
-            data=pdf_bytes,
-            file_name=f"report_{ss['student_info'].get('Student_ID','')}_{subtopic_id}.pdf",
-            mime="application/pdf",
-            key=f"download_main_{subject}_{subtopic_id}_ready"
-        )
-        # also send to parent using background thread so UI doesn't freeze
+        submit_report(*report_args)
+        ss["report_requested"] = main_report_key
+        # also send to parent in the background once the PDF exists
         parent_email = ss["student_info"].get("ParentEmail", "")
         student_name = ss["student_info"].get("StudentName", "Student")
         if parent_email:
             try:
-                run_in_background(send_report_to_parent, parent_email, pdf_bytes, student_name)
+                run_in_background(send_report_when_ready, main_report_key,
+                                  lambda pdf: send_report_to_parent(parent_email, pdf, student_name))
                 st.success(f"Parent report queued to send to {parent_email}")
             except Exception as e:
                 st.warning(f"Could not queue parent email: {e}")
-                                
+
+    if ss.get("report_requested") == main_report_key:
+        if report_status(main_report_key) == "missing":
+            # evicted from the report cache since the click; build it again
+            submit_report(*report_args)
+        pdf_bytes = report_bytes(main_report_key)
+        if pdf_bytes is not None:
+            st.download_button(
+                "Download ready PDF",
+                data=pdf_bytes,
+                file_name=report_name,
+                mime="application/pdf",
+                key=f"download_main_{subject}_{subtopic_id}_ready"
+            )
+        else:
+            report_progress(main_report_key)
+
     # Student email (explicit)
     if st.button("📧 Send Copy to My Email", key=f"email_main_{subject}_{subtopic_id}"):
         student_email = ss.get("student_info", {}).get("StudentEmail", "")
         if not student_email:
             st.error("No student email found in register.")
         else:
-            # build pdf and send in background
-            pdf_bytes = build_pdf_bytes(subject, subtopic_id, res, fig, ss)
             try:
-                run_in_background(send_report_to_student, student_email, pdf_bytes)
+                submit_report(*report_args)
+                run_in_background(send_report_when_ready, main_report_key,
+                                  lambda pdf: send_report_to_student(student_email, pdf))
                 st.success("📧 Report queued to be sent to your email.")
             except Exception as e:
                 st.error(f"Could not queue sending email: {e}")
@@ -784,134 +647,119 @@ if ss.get("main_submitted", False):
 if ss.get("remedial_ready", False):
     st.header("Remedial Quiz")
 
-    # Load remedial DF on demand (cached)
-    with st.spinner("Loading remedial questions..."):
-        try:
-            remedial_df = load_sheet_df(qsheet_url, "Remedial")
-            remedial_df.columns = remedial_df.columns.str.strip()
-        except Exception:
-            st.error("Remedial sheet could not be loaded. Check the sheet name & sharing.")
-            remedial_df = pd.DataFrame()
-
+    # Remedial rows were loaded together with Main (same bank snapshot)
     wrong_ids = ss["main_results"].get("wrong_ids", [])
-    if remedial_df.empty:
+    if not question_bank.has_remedial:
         st.info("No remedial questions available.")
-    elif "MainQuestionID" not in remedial_df.columns:
+    elif not question_bank.remedial_has_main_ids:
         st.info("Remedial sheet missing 'MainQuestionID' column.")
     else:
-        rem_set = remedial_df[
-            remedial_df["MainQuestionID"].astype(str).str.strip().isin(wrong_ids)
-        ].copy()
+        rem_quiz = question_bank.remedial_quiz(wrong_ids)
 
-        if rem_set.empty:
+        if not len(rem_quiz):
             st.info("No remedial questions found for these misses.")
         else:
             ss.setdefault("remedial_answers", {})
             ss.setdefault("remedial_submitted", False)
+            rem_view = student_quiz("remedial_view", rem_quiz, seed_base + "::ROPT::")
 
             # --- Pagination config (adjust per_page to taste) ---
             per_page = 5
-            total_questions = len(rem_set)
+            total_questions = len(rem_quiz)
             total_pages = (total_questions + per_page - 1) // per_page
             page = ss.get("remedial_page", 0)
             page = max(0, min(page, max(0, total_pages - 1)))
             start = page * per_page
             end = start + per_page
-            page_slice = rem_set.iloc[start:end]
+            page_slice = rem_view.page(start, end)
 
             if not ss["remedial_submitted"]:
-                with st.form("remedial_form"):
-                    # iterate with iterrows so we can derive a stable id from the dataframe index
-                    for offset, (idx_row, r) in enumerate(rem_set.iterrows(), start=1):
-                        # stable remedial question id:
-                        # prefer RemedialQuestionID, else MainQuestionID, else generate R<seq>
-                        rqid = str(r.get("RemedialQuestionID", "") or "").strip()
-                        if not rqid:
-                            rqid = str(r.get("MainQuestionID", "") or "").strip()
-                        if not rqid:
-                            rqid = f"R{offset}"
-                               
-                        rtext = str(r.get("QuestionText", "")).strip()
-                        rimg  = normalize_img_url(r.get("ImageURL", ""))
-                        rhint = str(r.get("Hint", "")).strip()
-                                 
-                        opts = [
-                            str(r.get("Option_A", "") or "").strip(),
-                            str(r.get("Option_B", "") or "").strip(),
-                            str(r.get("Option_C", "") or "").strip(),
-                            str(r.get("Option_D", "") or "").strip()
-                        ]
-                        opts = [o for o in opts if o]
-                        disp_opts = stable_shuffle(opts, seed_base + f"::ROPT::{rqid}")
-                                
-                        st.markdown(f"**{rqid}**<br>{rtext}", unsafe_allow_html=True)
-                        if rimg:
-                            img_bytes = fetch_image_bytes(rimg)
-                            if img_bytes:
-                                st.image(img_bytes, use_container_width=True)
-                            else:
-                                st.markdown("_Image could not be loaded_")
+                # warm the image cache for the page the student will see next
+                prefetch_images([q.image for q, _ in rem_view.page(end, end + per_page) if q.image])
+
+                flash = ss.pop("remedial_flash", None)
+                if flash:
+                    st.error(flash)
+
+                if client_runtime:
+                    answers = take_submission(client_quiz(
+                        rem_view, key="remedial_client_quiz", submit_label="Submit Remedial",
+                        per_page=per_page, hints=True, unlock_code=unlock_code))
+                    submit_remedial = answers is not None
+                    if submit_remedial:
+                        ss["remedial_answers"] = answers
+                else:
+                    answered = sum(1 for q in rem_quiz if ss["remedial_answers"].get(q.qid))
+                    st.caption(f"Page {page + 1} of {total_pages} · {answered}/{total_questions} answered")
+
+                    with st.form(f"remedial_form_{page}"):
+                        # only this page's questions are rendered; answers persist in session state
+                        for q, disp_opts in page_slice:
+                            rqid, rimg, rhint = q.qid, q.image, q.hint
+                            st.markdown(f"**{rqid}**<br>{q.text}", unsafe_allow_html=True)
+                            if rimg:
+                                img_bytes = get_variant(rimg, "display")
+                                if img_bytes:
+                                    st.image(img_bytes, use_container_width=True)
+                                else:
+                                    st.markdown("_Image could not be loaded_")
                                          
-                        if rhint:
-                            with st.expander("💡 Hint"):
-                                st.write(rhint)
+                            if rhint:
+                                with st.expander("💡 Hint"):
+                                    st.write(rhint)
                                                  
-                        prev = ss["remedial_answers"].get(rqid, None)
-                        sel = st.radio(
-                            "Select your answer:",
-                            options=disp_opts,
-                            key=f"rem_{rqid}",
-                            index=disp_opts.index(prev) if prev in disp_opts else None
-                        )
-                        ss["remedial_answers"][rqid] = sel
-                        st.markdown("---")
-                                        
-                    submit_remedial = st.form_submit_button("Submit Remedial")
-                                        
+                            prev = ss["remedial_answers"].get(rqid, None)
+                            sel = st.radio(
+                                "Select your answer:",
+                                options=list(disp_opts),
+                                key=f"rem_{rqid}",
+                                index=disp_opts.index(prev) if prev in disp_opts else None
+                            )
+                            if sel is not None:
+                                ss["remedial_answers"][rqid] = sel
+                            st.markdown("---")
+
+                        nav_prev, nav_next = st.columns(2)
+                        with nav_prev:
+                            go_prev = st.form_submit_button("◀ Previous", disabled=page == 0)
+                        with nav_next:
+                            if page < total_pages - 1:
+                                go_next = st.form_submit_button("Next ▶")
+                                submit_remedial = False
+                            else:
+                                go_next = False
+                                submit_remedial = st.form_submit_button("Submit Remedial")
+
+                    if go_prev or go_next:
+                        ss["remedial_page"] = page + (1 if go_next else -1)
+                        st.rerun()
+
                 if submit_remedial:
-                    # NOTE: only grade the full rem_set (not just page slice)
-                    missing_any = False
-                    for idx_row, r in rem_set.iterrows():
-                        # stable id: RemedialQuestionID -> MainQuestionID -> generated R<seq_based_on_df_index>
-                        rqid = str(r.get("RemedialQuestionID", "") or "").strip()
-                        if not rqid:
-                            rqid = str(r.get("MainQuestionID", "") or "").strip()
-                        if not rqid:
-                            rqid = f"R{idx_row}"  
-                            
-                        if not ss["remedial_answers"].get(rqid):
-                            missing_any = True
-                            break
-                                     
-                    if missing_any:
-                        st.error("⚠ Please answer all remedial questions before submitting.")
+                    # NOTE: only grade the full remedial set (not just page slice)
+                    missing = rem_view.missing(ss["remedial_answers"])
+                    if missing:
+                        first = rem_quiz.ids.index(missing[0])
+                        ss["remedial_page"] = first // per_page
+                        ss["remedial_flash"] = (f"⚠ Please answer all remedial questions before submitting "
+                                                f"({len(missing)} left, starting with {missing[0]}).")
+                        if client_runtime:
+                            rearm_quiz("remedial_client_quiz")
+                        st.rerun()
                     else:
-                        # proceed to grade — use the same rqid logic below when reading answers/awarding marks
-                        rem_total, rem_earned = 0, 0
-                        for idx_row, r in rem_set.iterrows():
-                            rqid = str(r.get("RemedialQuestionID", "") or "").strip()
-                            if not rqid:
-                                rqid = str(r.get("MainQuestionID", "") or "").strip()
-                            if not rqid:
-                                rqid = f"R{idx_row}"
-                            correct = get_correct_value(r)
-                            given   = str(ss["remedial_answers"].get(rqid, "")).strip()
-                            marks   = int(r.get("Marks") or 1)
-                            awarded = marks if (given and given == correct) else 0
-                            rem_total  += marks
-                            rem_earned += awarded
-                                 
-                            # Save each remedial response in background
-                            run_in_background(
-                                append_response_row,
+                        graded = grade(rem_quiz, ss["remedial_answers"])
+                        sheet_rows = []
+                        for q, given, awarded in graded.rows:
+                            sheet_rows.append(response_row(
                                 datetime.now().isoformat(),
                                 ss["student_info"].get("Student_ID", ""),
                                 ss["student_info"].get("StudentName", ""),
                                 ss["student_info"].get("Tuition_Code", ""),
-                                subject, subtopic_id, rqid, given, correct, awarded, "Remedial"
-                            )
-                                  
-                        ss["remedial_results"] = {"total": rem_total, "earned": rem_earned}
+                                subject, subtopic_id, q.qid, given, q.answer, awarded, "Remedial"
+                            ))
+
+                        # one queued job for the whole remedial attempt
+                        append_response_rows(sheet_rows)
+                        ss["remedial_results"] = {"total": graded.total, "earned": graded.earned}
                         ss["remedial_submitted"] = True
                         st.success("Remedial submitted — well done!")
                         st.balloons()
@@ -920,52 +768,18 @@ if ss.get("remedial_ready", False):
                     res = ss.get("remedial_results", {"total": 0, "earned": 0})
                     st.markdown("### Remedial Quiz Review")
                     st.success(f"Score: {res['earned']}/{res['total']}")
-                    for _, r in rem_set.iterrows():
-                        rqid    = str(r.get("RemedialQuestionID", "")).strip()
-                        rtext   = str(r.get("QuestionText", "")).strip()
-                        rimg    = normalize_img_url(r.get("ImageURL", ""))
-                        correct = get_correct_value(r)
-                                        
-                        opts = [
-                            str(r.get("Option_A", "") or "").strip(),
-                            str(r.get("Option_B", "") or "").strip(),
-                            str(r.get("Option_C", "") or "").strip(),
-                            str(r.get("Option_D", "") or "").strip()
-                        ]
-                        opts = [o for o in opts if o]
-                        disp_opts = stable_shuffle(opts, seed_base + f"::ROPT::{rqid}")
-                                
-                        st.markdown(f"**{rqid}**<br>{rtext}", unsafe_allow_html=True)
-                        if rimg:
-                            img_bytes = fetch_image_bytes(rimg)
+                    for q, disp_opts in rem_view:
+                        st.markdown(f"**{q.qid}**<br>{q.text}", unsafe_allow_html=True)
+                        if q.image:
+                            img_bytes = get_variant(q.image, "display")
                             if img_bytes:
                                 st.image(img_bytes, use_container_width=True)
                             else:
                                 st.markdown("_Image could not be loaded_")
-                    
-                        student_ans = ss["remedial_answers"].get(rqid, "")
-                        for opt in disp_opts:
-                            if opt == student_ans:
-                                if opt == correct:
-                                    st.markdown(
-                                        f"<div style='background-color: rgba(0,255,0,0.15); padding:4px; border-radius:5px; display:flex; justify-content:space-between;'><span>{opt}</span><span>✅ Correct</span></div>", 
-                                        unsafe_allow_html=True
-                                    )
-                                else:
-                                    st.markdown(
-                                        f"<div style='background-color: rgba(255,0,0,0.15); padding:4px; border-radius:5px; display:flex; justify-content:space-between;'><span>{opt}</span><span>❌ Incorrect</span></div>", 
-                                        unsafe_allow_html=True
-                                    )
-                            elif opt == correct:
-                                st.markdown(
-                                    f"<div style='display:flex; justify-content:space-between;'><span>{opt}</span><span>✅ Correct</span></div>", 
-                                    unsafe_allow_html=True
-                                )
-                            else:
-                                st.markdown(f"<div>{opt}</div>", unsafe_allow_html=True)
-                                
+
+                        render_review_options(disp_opts, ss["remedial_answers"].get(q.qid, ""), q.answer)
                         st.markdown("---")
-                                     
+
                     # Remedial chart
                     correct_q = res["earned"]
                     incorrect_q = res["total"] - res["earned"]
@@ -350,7 +350,7 @@ if go:
                         st.subheader("Per-question Drill-down")
                         # choose subtopic to inspect
                         chosen_subtopic = st.selectbox("Pick Subtopic", options=merged["Subtopic"].tolist())
-                        # fetch question-level responses for that student+subtopic
+                        # fetch question-level responses for that student+subtopic (question text joined from the synced questions table)
                         detail_df = get_student_responses(student_email, subject_db, chosen_subtopic)
                         if detail_df.empty:
                             st.info("No per-question data found for this student & subtopic.")
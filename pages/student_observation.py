@@ -108,6 +108,21 @@ def load_register_df():
     if not raw:
         return pd.DataFrame()
 
+    # Prefer the shared service-account client (same as the quiz form);
+    # fall back to the public CSV export when no service account is configured.
+    try:
+        has_sa = "gcp_service_account" in st.secrets
+    except Exception:
+        has_sa = False
+    if has_sa:
+        try:
+            from sheets_gateway import get_gateway
+            df = pd.DataFrame(get_gateway().get_all_records(raw))
+            df.columns = [str(c).strip() for c in df.columns]
+            return df
+        except Exception:
+            pass
+
     m = re.search(r"/d/([a-zA-Z0-9-_]+)", raw)
     if m:
         sid = m.group(1)
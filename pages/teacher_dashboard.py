@@ -3,11 +3,12 @@ import pandas as pd
 import numpy as np
 import matplotlib.pyplot as plt
 import io
+import time
 
 # ------------------------------
 # DB helpers
 # ------------------------------
-from db import get_batch_performance
+from db import get_batch_performance_with_cursor, get_performance_delta, merge_performance_delta
 # We'll use SessionLocal + ORM models to power the nicer UI controls
 try:
     from db import SessionLocal, Student, Response
@@ -236,7 +237,6 @@ try:
     from streamlit_autorefresh import st_autorefresh
     st_autorefresh(interval=30000, key="data_refresh")
 except Exception:
-    import time
     if "last_refresh" not in st.session_state:
         st.session_state["last_refresh"] = time.time()
     if time.time() - st.session_state["last_refresh"] > 30:
@@ -250,8 +250,28 @@ if not batch or not subject:
     st.info("Please enter Batch and Subject above (you can pick from the DB suggestions).")
     st.stop()
 
-# Fetch live data
-live_df = get_batch_performance(batch, subject, subtopic or None)
+# Fetch live data: full load on first run / filter change, then only the delta
+# of responses newer than the stored cursor on each auto-refresh tick.
+# A periodic full reload heals anything a delta could miss (e.g. a transaction
+# that committed after a newer id was already seen).
+FULL_RELOAD_SECONDS = 600
+
+def load_live_performance(batch_code: str, subject_v: str, subtopic_v: str) -> pd.DataFrame:
+    ss = st.session_state
+    live_key = (batch_code, subject_v, subtopic_v)
+    now = time.time()
+    if ss.get("live_key") != live_key or now - ss.get("live_full_at", 0) > FULL_RELOAD_SECONDS:
+        df, cursor = get_batch_performance_with_cursor(batch_code, subject_v, subtopic_v or None)
+        ss["live_key"] = live_key
+        ss["live_full_at"] = now
+    else:
+        delta, cursor = get_performance_delta(batch_code, subject_v, subtopic_v or None, after_id=ss["live_cursor"])
+        df = merge_performance_delta(ss["live_df"], delta)
+    ss["live_df"] = df
+    ss["live_cursor"] = cursor
+    return df
+
+live_df = load_live_performance(batch, subject, subtopic)
 
 if live_df.empty:
     st.warning("No live submissions found for the given filters yet.")
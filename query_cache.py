@@ -0,0 +1,128 @@
+# query_cache.py
+"""
+Process-wide LRU cache for db.py read helpers with write-driven invalidation.
+
+Every cached call declares the "scopes" it reads, e.g.
+("class", "b1", "mathematics") or ("student", "a@x.com", "mathematics").
+Each scope has a version counter; the cache key embeds the current versions,
+so a write that bumps a scope makes older entries unreachable (they then age
+out of the LRU) while entries for other batches keep hitting.
+
+Streamlit serves all sessions from one process, so one cache is shared by
+every open dashboard tab. `max_age` bounds staleness for writes made by
+other processes, which cannot bump this process's counters. For writes that
+must show up sooner (e.g. `manage.py sync-sheets` rewriting question text),
+pass `generation`: a cheap callable polled at most every `check_every`
+seconds; when its value changes the whole cache is dropped.
+"""
+import functools
+import threading
+import time
+from collections import OrderedDict
+
+
+class VersionedQueryCache:
+    def __init__(self, max_entries: int = 512, max_age: float = 300.0, generation=None, check_every: float = 30.0):
+        self.max_entries = max_entries
+        self.max_age = max_age
+        self.generation = generation
+        self.check_every = check_every
+        self._generation = None
+        self._checked_at = None
+        self._entries = OrderedDict()   # key -> (stored_at, value)
+        self._versions = {}             # scope tuple -> int
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    # ---------- versions ----------
+    def version(self, scope) -> int:
+        with self._lock:
+            return self._versions.get(scope, 0)
+
+    def bump(self, *scopes):
+        """Invalidate every entry that read any of `scopes`."""
+        with self._lock:
+            for scope in scopes:
+                self._versions[scope] = self._versions.get(scope, 0) + 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._versions.clear()
+
+    def check_generation(self):
+        """Drop everything if `generation()` changed since the last poll (throttled)."""
+        if self.generation is None:
+            return
+        now = time.monotonic()
+        with self._lock:
+            if self._checked_at is not None and now - self._checked_at < self.check_every:
+                return
+            self._checked_at = now
+        try:
+            token = self.generation()
+        except Exception:
+            return   # can't tell; max_age still bounds staleness
+        with self._lock:
+            if token != self._generation:
+                self._entries.clear()
+                self._generation = token
+
+    # ---------- lookup ----------
+    def get(self, key):
+        with self._lock:
+            item = self._entries.get(key)
+            if item is not None and time.monotonic() - item[0] <= self.max_age:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return True, item[1]
+            if item is not None:
+                del self._entries[key]
+            self.misses += 1
+            return False, None
+
+    def put(self, key, value):
+        with self._lock:
+            self._entries[key] = (time.monotonic(), value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": (self.hits / lookups) if lookups else 0.0,
+            }
+
+    # ---------- decorator ----------
+    def cached(self, scopes_fn, copy=lambda v: v.copy()):
+        """
+        Cache a function's result under (name, args, versions of scopes_fn(*args)).
+        `copy` is applied on the way out so callers can mutate what they get
+        back (DataFrames by default).
+        """
+        def decorator(fn):
+            @functools.wraps(fn)
+            def wrapper(*args, **kwargs):
+                self.check_generation()
+                scopes = tuple(scopes_fn(*args, **kwargs))
+                with self._lock:
+                    versions = tuple(self._versions.get(s, 0) for s in scopes)
+                key = (fn.__qualname__, args, tuple(sorted(kwargs.items())), versions)
+                found, value = self.get(key)
+                if not found:
+                    value = fn(*args, **kwargs)
+                    self.put(key, value)
+                return copy(value)
+            wrapper.uncached = fn
+            return wrapper
+        return decorator
@@ -0,0 +1,192 @@
+# question_bank.py
+"""
+Cached question banks (Main + Remedial tabs) with per-subtopic indexes.
+
+Both tabs of a bank spreadsheet are fetched in one values_batch_get call and
+indexed once: Main rows by SubtopicID, Remedial rows by MainQuestionID. The
+quiz page then gets its questions with a dict lookup. Banks refresh in the
+background (stale-while-revalidate, see refreshing.py); only the first load
+of a bank in a process waits on Sheets.
+
+    bank = get_question_bank(qsheet_url).get()
+    main_questions = bank.main_for(subtopic_id)
+    rem_set = bank.remedial_for(wrong_ids)
+    main_quiz = bank.main_quiz(subtopic_id)      # compiled once per snapshot (quiz_model)
+    rem_quiz = bank.remedial_quiz(wrong_ids)
+
+With bank_key, the bank is read from its SQL mirror (questions table, kept
+in sync by sheet_sync.py) instead of Sheets; until the first sync of that
+bank it falls back to the sheet.
+
+    bank = get_question_bank(qsheet_url, bank_key="ssc_maths_geometry").get()
+"""
+import logging
+import threading
+
+import pandas as pd
+
+from quiz_model import compile_quiz
+from refreshing import RefreshingValue
+
+log = logging.getLogger(__name__)
+
+BANK_TTL = 600
+MIRROR_TTL = 60           # DB reads are cheap; pick up synced edits quickly
+MAX_COMPILED = 1024       # compiled quizzes kept per snapshot
+
+# subject / bank URL param -> (question sheet key, response sheet key) in secrets["google"]
+BANK_MAP = {
+    "mathematics": ("ssc_maths_geometry", "ssc_maths_geometry_r"),
+    "maths": ("ssc_maths_geometry", "ssc_maths_geometry_r"),
+    "geometry": ("ssc_maths_geometry", "ssc_maths_geometry_r"),
+    "algebra": ("ssc_maths_algebra", "ssc_maths_algebra_r"),
+    "ssc_maths_geometry": ("ssc_maths_geometry", "ssc_maths_geometry_r"),
+    "ssc_maths_algebra": ("ssc_maths_algebra", "ssc_maths_algebra_r"),
+    "science": ("ssc_science_part_1", "ssc_science_part_1_r"),
+    "science1": ("ssc_science_part_1", "ssc_science_part_1_r"),
+    "science_1": ("ssc_science_part_1", "ssc_science_part_1_r"),
+    "science2": ("ssc_science_part_2", "ssc_science_part_2_r"),
+    "science_2": ("ssc_science_part_2", "ssc_science_part_2_r"),
+    "ssc_science_part_1": ("ssc_science_part_1", "ssc_science_part_1_r"),
+    "ssc_science_part_2": ("ssc_science_part_2", "ssc_science_part_2_r"),
+    "english": ("ssc_english", "ssc_english_r"),
+    "ssc_english": ("ssc_english", "ssc_english_r"),
+}
+
+
+def bank_keys():
+    """Distinct question-sheet keys in BANK_MAP (one per bank spreadsheet)."""
+    return sorted({q for q, _ in BANK_MAP.values()})
+
+
+def _values_to_df(values) -> pd.DataFrame:
+    """Header row + data rows (ragged, as Sheets returns them) -> DataFrame of strings."""
+    if not values:
+        return pd.DataFrame()
+    header = [str(h).strip() for h in values[0]]
+    width = len(header)
+    rows = [list(r[:width]) + [""] * (width - len(r)) for r in values[1:]]
+    rows = [r for r in rows if any(str(v).strip() for v in r)]
+    return pd.DataFrame(rows, columns=header)
+
+
+def _index_by(df: pd.DataFrame, column: str) -> dict:
+    if df.empty or column not in df.columns:
+        return {}
+    keys = df[column].astype(str).str.strip()
+    return {k: g for k, g in df.groupby(keys, sort=False)}
+
+
+class BankSnapshot:
+    """Immutable view of one bank load. Frames handed out are copies."""
+
+    def __init__(self, main_df: pd.DataFrame, remedial_df: pd.DataFrame):
+        self.main_df = main_df
+        self.remedial_df = remedial_df
+        if "SubtopicID" in main_df.columns:
+            main_df["SubtopicID"] = main_df["SubtopicID"].astype(str).str.strip()
+        self._main_by_subtopic = _index_by(main_df, "SubtopicID")
+        self._remedial_by_main = _index_by(remedial_df, "MainQuestionID")
+        self._compiled = {}
+        self._compiled_lock = threading.Lock()
+
+    @property
+    def has_remedial(self) -> bool:
+        return not self.remedial_df.empty
+
+    @property
+    def remedial_has_main_ids(self) -> bool:
+        return "MainQuestionID" in self.remedial_df.columns
+
+    def main_for(self, subtopic_id) -> pd.DataFrame:
+        g = self._main_by_subtopic.get(str(subtopic_id).strip())
+        return g.copy() if g is not None else self.main_df.iloc[0:0].copy()
+
+    def remedial_for(self, main_question_ids) -> pd.DataFrame:
+        """Remedial rows for the given main question ids, in sheet order."""
+        parts = [self._remedial_by_main[q] for q in dict.fromkeys(str(i).strip() for i in main_question_ids)
+                 if q in self._remedial_by_main]
+        if not parts:
+            return self.remedial_df.iloc[0:0].copy()
+        return pd.concat(parts).sort_index()
+
+    def _compiled_quiz(self, key, build):
+        with self._compiled_lock:
+            quiz = self._compiled.get(key)
+        if quiz is None:
+            quiz = build()
+            with self._compiled_lock:
+                if len(self._compiled) >= MAX_COMPILED:
+                    self._compiled.clear()
+                quiz = self._compiled.setdefault(key, quiz)
+        return quiz
+
+    def main_quiz(self, subtopic_id):
+        """Compiled Main questions for a subtopic (shared by all sessions)."""
+        sid = str(subtopic_id).strip()
+        return self._compiled_quiz(("main", sid), lambda: compile_quiz(self.main_for(sid), "QuestionID"))
+
+    def remedial_quiz(self, main_question_ids):
+        """Compiled Remedial questions for the missed main ids, in sheet order."""
+        ids = frozenset(str(i).strip() for i in main_question_ids)
+        return self._compiled_quiz(("remedial", ids), lambda: compile_quiz(
+            self.remedial_for(sorted(ids)), "RemedialQuestionID", ("MainQuestionID",), "R"))
+
+
+def load_bank(sheet_url) -> BankSnapshot:
+    """Read Main and Remedial in one batched request."""
+    from sheets_gateway import get_gateway
+    gw = get_gateway()
+    titles = {t.strip().lower(): t for t in gw.titles(sheet_url)}
+    if "main" not in titles:
+        raise KeyError(f"no 'Main' worksheet in {sheet_url}")
+    wanted = [titles["main"]] + ([titles["remedial"]] if "remedial" in titles else [])
+    ranges = gw.batch_get(sheet_url, ["'%s'" % t.replace("'", "''") for t in wanted])
+    main_df = _values_to_df(ranges[0] if ranges else [])
+    remedial_df = _values_to_df(ranges[1]) if len(ranges) > 1 else pd.DataFrame()
+    return BankSnapshot(main_df, remedial_df)
+
+
+def _records_to_df(records) -> pd.DataFrame:
+    if not records:
+        return pd.DataFrame()
+    return pd.DataFrame(records).fillna("")
+
+
+def load_bank_from_db(bank_key):
+    """BankSnapshot from the SQL mirror, or None if the bank hasn't been synced yet."""
+    from db import get_bank_records
+    found = get_bank_records(bank_key)
+    if found is None:
+        return None
+    main, remedial = found
+    return BankSnapshot(_records_to_df(main), _records_to_df(remedial))
+
+
+def load_bank_mirrored(bank_key, sheet_url) -> BankSnapshot:
+    snapshot = load_bank_from_db(bank_key)
+    if snapshot is None:
+        log.warning("bank %s not synced to the database yet; reading the sheet", bank_key)
+        return load_bank(sheet_url)
+    return snapshot
+
+
+_banks = {}
+_banks_lock = threading.Lock()
+
+
+def get_question_bank(sheet_url, ttl=None, bank_key=None) -> RefreshingValue:
+    """
+    Process-wide refreshing BankSnapshot for a bank spreadsheet URL; read from
+    the bank's SQL mirror when bank_key is given.
+    """
+    with _banks_lock:
+        bank = _banks.get((sheet_url, bank_key))
+        if bank is None:
+            if bank_key:
+                loader, default_ttl = (lambda: load_bank_mirrored(bank_key, sheet_url)), MIRROR_TTL
+            else:
+                loader, default_ttl = (lambda: load_bank(sheet_url)), BANK_TTL
+            bank = _banks[(sheet_url, bank_key)] = RefreshingValue(
+                loader, ttl=ttl or default_ttl, name="question-bank")
+        return bank
@@ -0,0 +1,96 @@
+# quiz_component.py
+"""
+Client-side quiz runtime: a whole question set as one Streamlit component.
+
+The browser gets question text, images (inlined display variants), hints
+and this student's option order, never the answer key. Radio clicks stay
+in the browser; the page reruns once, when the component posts
+{"id", "answers"} (or {"id", "locked", "reason"} if the anti-cheat lock
+fired). Grading stays on the server (quiz_model.grade).
+
+    submission = client_quiz(view, key="main_client_quiz", submit_label="Submit Main Quiz")
+    answers = take_submission(submission)   # dict once per submission, else None
+    rearm_quiz("main_client_quiz")          # server refused it: let the student submit again
+"""
+import base64
+import hashlib
+import os
+
+import streamlit as st
+import streamlit.components.v1 as components
+
+from image_cache import get_variant
+
+FRONTEND_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "frontend", "quiz_runtime")
+_quiz_runtime = components.declare_component("quiz_runtime", path=FRONTEND_DIR)
+
+
+def _image_mime(data: bytes) -> str:
+    if data[:4] == b"RIFF" and data[8:12] == b"WEBP":
+        return "image/webp"
+    if data[:3] == b"\xff\xd8\xff":
+        return "image/jpeg"
+    if data[:4] == b"GIF8":
+        return "image/gif"
+    return "image/png"
+
+
+def _image_data_uri(url) -> str:
+    data = get_variant(url, "display") if url else None
+    if not data:
+        return ""
+    return f"data:{_image_mime(data)};base64,{base64.b64encode(data).decode('ascii')}"
+
+
+def quiz_payload(view, hints=False):
+    """JSON-safe questions for the browser. No answers or marks."""
+    return [{
+        "qid": q.qid,
+        "text": q.text,
+        "image": _image_data_uri(q.image),
+        "hint": q.hint if hints else "",
+        "options": list(opts),
+    } for q, opts in view]
+
+
+def client_quiz(view, key, submit_label="Submit", per_page=0, hints=False, unlock_code=""):
+    """Render the quiz component; returns its last posted value (or None)."""
+    cached = st.session_state.get(f"{key}__payload")
+    if cached is None or cached[0] is not view:
+        questions = quiz_payload(view, hints=hints)
+        quiz_id = hashlib.sha256(f"{key}::{view.seed}::{'|'.join(q['qid'] for q in questions)}".encode("utf-8")).hexdigest()[:16]
+        cached = st.session_state[f"{key}__payload"] = (view, questions, quiz_id)
+    _, questions, quiz_id = cached
+    return _quiz_runtime(
+        questions=questions,
+        quiz_id=quiz_id,
+        submit_label=submit_label,
+        per_page=per_page,
+        unlock_code=unlock_code or "",
+        retry=st.session_state.get(f"{key}__retry", 0),
+        key=key,
+        default=None,
+    )
+
+
+def take_submission(submission):
+    """Answers from a component submission the first time it's seen; None otherwise."""
+    if not submission or not submission.get("id"):
+        return None
+    seen = st.session_state.setdefault("quiz_component_seen", set())
+    if submission["id"] in seen:
+        return None
+    seen.add(submission["id"])
+    if submission.get("locked"):
+        st.error("🚫 Quiz locked: you switched away from the quiz. Please contact your teacher to reopen it.")
+        return None
+    return {str(k): str(v) for k, v in (submission.get("answers") or {}).items()}
+
+
+def rearm_quiz(key):
+    """
+    Re-enable a component that disabled itself on submit, after the server
+    rejected that submission. Takes effect on the next render (the answers
+    are kept), so the caller reruns.
+    """
+    st.session_state[f"{key}__retry"] = st.session_state.get(f"{key}__retry", 0) + 1
@@ -0,0 +1,182 @@
+# quiz_model.py
+"""
+Compiled, read-only quiz questions.
+
+A bank's DataFrame rows are parsed once per bank load into small
+__slots__ records (id, text, image, hint, options, answer key, marks), so
+rendering, the missing-answer check, grading and review all read the same
+objects instead of re-walking DataFrames and re-deriving ids on every rerun.
+Each Quiz also carries its normalized answer key (grading.AnswerKey), so
+grading is array comparisons against a key built once per bank load.
+
+    quiz = compile_quiz(main_df, "QuestionID")
+    view = quiz.for_student(seed_base + "::OPT::")   # per-student option order
+    for q, options in view: ...
+    result = grade(quiz, answers)
+"""
+import hashlib
+import random
+
+from grading import AnswerKey, grade_batch
+from image_cache import normalize_img_url
+
+OPTION_COLUMNS = ("Option_A", "Option_B", "Option_C", "Option_D")
+ANSWER_COLUMNS = ("CorrectOption", "Correct_Answer", "CorrectAnswer")
+
+
+def stable_shuffle(items, seed_str):
+    seq = list(items)
+    h = int(hashlib.md5(seed_str.encode("utf-8")).hexdigest(), 16)
+    rnd = random.Random(h)
+    rnd.shuffle(seq)
+    return seq
+
+
+def _clean(v) -> str:
+    if v is None or v != v:   # None / NaN from concatenated frames
+        return ""
+    return str(v).strip()
+
+
+def answer_key(row) -> str:
+    """First non-empty of CorrectOption / Correct_Answer / CorrectAnswer."""
+    for col in ANSWER_COLUMNS:
+        value = _clean(row.get(col))
+        if value:
+            return value
+    return ""
+
+
+def _marks(value) -> int:
+    try:
+        return int(float(value)) if _clean(value) else 1
+    except ValueError:
+        return 1
+
+
+class Question:
+    """One compiled question. Treat as read-only; shared by every session."""
+    __slots__ = ("qid", "text", "image", "hint", "options", "answer", "marks", "main_id")
+
+    def __init__(self, qid, text, image, hint, options, answer, marks, main_id=""):
+        self.qid = qid
+        self.text = text
+        self.image = image
+        self.hint = hint
+        self.options = options      # tuple, sheet order, blanks dropped
+        self.answer = answer
+        self.marks = marks
+        self.main_id = main_id
+
+    def __repr__(self):
+        return f"Question({self.qid!r})"
+
+
+class Quiz:
+    """Ordered, immutable collection of compiled questions."""
+    __slots__ = ("questions", "by_id", "key")
+
+    def __init__(self, questions):
+        self.questions = tuple(questions)
+        self.by_id = {q.qid: q for q in self.questions}
+        self.key = AnswerKey.from_questions(self.questions)
+
+    def __len__(self):
+        return len(self.questions)
+
+    def __iter__(self):
+        return iter(self.questions)
+
+    @property
+    def ids(self):
+        return [q.qid for q in self.questions]
+
+    @property
+    def images(self):
+        return [q.image for q in self.questions if q.image]
+
+    def for_student(self, seed_prefix) -> "StudentQuiz":
+        return StudentQuiz(self, seed_prefix)
+
+
+class StudentQuiz:
+    """A quiz with one student's option order (computed once, kept in session state)."""
+    __slots__ = ("quiz", "seed", "display")
+
+    def __init__(self, quiz, seed_prefix):
+        self.quiz = quiz
+        self.seed = seed_prefix
+        self.display = tuple(tuple(stable_shuffle(q.options, seed_prefix + q.qid)) for q in quiz.questions)
+
+    def __len__(self):
+        return len(self.quiz)
+
+    def __iter__(self):
+        """(question, display options) pairs."""
+        return zip(self.quiz.questions, self.display)
+
+    def page(self, start, end):
+        return list(zip(self.quiz.questions[start:end], self.display[start:end]))
+
+    def missing(self, answers):
+        """Ids of questions without an answer in `answers`."""
+        return [q.qid for q in self.quiz.questions if not answers.get(q.qid)]
+
+
+class GradeResult:
+    __slots__ = ("total", "earned", "wrong_ids", "rows")
+
+    def __init__(self, total, earned, wrong_ids, rows):
+        self.total = total
+        self.earned = earned
+        self.wrong_ids = wrong_ids
+        self.rows = rows            # [(question, given, awarded)]
+
+
+def grade(quiz, answers) -> GradeResult:
+    """One student's answers, graded by grading.grade_batch against quiz.key."""
+    result = grade_batch(quiz.key, [answers])
+    rows = [(q, _clean(answers.get(q.qid)), int(a)) for q, a in zip(quiz.questions, result.awarded[0])]
+    return GradeResult(result.total, int(result.earned[0]), result.wrong_ids(0), rows)
+
+
+def question_ids(records, id_column, fallback_id_columns=(), fallback_prefix="Q"):
+    """
+    Ids for row dicts: `id_column`, then each of `fallback_id_columns`, then
+    f"{fallback_prefix}{position}"; an id already used gets a "-2", "-3", ...
+    suffix so answers never collide.
+    """
+    ids, seen = [], {}
+    for pos, row in enumerate(records, start=1):
+        qid = ""
+        for col in (id_column, *fallback_id_columns):
+            qid = _clean(row.get(col))
+            if qid:
+                break
+        qid = qid or f"{fallback_prefix}{pos}"
+        if qid in seen:
+            seen[qid] += 1
+            qid = f"{qid}-{seen[qid]}"
+        else:
+            seen[qid] = 1
+        ids.append(qid)
+    return ids
+
+
+def compile_quiz(df, id_column, fallback_id_columns=(), fallback_prefix="Q") -> Quiz:
+    """Compile DataFrame rows into a Quiz, with ids assigned by question_ids()."""
+    questions = []
+    records = df.to_dict("records") if df is not None and not df.empty else []
+    ids = question_ids(records, id_column, fallback_id_columns, fallback_prefix)
+    for qid, row in zip(ids, records):
+        questions.append(Question(
+            qid=qid,
+            text=_clean(row.get("QuestionText")),
+            image=normalize_img_url(_clean(row.get("ImageURL"))),
+            hint=_clean(row.get("Hint")),
+            options=tuple(o for o in (_clean(row.get(c)) for c in OPTION_COLUMNS) if o),
+            answer=answer_key(row),
+            marks=_marks(row.get("Marks")),
+            main_id=_clean(row.get("MainQuestionID")),
+        ))
+    return Quiz(questions)
@@ -0,0 +1,68 @@
+# refreshing.py
+"""
+Stale-while-revalidate holder for values loaded from slow sources (Sheets).
+
+The first get() in a process blocks on the loader (concurrent callers share
+that one load). After `ttl` seconds get() keeps returning the cached value
+and starts one background reload; a failed reload keeps the old value.
+"""
+import logging
+import threading
+import time
+
+log = logging.getLogger(__name__)
+
+
+class RefreshingValue:
+    def __init__(self, loader, ttl=300.0, name="value"):
+        self.loader = loader
+        self.ttl = ttl
+        self.name = name
+        self._value = None
+        self._loaded = False
+        self.loaded_at = 0.0
+        self.last_error = None
+        self._lock = threading.Lock()
+        self._first_load = threading.Lock()
+        self._refreshing = False
+
+    def reload(self):
+        """Load synchronously and swap the new value in."""
+        value = self.loader()
+        with self._lock:
+            self._value = value
+            self._loaded = True
+            self.loaded_at = time.monotonic()
+        return value
+
+    def refresh_async(self):
+        """Start one background reload unless one is already running."""
+        with self._lock:
+            if self._refreshing:
+                return
+            self._refreshing = True
+
+        def _run():
+            try:
+                self.reload()
+                self.last_error = None
+            except Exception as e:
+                log.warning("%s refresh failed: %r", self.name, e)
+                self.last_error = repr(e)
+            finally:
+                with self._lock:
+                    self._refreshing = False
+
+        threading.Thread(target=_run, name=f"{self.name}-refresh", daemon=True).start()
+
+    def age(self) -> float:
+        return time.monotonic() - self.loaded_at if self._loaded else float("inf")
+
+    def get(self):
+        if not self._loaded:
+            with self._first_load:
+                if not self._loaded:
+                    return self.reload()
+        if self.age() > self.ttl:
+            self.refresh_async()
+        return self._value
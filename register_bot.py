@@ -1,20 +1,13 @@
 import logging
 from telegram import Update
 from telegram.ext import Application, CommandHandler, ContextTypes
-import gspread
-from google.oauth2.service_account import Credentials
+from sheets_gateway import get_gateway
 
-# --- Setup Google Sheets ---
-scope = ["https://spreadsheets.google.com/feeds",
-         "https://www.googleapis.com/auth/drive"]
+# --- Setup Google Sheets (rate-limited gateway, see sheets_gateway.py) ---
+sheets = get_gateway(service_account_file="service_account.json")
 
-creds = Credentials.from_service_account_file("service_account.json", scopes=scope)
-client = gspread.authorize(creds)
-
-# Open your Register sheet
+# Your Register sheet
 register_url = "YOUR_REGISTER_SHEET_URL"
-reg_book = client.open_by_url(register_url)
-reg_ws = reg_book.worksheet("Register")
 
 # --- Logging ---
 logging.basicConfig(level=logging.INFO)
@@ -31,7 +24,7 @@ async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
     await update.message.reply_text(message)
 
     # (Optional) log into Register sheet automatically
-    reg_ws.append_row([chat_id, first_name, ""])  # you can also ask for Student_ID later
+    sheets.append_row(register_url, [chat_id, first_name, ""], title="Register")  # you can also ask for Student_ID later
 
     logging.info(f"Registered chat_id: {chat_id}")
 
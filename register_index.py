@@ -0,0 +1,151 @@
+# register_index.py
+"""
+In-memory index of the student Register sheet for O(1) quiz verification.
+
+The sheet is read once per TTL and indexed by (Tuition_Code, Student_ID).
+Lookups never wait on Sheets once a copy exists: a stale index is served
+as-is while one background thread reloads it (stale-while-revalidate, see
+refreshing.py). Only the very first lookup in a process blocks on the load.
+
+    idx = get_register_index(url)
+    row = idx.verify(tuition_code, student_id, password)   # dict or None
+
+With mirrored=True lookups are point queries on the register_entries
+table (kept in sync by `manage.py sync-sheets --every N`, see sheet_sync.py)
+while its last sync is newer than max_mirror_age; before the first sync,
+or if syncing has stopped, the sheet index is used instead.
+"""
+import logging
+import threading
+import time
+from datetime import datetime
+
+from refreshing import RefreshingValue
+
+log = logging.getLogger(__name__)
+
+MIRROR_MAX_AGE = 900.0    # seconds; an older register mirror is not trusted
+SYNC_STATE_TTL = 30.0     # seconds between reads of the mirror's sync state
+
+
+def _key(tuition_code, student_id):
+    return (str(tuition_code or "").strip(), str(student_id or "").strip())
+
+
+def build_register_index(records):
+    """Dict keyed by (Tuition_Code, Student_ID); first row wins, like the old mask + iloc[0]."""
+    index = {}
+    for rec in records:
+        key = _key(rec.get("Tuition_Code"), rec.get("Student_ID"))
+        if key[1]:
+            index.setdefault(key, rec)
+    return index
+
+
+def _verify(rec, password):
+    if rec is None:
+        return None
+    if str(rec.get("Password", "")).strip() != str(password or "").strip():
+        return None
+    return rec
+
+
+class RegisterIndex:
+    def __init__(self, loader, ttl=300.0, miss_refresh_interval=30.0):
+        """loader() returns the sheet rows as a list of dicts (get_all_records())."""
+        self._value = RefreshingValue(lambda: build_register_index(loader()), ttl=ttl, name="register")
+        self.miss_refresh_interval = miss_refresh_interval
+
+    def reload(self):
+        return len(self._value.reload())
+
+    @property
+    def last_error(self):
+        return self._value.last_error
+
+    def lookup(self, tuition_code, student_id):
+        rec = self._value.get().get(_key(tuition_code, student_id))
+        if rec is None and self._value.age() > self.miss_refresh_interval:
+            # maybe registered since the last load; next attempt will see it
+            self._value.refresh_async()
+        return rec
+
+    def verify(self, tuition_code, student_id, password):
+        """Register row if the credentials match, else None."""
+        return _verify(self.lookup(tuition_code, student_id), password)
+
+    def __len__(self):
+        return len(self._value.get())
+
+
+class MirroredRegisterIndex:
+    """
+    Register served from the register_entries table while its last sync is
+    fresh; the sheet index before the first sync or once the mirror is older
+    than max_mirror_age. The sync state (time, row count) is read at most
+    every SYNC_STATE_TTL seconds.
+    """
+
+    def __init__(self, sheet_index, max_mirror_age=MIRROR_MAX_AGE):
+        self.sheet_index = sheet_index
+        self.max_mirror_age = max_mirror_age
+        self._state = None          # (synced_at, row_count) or None
+        self._state_read = None     # monotonic time of the last read
+        self._lock = threading.Lock()
+        self._stale_logged = False
+
+    def _sync_state(self):
+        with self._lock:
+            if self._state_read is None or time.monotonic() - self._state_read > SYNC_STATE_TTL:
+                from db import get_sync_state
+                self._state = get_sync_state("register")
+                self._state_read = time.monotonic()
+            return self._state
+
+    def synced(self) -> bool:
+        """True if lookups go to the mirror (synced, and recently enough)."""
+        state = self._sync_state()
+        if state is None or not state[1]:
+            return False
+        synced_at = state[0]
+        age = (datetime.utcnow() - synced_at).total_seconds() if synced_at else float("inf")
+        if age > self.max_mirror_age:
+            if not self._stale_logged:
+                self._stale_logged = True
+                log.warning("register mirror last synced %.0fs ago; reading the sheet "
+                            "(is `manage.py sync-sheets --every` running?)", age)
+            return False
+        self._stale_logged = False
+        return True
+
+    def lookup(self, tuition_code, student_id):
+        if not self.synced():
+            return self.sheet_index.lookup(tuition_code, student_id)
+        from db import get_register_entry
+        return get_register_entry(*_key(tuition_code, student_id))
+
+    def verify(self, tuition_code, student_id, password):
+        return _verify(self.lookup(tuition_code, student_id), password)
+
+    def __len__(self):
+        if not self.synced():
+            return len(self.sheet_index)
+        return self._sync_state()[1]
+
+
+_indexes = {}
+_indexes_lock = threading.Lock()
+
+
+def get_register_index(sheet_url, ttl=300.0, mirrored=False, max_mirror_age=MIRROR_MAX_AGE):
+    """Process-wide index for a Register sheet URL (first worksheet)."""
+    with _indexes_lock:
+        idx = _indexes.get(sheet_url)
+        if idx is None:
+            def _load():
+                from sheets_gateway import get_gateway
+                return get_gateway().get_all_records(sheet_url)
+            idx = _indexes[sheet_url] = RegisterIndex(_load, ttl=ttl)
+        if mirrored:
+            idx = _indexes.setdefault(("mirrored", sheet_url), MirroredRegisterIndex(idx, max_mirror_age))
+        return idx
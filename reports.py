@@ -0,0 +1,284 @@
+# reports.py
+"""
+Quiz report PDFs, built off the Streamlit script thread in a process pool.
+
+A report is identified by a hash of (subject, subtopic, results, student,
+chart). The first request for a key starts one build in a worker process;
+every later request for the same key (download button, student email,
+parent email, another rerun) shares that build and its bytes.
+
+    key = submit_report(subject, subtopic_id, res, student_info, chart)
+    report_status(key)         # "pending" | "done" | "error" | "missing"
+    report_bytes(key)          # bytes once done, else None
+    wait_for_report(key, 120)  # blocking; for background email threads
+
+Worker processes are spawned (not forked) so they never inherit the
+server's threads or open connections. Nothing here imports streamlit.
+"""
+import hashlib
+import io
+import json
+import logging
+import multiprocessing
+import threading
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from datetime import datetime
+
+log = logging.getLogger(__name__)
+
+REPORT_WORKERS = 2
+MAX_CACHED_REPORTS = 128
+
+# fields of student_info that appear in the PDF (and so in the key)
+STUDENT_FIELDS = ("StudentName", "Student_ID")
+
+
+# =============================================================
+# Chart + PDF (run inside the worker)
+# =============================================================
+
+def performance_chart(correct, incorrect, colors=None):
+    """Correct/Incorrect bar chart as a matplotlib Figure (no pyplot state)."""
+    from matplotlib.figure import Figure
+    from matplotlib.ticker import MaxNLocator
+
+    c = {"primary": "#4CAF50", "error": "#E53935", "text": "#31333F",
+         "bg": "#FFFFFF", "sbg": "#F5F5F5"}
+    c.update(colors or {})
+
+    fig = Figure(figsize=(5.5, 3.2), constrained_layout=True)
+    fig.patch.set_facecolor(c["bg"])
+    ax = fig.subplots()
+    ax.set_facecolor(c["sbg"])
+
+    labels = ["Correct", "Incorrect"]
+    values = [correct, incorrect]
+    bars = ax.bar(labels, values, edgecolor=c["text"], linewidth=0.6)
+
+    # tint bars with theme colors
+    bars[0].set_color(c["primary"])
+    bars[1].set_color(c["error"])
+
+    ymax = max(values + [1])
+    ax.set_ylim(0, ymax + 1)
+    ax.yaxis.set_major_locator(MaxNLocator(nbins=6, integer=True))
+    ax.grid(axis="y", linestyle="--", linewidth=0.7, alpha=0.3)
+
+    ax.set_title("Main Performance", color=c["text"], fontsize=14, weight="bold", pad=10)
+    ax.set_ylabel("Number of Questions", color=c["text"], fontsize=11)
+    ax.tick_params(axis="x", colors=c["text"], labelsize=11)
+    ax.tick_params(axis="y", colors=c["text"], labelsize=10)
+
+    for spine in ["top", "right"]:
+        ax.spines[spine].set_visible(False)
+    for spine in ["left", "bottom"]:
+        ax.spines[spine].set_color(c["text"])
+        ax.spines[spine].set_alpha(0.25)
+
+    for r in bars:
+        h = r.get_height()
+        ax.annotate(f"{int(h)}", xy=(r.get_x() + r.get_width() / 2, h), xytext=(0, 5),
+                    textcoords="offset points", ha="center", va="bottom",
+                    color=c["text"], fontsize=11, weight="bold")
+    return fig
+
+
+def _pdf_question_image(url, max_width=210):
+    """Small pre-compressed copy of a question image as a flowable, or None."""
+    from reportlab.lib.utils import ImageReader
+    from reportlab.platypus import Image
+    from image_cache import get_variant
+
+    data = get_variant(url, "pdf") if url else None
+    if not data:
+        return None
+    try:
+        w, h = ImageReader(io.BytesIO(data)).getSize()
+    except Exception:
+        return None
+    scale = min(1.0, max_width / float(w))
+    return Image(io.BytesIO(data), width=w * scale, height=h * scale)
+
+
+def build_pdf_bytes(subject, subtopic_id, res, student_info, chart=None):
+    """Render the report PDF. `chart` is {"correct", "incorrect", "colors"} or None."""
+    from reportlab.lib import colors
+    from reportlab.lib.pagesizes import A4
+    from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
+    from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer, Image
+
+    buffer = io.BytesIO()
+    doc = SimpleDocTemplate(buffer, pagesize=A4)
+    elements = []
+    styles = getSampleStyleSheet()
+    normal = ParagraphStyle("NormalUnicode", parent=styles["Normal"], fontName="Helvetica", fontSize=10)
+
+    info = student_info or {}
+    elements.append(Paragraph(f"Quiz Report: {subject} — {subtopic_id}", styles["Title"]))
+    elements.append(Paragraph(f"Student: {info.get('StudentName','Unknown')} ({info.get('Student_ID','')})", styles["Normal"]))
+    elements.append(Paragraph(f"Date: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}", styles["Normal"]))
+    elements.append(Spacer(1, 12))
+
+    if chart:
+        fig = performance_chart(chart.get("correct", 0), chart.get("incorrect", 0), chart.get("colors"))
+        # save fig with smaller dpi to reduce size/cost
+        chart_buf = io.BytesIO()
+        fig.savefig(chart_buf, format="PNG", bbox_inches="tight", dpi=80)
+        chart_buf.seek(0)
+        elements.append(Image(chart_buf, width=360, height=180))
+        elements.append(Spacer(1, 16))
+
+    table_data = [[
+        Paragraph("Q.No", normal),
+        Paragraph("Question", normal),
+        Paragraph("Your Answer", normal),
+        Paragraph("Correct Answer", normal),
+    ]]
+    for q in res.get("questions", []):
+        question_cell = [Paragraph(str(q.get("question","")), normal)]
+        q_img = _pdf_question_image(q.get("image", ""))
+        if q_img is not None:
+            question_cell.append(q_img)
+        table_data.append([
+            Paragraph(str(q.get("qid","")), normal),
+            question_cell,
+            Paragraph(str(q.get("student","")), normal),
+            Paragraph(str(q.get("correct","")), normal),
+        ])
+    table = Table(table_data, repeatRows=1, colWidths=[50, 220, 120, 120])
+    table.setStyle(TableStyle([
+        ('BACKGROUND', (0,0), (-1,0), colors.lightgrey),
+        ('GRID', (0,0), (-1,-1), 0.5, colors.black),
+        ('FONTSIZE', (0,0), (-1,-1), 9),
+    ]))
+    elements.append(table)
+
+    earned = res.get("earned", 0); total = res.get("total", 0)
+    elements.append(Spacer(1, 12))
+    elements.append(Paragraph(f"Score: {earned}/{total}", styles["Heading2"]))
+
+    doc.build(elements)
+    buffer.seek(0)
+    return buffer.read()
+
+
+# =============================================================
+# Pool + result cache (server side)
+# =============================================================
+
+def report_key(subject, subtopic_id, res, student_info, chart=None) -> str:
+    student = {f: (student_info or {}).get(f, "") for f in STUDENT_FIELDS}
+    blob = json.dumps([subject, subtopic_id, res, student, chart], sort_keys=True, default=str)
+    return hashlib.sha256(blob.encode("utf-8")).hexdigest()
+
+
+class ReportService:
+    def __init__(self, workers=REPORT_WORKERS, max_cached=MAX_CACHED_REPORTS):
+        self.workers = workers
+        self.max_cached = max_cached
+        self._pool = None
+        self._lock = threading.Lock()
+        self._futures = {}              # key -> Future (pending builds)
+        self._done = OrderedDict()      # key -> bytes (LRU)
+        self._errors = {}               # key -> repr(exc)
+
+    def _get_pool(self):
+        if self._pool is None:
+            ctx = multiprocessing.get_context("spawn")
+            self._pool = ProcessPoolExecutor(max_workers=self.workers, mp_context=ctx)
+        return self._pool
+
+    def submit(self, subject, subtopic_id, res, student_info, chart=None) -> str:
+        """Start (or join) the build for this report; returns its key immediately."""
+        student = {f: (student_info or {}).get(f, "") for f in STUDENT_FIELDS}
+        key = report_key(subject, subtopic_id, res, student, chart)
+        with self._lock:
+            if key in self._done or key in self._futures:
+                return key
+            self._errors.pop(key, None)
+            try:
+                fut = self._get_pool().submit(build_pdf_bytes, subject, subtopic_id, res, student, chart)
+            except BrokenProcessPool:
+                # a worker died; start a fresh pool for this and later builds
+                self._pool = None
+                fut = self._get_pool().submit(build_pdf_bytes, subject, subtopic_id, res, student, chart)
+            self._futures[key] = fut
+        fut.add_done_callback(lambda f, k=key: self._finish(k, f))
+        return key
+
+    def _finish(self, key, fut):
+        with self._lock:
+            self._futures.pop(key, None)
+            exc = fut.exception()
+            if exc is not None:
+                log.warning("report %s failed: %r", key[:12], exc)
+                self._errors[key] = repr(exc)
+                if isinstance(exc, BrokenProcessPool):
+                    self._pool = None
+                return
+            self._done[key] = fut.result()
+            self._done.move_to_end(key)
+            while len(self._done) > self.max_cached:
+                self._done.popitem(last=False)
+
+    def status(self, key) -> str:
+        with self._lock:
+            if key in self._done:
+                return "done"
+            if key in self._futures:
+                return "pending"
+            if key in self._errors:
+                return "error"
+            return "missing"
+
+    def error(self, key):
+        return self._errors.get(key)
+
+    def result(self, key):
+        with self._lock:
+            data = self._done.get(key)
+            if data is not None:
+                self._done.move_to_end(key)
+            return data
+
+    def wait(self, key, timeout=120.0):
+        """Bytes for `key`, blocking until its build finishes. Raises on failure/timeout."""
+        with self._lock:
+            data = self._done.get(key)
+            fut = self._futures.get(key)
+        if data is not None:
+            return data
+        if fut is None:
+            raise KeyError(f"report {key[:12]} was not submitted or has been evicted")
+        return fut.result(timeout=timeout)
+
+
+_service = None
+_service_lock = threading.Lock()
+
+
+def get_report_service() -> ReportService:
+    global _service
+    if _service is None:
+        with _service_lock:
+            if _service is None:
+                _service = ReportService()
+    return _service
+
+
+def submit_report(subject, subtopic_id, res, student_info, chart=None) -> str:
+    return get_report_service().submit(subject, subtopic_id, res, student_info, chart)
+
+
+def report_status(key) -> str:
+    return get_report_service().status(key)
+
+
+def report_bytes(key):
+    return get_report_service().result(key)
+
+
+def wait_for_report(key, timeout=120.0):
+    return get_report_service().wait(key, timeout)
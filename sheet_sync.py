@@ -0,0 +1,159 @@
+# sheet_sync.py
+"""
+Sheets -> SQL replication for the question banks and the Register.
+
+Sheets stay the authoring surface; quiz pages read the SQL mirrors
+(questions, register_entries) instead. Each sheet row is hashed; a run
+first compares the whole sheet's hash with the last synced one (unchanged
+sheet: nothing else happens), otherwise upserts only rows whose hash or
+position changed and deactivates rows that were removed.
+
+    python manage.py sync-sheets                 # every bank in BANK_MAP + the Register
+    python manage.py sync-sheets --only banks --force
+    python manage.py sync-sheets --every 300     # keep syncing every 5 minutes
+
+    from sheet_sync import sync_all
+    sync_all()   # [(source, counts | "unchanged" | "error: ..."), ...]
+"""
+import hashlib
+import json
+import logging
+
+import db
+from question_bank import _values_to_df, bank_keys
+from quiz_model import _clean, question_ids
+from sheets_gateway import get_gateway
+
+log = logging.getLogger(__name__)
+
+# kind -> (id column, fallback id columns, fallback prefix), as question_bank compiles them
+BANK_KINDS = {
+    "Main": ("QuestionID", (), "Q"),
+    "Remedial": ("RemedialQuestionID", ("MainQuestionID",), "R"),
+}
+
+
+def row_hash(value) -> str:
+    blob = json.dumps(value, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha1(blob.encode("utf-8")).hexdigest()
+
+
+def _content_hash(rows) -> str:
+    return hashlib.sha1("\n".join(f"{r['row_no']}:{r['row_hash']}" for r in rows).encode("ascii")).hexdigest()
+
+
+def _sync(model, scope, rows, key_cols, source, force):
+    h = _content_hash(rows)
+    if not force and db.get_sync_hash(source) == h:
+        db.mark_synced(source)   # the mirror is current as of now (staleness checks read synced_at)
+        return "unchanged"
+    return db.sync_mirror_rows(model, scope, rows, key_cols, source, h)
+
+
+# =============================================================
+# Question banks
+# =============================================================
+
+def bank_rows(kind, records, subtopic_of_main):
+    """Question-table rows for one tab. Remedial rows take the subtopic of their main question."""
+    id_column, fallbacks, prefix = BANK_KINDS[kind]
+    rows = []
+    for pos, (qid, rec) in enumerate(zip(question_ids(records, id_column, fallbacks, prefix), records), start=1):
+        main_id = _clean(rec.get("MainQuestionID"))
+        subtopic = _clean(rec.get("SubtopicID")) if kind == "Main" else subtopic_of_main.get(main_id, "")
+        rows.append({
+            "source_key": qid[:100],
+            "row_no": pos,
+            "subtopic": subtopic[:100],
+            "question_no": qid[:50],
+            "question_text": _clean(rec.get("QuestionText"))[:1000],
+            "main_question_id": main_id[:50],
+            "data": json.dumps(rec, ensure_ascii=False, default=str),
+            "row_hash": row_hash([rec, subtopic]),
+        })
+    return rows
+
+
+def fetch_bank(sheet_url):
+    """{"Main": [row dicts], "Remedial": [row dicts]} in one batched read."""
+    gw = get_gateway()
+    titles = {t.strip().lower(): t for t in gw.titles(sheet_url)}
+    if "main" not in titles:
+        raise KeyError(f"no 'Main' worksheet in {sheet_url}")
+    wanted = [k for k in ("main", "remedial") if k in titles]
+    ranges = gw.batch_get(sheet_url, ["'%s'" % titles[k].replace("'", "''") for k in wanted])
+    out = {"Main": [], "Remedial": []}
+    for k, values in zip(wanted, ranges):
+        out[k.title()] = _values_to_df(values).to_dict("records")
+    return out
+
+
+def sync_bank(bank_key, sheet_url, force=False):
+    """Mirror one bank spreadsheet. Returns [(source, counts | "unchanged")]."""
+    tabs = fetch_bank(sheet_url)
+    subtopic_of_main = {}
+    for qid, rec in zip(question_ids(tabs["Main"], *BANK_KINDS["Main"]), tabs["Main"]):
+        subtopic_of_main.setdefault(qid, _clean(rec.get("SubtopicID")))
+    results = []
+    for kind in BANK_KINDS:
+        source = f"bank:{bank_key}:{kind}"
+        rows = bank_rows(kind, tabs[kind], subtopic_of_main)
+        scope = {"bank": bank_key, "kind": kind, "subject": bank_key}
+        results.append((source, _sync(db.Question, scope, rows, ("source_key",), source, force)))
+    return results
+
+
+# =============================================================
+# Register
+# =============================================================
+
+def register_rows(records):
+    """First row wins per (Tuition_Code, Student_ID), like register_index.build_register_index."""
+    rows, seen = [], set()
+    for pos, rec in enumerate(records, start=1):
+        key = (str(rec.get("Tuition_Code") or "").strip(), str(rec.get("Student_ID") or "").strip())
+        if not key[1] or key in seen:
+            continue
+        seen.add(key)
+        rows.append({
+            "tuition_code": key[0][:50],
+            "student_id": key[1][:50],
+            "row_no": pos,
+            "data": json.dumps(rec, ensure_ascii=False, default=str),
+            "row_hash": row_hash(rec),
+        })
+    return rows
+
+
+def sync_register(sheet_url, force=False):
+    rows = register_rows(get_gateway().get_all_records(sheet_url))
+    return [("register", _sync(db.RegisterEntry, {}, rows, ("tuition_code", "student_id"), "register", force))]
+
+
+# =============================================================
+# Everything
+# =============================================================
+
+def sync_all(force=False, banks=True, register=True):
+    """Sync every configured bank and the Register; one failing sheet doesn't stop the rest."""
+    import streamlit as st
+    google = st.secrets["google"]
+    jobs = []
+    if banks:
+        urls = google.get("question_sheet_urls", {})
+        for key in bank_keys():
+            if key in urls:
+                jobs.append((f"bank:{key}", lambda k=key: sync_bank(k, urls[k], force)))
+            else:
+                log.warning("no question_sheet_urls.%s in secrets; skipping", key)
+    if register and google.get("register_sheet_url"):
+        jobs.append(("register", lambda: sync_register(google["register_sheet_url"], force)))
+
+    results = []
+    for name, job in jobs:
+        try:
+            results.extend(job())
+        except Exception as e:
+            log.exception("sync of %s failed", name)
+            results.append((name, f"error: {e!r}"))
+    return results
@@ -0,0 +1,123 @@
+# sheet_writer.py
+"""
+Process-wide writer for the Responses sheet.
+
+Rows from every session are spooled as "sheet_rows" jobs in the write queue
+and held per sheet until FLUSH_INTERVAL seconds have passed or FLUSH_ROWS
+rows are waiting; then they go out as a single append_rows call. Every call
+is counted against the Sheets write quota (requests per minute for the
+service account). When that budget is spent, or the API answers 429, the
+batch is deferred with backoff (write_queue.RetryLater) instead of failing,
+so rows are delayed rather than dropped.
+
+    from sheet_writer import queue_rows, stats
+    queue_rows(rsheet_url, rows)   # returns immediately
+    stats()                        # writes_last_minute, throttled, backoff_seconds, ...
+"""
+import logging
+import random
+import threading
+import time
+from collections import deque
+
+from sheets_gateway import get_gateway, retry_after, status_code
+from write_queue import RetryLater, get_write_queue
+
+log = logging.getLogger(__name__)
+
+FLUSH_INTERVAL = 3.0        # seconds the oldest queued row may wait
+FLUSH_ROWS = 200            # ...or flush as soon as this many rows are queued for a sheet
+WRITES_PER_MINUTE = 50      # Sheets allows 60 write requests/min per user; keep headroom
+MAX_BACKOFF = 120.0
+
+
+class QuotaTracker:
+    """Sliding one-minute window of write requests, plus 429 backoff."""
+
+    def __init__(self, per_minute=WRITES_PER_MINUTE, window=60.0):
+        self.per_minute = per_minute
+        self.window = window
+        self._calls = deque()
+        self._lock = threading.Lock()
+        self._streak = 0                # consecutive 429s
+        self.blocked_until = 0.0
+        self.throttled = 0
+        self.writes = 0
+        self.rows = 0
+
+    def _trim(self, now):
+        while self._calls and now - self._calls[0] >= self.window:
+            self._calls.popleft()
+
+    def reserve(self) -> float:
+        """Count one write and return 0.0 if the budget allows it; else seconds to wait."""
+        with self._lock:
+            now = time.monotonic()
+            if now < self.blocked_until:
+                return self.blocked_until - now
+            self._trim(now)
+            if len(self._calls) >= self.per_minute:
+                return self._calls[0] + self.window - now
+            self._calls.append(now)
+            return 0.0
+
+    def success(self, rows):
+        with self._lock:
+            self._streak = 0
+            self.writes += 1
+            self.rows += rows
+
+    def throttle(self, retry_after=None) -> float:
+        """Record a 429; returns how long to back off (honours Retry-After)."""
+        with self._lock:
+            self._streak += 1
+            self.throttled += 1
+            delay = retry_after or min(MAX_BACKOFF, 5.0 * 2 ** (self._streak - 1))
+            delay *= random.uniform(1.0, 1.25)
+            self.blocked_until = time.monotonic() + delay
+            return delay
+
+    def stats(self) -> dict:
+        with self._lock:
+            now = time.monotonic()
+            self._trim(now)
+            return {
+                "writes_last_minute": len(self._calls),
+                "limit_per_minute": self.per_minute,
+                "writes": self.writes,
+                "rows": self.rows,
+                "throttled": self.throttled,
+                "backoff_seconds": max(0.0, self.blocked_until - now),
+            }
+
+
+quota = QuotaTracker()
+
+
+def append_rows(sheet_url, rows):
+    """One append_rows for `rows`. Raises RetryLater when over quota or throttled."""
+    if not rows:
+        return
+    wait = quota.reserve()
+    if wait > 0:
+        raise RetryLater(wait, f"sheets write quota spent; {len(rows)} rows wait {wait:.1f}s")
+    try:
+        # single attempt: a 429 defers the whole batch here instead of blocking the writer
+        get_gateway().append_rows(sheet_url, rows, attempts=1)
+    except Exception as e:
+        if status_code(e) == 429:
+            delay = quota.throttle(retry_after(e))
+            log.warning("sheets API 429; backing off %.1fs (%s rows held)", delay, len(rows))
+            raise RetryLater(delay, "sheets API 429") from e
+        raise
+    quota.success(len(rows))
+
+
+def queue_rows(sheet_url, rows):
+    """Queue rows for `sheet_url` (durable; shared with every other session)."""
+    if rows:
+        get_write_queue().enqueue("sheet_rows", [list(r) for r in rows], target=sheet_url)
+
+
+def stats() -> dict:
+    return quota.stats()
@@ -0,0 +1,466 @@
+# sheets_gateway.py
+"""
+Single entry point for Google Sheets calls.
+
+Every page, loader and script reads and writes Sheets through a gateway so
+that, per process:
+  * identical reads in flight at the same time are coalesced (single-flight):
+    forty students opening the same quiz link cost one get_all_records;
+  * reads and writes draw from token buckets sized to the Sheets per-minute
+    quota instead of bursting into 429s; reads a backend answers from its
+    cached handles (is_cached) take no token;
+  * 429 / 5xx / connection errors are retried with exponential backoff and
+    full jitter (Retry-After is honoured).
+
+    from sheets_gateway import get_gateway
+    gw = get_gateway()                                   # st.secrets service account
+    records = gw.get_all_records(register_url)           # first worksheet
+    ranges = gw.batch_get(bank_url, ["'Main'", "'Remedial'"])
+    gw.append_rows(responses_url, rows)
+    gw.stats()                                           # calls, coalesced, retries, ...
+
+The backend is gspread (through the cached handles in gsheets.py) unless
+SHEETS_BACKEND=fake is set (or [sheets] backend = "fake" in secrets), in
+which case an in-memory FakeSheetsBackend is used, seeded from the JSON file
+in SHEETS_FAKE_DATA ({url: {title: [[header...], [row...], ...]}}). That lets
+the whole app run and be load-tested offline; see
+benchmarks/bench_sheets_gateway.py.
+"""
+import json
+import logging
+import os
+import random
+import threading
+import time
+from collections import Counter
+
+log = logging.getLogger(__name__)
+
+READS_PER_MINUTE = 60      # Sheets: 60 read and 60 write requests/min per user
+WRITES_PER_MINUTE = 60
+MAX_ATTEMPTS = 5
+BASE_BACKOFF = 1.0
+MAX_BACKOFF = 32.0
+
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+
+# =============================================================
+# Error helpers (shared with sheet_writer.py)
+# =============================================================
+
+def status_code(exc):
+    """HTTP status of a gspread APIError (or fake equivalent), else None."""
+    response = getattr(exc, "response", None)
+    return getattr(response, "status_code", None) or getattr(exc, "code", None)
+
+
+def retry_after(exc):
+    response = getattr(exc, "response", None)
+    try:
+        return float(response.headers.get("Retry-After"))
+    except Exception:
+        return None
+
+
+def is_transient(exc) -> bool:
+    code = status_code(exc)
+    if code is not None:
+        return code in RETRY_STATUSES
+    return isinstance(exc, (ConnectionError, TimeoutError, OSError))
+
+
+# =============================================================
+# Rate limiting + single-flight
+# =============================================================
+
+class TokenBucket:
+    """Blocking token bucket; `per_minute` sustained, bursts up to `capacity`."""
+
+    def __init__(self, per_minute, capacity=None):
+        self.rate = max(per_minute, 1) / 60.0
+        self.capacity = float(capacity or max(1, min(per_minute, 10)))
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.waited = 0.0
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+                self.waited += wait
+            time.sleep(wait)
+
+
+class _Flight:
+    __slots__ = ("done", "result", "error", "followers")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+        self.followers = 0
+
+
+class SingleFlight:
+    """Concurrent calls with the same key share one execution of fn."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._flights = {}
+        self.coalesced = 0
+
+    def do(self, key, fn):
+        with self._lock:
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = _Flight()
+            else:
+                flight.followers += 1
+                self.coalesced += 1
+        if not leader:
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.result
+        try:
+            flight.result = fn()
+            return flight.result
+        except BaseException as e:
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                self._flights.pop(key, None)
+            flight.done.set()
+
+
+# =============================================================
+# Backends
+# =============================================================
+
+class GspreadBackend:
+    """Real Sheets through gsheets.py's cached client and handles."""
+
+    name = "gspread"
+
+    def __init__(self, service_account_info=None, service_account_file=None):
+        self.service_account_info = service_account_info
+        self.service_account_file = service_account_file
+
+    def _get_client(self):
+        from gsheets import get_client
+        return get_client(self.service_account_info, self.service_account_file)
+
+    def connect(self):
+        """Build (or reuse) the authorized client; raises on bad service-account credentials."""
+        self._get_client()
+
+    def titles(self, url):
+        from gsheets import list_worksheets
+        return [ws.title for ws in list_worksheets(url, client=self._get_client())]
+
+    def is_cached(self, op, args) -> bool:
+        """True when `op` is answered from gsheets.py's cached handles (no API request)."""
+        if op != "titles":
+            return False
+        from gsheets import is_cached
+        return is_cached(args[0])
+
+    def _ws(self, url, title):
+        from gsheets import get_worksheet
+        return get_worksheet(url, title, client=self._get_client())
+
+    def get_all_records(self, url, title=None):
+        return self._ws(url, title).get_all_records()
+
+    def get_all_values(self, url, title=None):
+        return self._ws(url, title).get_all_values()
+
+    def batch_get(self, url, ranges):
+        from gsheets import open_spreadsheet
+        resp = open_spreadsheet(url, client=self._get_client()).values_batch_get(list(ranges))
+        return [vr.get("values", []) for vr in resp.get("valueRanges", [])]
+
+    def append_rows(self, url, title, rows, value_input_option="USER_ENTERED"):
+        self._ws(url, title).append_rows(rows, value_input_option=value_input_option)
+
+
+class _FakeResponse:
+    def __init__(self, status_code, retry_after=None):
+        self.status_code = status_code
+        self.headers = {"Retry-After": str(retry_after)} if retry_after else {}
+
+
+class FakeAPIError(Exception):
+    """Shaped like gspread's APIError (exc.response.status_code) so retry paths are exercised."""
+
+    def __init__(self, status, message="", retry_after=None):
+        super().__init__(message or f"fake sheets error {status}")
+        self.response = _FakeResponse(status, retry_after)
+
+
+def _numericise(value):
+    """Same spirit as gspread's get_all_records: numeric strings become numbers."""
+    if not isinstance(value, str) or value.strip() == "":
+        return value
+    try:
+        return int(value)
+    except ValueError:
+        try:
+            return float(value)
+        except ValueError:
+            return value
+
+
+class FakeSheetsBackend:
+    """
+    In-memory spreadsheets: {url: {title: [[header...], [row...], ...]}}.
+
+    `latency` (seconds) is slept on every call and `error_rate` makes that
+    fraction of calls raise a 429, so load tests see realistic contention.
+    Ranges for batch_get are whole sheets ("Main" or "'Main'"). `calls`
+    counts backend calls by operation.
+    """
+
+    name = "fake"
+
+    def __init__(self, books=None, latency=0.0, error_rate=0.0):
+        self.books = {url: {t: [list(r) for r in rows] for t, rows in tabs.items()}
+                      for url, tabs in (books or {}).items()}
+        self.latency = latency
+        self.error_rate = error_rate
+        self.calls = Counter()
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_json(cls, path, **kwargs):
+        with open(path, "r", encoding="utf-8") as f:
+            return cls(json.load(f), **kwargs)
+
+    def _call(self, op):
+        with self._lock:
+            self.calls[op] += 1
+        if self.latency:
+            time.sleep(self.latency)
+        if self.error_rate and random.random() < self.error_rate:
+            raise FakeAPIError(429, "fake quota exceeded")
+
+    def _tab(self, url, title):
+        tabs = self.books.get(url)
+        if tabs is None:
+            raise FakeAPIError(404, f"no fake spreadsheet {url!r}")
+        if title is None:
+            return next(iter(tabs.values()))
+        wanted = title.strip().strip("'").replace("''", "'").lower()
+        for t, rows in tabs.items():
+            if t.strip().lower() == wanted:
+                return rows
+        raise FakeAPIError(400, f"no worksheet {title!r} in {url!r}")
+
+    def titles(self, url):
+        self._call("titles")
+        if url not in self.books:
+            raise FakeAPIError(404, f"no fake spreadsheet {url!r}")
+        return list(self.books[url])
+
+    def get_all_values(self, url, title=None):
+        self._call("get_all_values")
+        with self._lock:
+            return [[str(v) for v in r] for r in self._tab(url, title)]
+
+    def get_all_records(self, url, title=None):
+        self._call("get_all_records")
+        with self._lock:
+            rows = self._tab(url, title)
+            if not rows:
+                return []
+            header = [str(h) for h in rows[0]]
+            return [{h: _numericise(r[i] if i < len(r) else "") for i, h in enumerate(header)}
+                    for r in rows[1:]]
+
+    def batch_get(self, url, ranges):
+        self._call("batch_get")
+        with self._lock:
+            return [[[str(v) for v in r] for r in self._tab(url, rng)] for rng in ranges]
+
+    def append_rows(self, url, title, rows, value_input_option="USER_ENTERED"):
+        self._call("append_rows")
+        with self._lock:
+            tabs = self.books.setdefault(url, {})
+            if title is None and tabs:
+                tab = next(iter(tabs.values()))
+            else:
+                tab = tabs.setdefault(title or "Sheet1", [])
+            tab.extend([list(r) for r in rows])
+
+
+# =============================================================
+# Gateway
+# =============================================================
+
+class SheetsGateway:
+    def __init__(self, backend, reads_per_minute=READS_PER_MINUTE, writes_per_minute=WRITES_PER_MINUTE,
+                 max_attempts=MAX_ATTEMPTS):
+        self.backend = backend
+        self.read_bucket = TokenBucket(reads_per_minute)
+        self.write_bucket = TokenBucket(writes_per_minute)
+        self.max_attempts = max_attempts
+        self.flight = SingleFlight()
+        self._stats_lock = threading.Lock()
+        self.calls = Counter()
+        self.cache_hits = 0
+        self.retries = 0
+        self.errors = 0
+
+    def connect(self):
+        """
+        Check the backend can authenticate, so a bad service account fails here
+        rather than at the first read. Cheap once the client is cached.
+        """
+        connect = getattr(self.backend, "connect", None)
+        if connect is not None:
+            connect()
+        return self
+
+    # ---------- reads (coalesced) ----------
+    def titles(self, url):
+        return self._read("titles", (url,))
+
+    def get_all_records(self, url, title=None):
+        return self._read("get_all_records", (url, title))
+
+    def get_all_values(self, url, title=None):
+        return self._read("get_all_values", (url, title))
+
+    def batch_get(self, url, ranges):
+        """Values for each range (list of lists of strings), one request."""
+        return self._read("batch_get", (url, tuple(ranges)))
+
+    # ---------- writes (never coalesced) ----------
+    def append_rows(self, url, rows, title=None, value_input_option="USER_ENTERED", attempts=None):
+        """
+        Append rows in one request. `attempts=1` surfaces a 429 to the caller
+        immediately (sheet_writer.py defers the batch itself).
+        """
+        rows = [list(r) for r in rows]
+        if rows:
+            self._call(self.write_bucket, "append_rows", (url, title, rows, value_input_option), attempts)
+
+    def append_row(self, url, row, title=None, value_input_option="USER_ENTERED"):
+        self.append_rows(url, [row], title=title, value_input_option=value_input_option)
+
+    def stats(self) -> dict:
+        with self._stats_lock:
+            return {
+                "backend": self.backend.name,
+                "calls": dict(self.calls),
+                "coalesced": self.flight.coalesced,
+                "cache_hits": self.cache_hits,
+                "retries": self.retries,
+                "errors": self.errors,
+                "read_wait_seconds": round(self.read_bucket.waited, 3),
+                "write_wait_seconds": round(self.write_bucket.waited, 3),
+            }
+
+    # ---------- internals ----------
+    def _read(self, op, args):
+        # args are hashable (url, title / tuple of ranges): identical reads share one call
+        return self.flight.do((op,) + args, lambda: self._call(self.read_bucket, op, args))
+
+    def _call(self, bucket, op, args, attempts=None):
+        is_cached = getattr(self.backend, "is_cached", None)
+        if is_cached is not None and is_cached(op, args):
+            # answered from a cached handle: no API request, so no quota token
+            with self._stats_lock:
+                self.cache_hits += 1
+            return getattr(self.backend, op)(*args)
+        attempts = attempts or self.max_attempts
+        for attempt in range(1, attempts + 1):
+            bucket.acquire()
+            with self._stats_lock:
+                self.calls[op] += 1
+            try:
+                return getattr(self.backend, op)(*args)
+            except Exception as e:
+                if attempt >= attempts or not is_transient(e):
+                    with self._stats_lock:
+                        self.errors += 1
+                    raise
+                delay = retry_after(e) or random.uniform(0, min(MAX_BACKOFF, BASE_BACKOFF * 2 ** (attempt - 1)))
+                with self._stats_lock:
+                    self.retries += 1
+                log.warning("sheets %s failed (%r); retry %s/%s in %.1fs", op, e, attempt, attempts - 1, delay)
+                time.sleep(delay)
+
+
+# =============================================================
+# Process-wide gateways
+# =============================================================
+_gateways = {}
+_gateways_lock = threading.Lock()
+_backend_override = None
+
+
+def _configured_backend_name():
+    name = os.environ.get("SHEETS_BACKEND")
+    if not name:
+        try:
+            import streamlit as st
+            name = st.secrets.get("sheets", {}).get("backend")
+        except Exception:
+            name = None
+    return (name or "gspread").strip().lower()
+
+
+def _fake_from_config():
+    path = os.environ.get("SHEETS_FAKE_DATA")
+    if not path:
+        try:
+            import streamlit as st
+            path = st.secrets.get("sheets", {}).get("fake_data")
+        except Exception:
+            path = None
+    return FakeSheetsBackend.from_json(path) if path else FakeSheetsBackend()
+
+
+def use_backend(backend):
+    """Route every gateway in this process to `backend` (e.g. a FakeSheetsBackend)."""
+    global _backend_override
+    with _gateways_lock:
+        _backend_override = backend
+        _gateways.clear()
+
+
+def get_gateway(service_account_info=None, service_account_file=None) -> SheetsGateway:
+    """
+    Gateway for a service account (defaults to st.secrets["gcp_service_account"];
+    pass service_account_file for scripts such as register_bot.py).
+    """
+    if service_account_file:
+        key = ("file", service_account_file)
+    elif service_account_info is not None:
+        key = ("info", dict(service_account_info).get("client_email"))
+    else:
+        key = ("secrets", None)
+    global _backend_override
+    with _gateways_lock:
+        gw = _gateways.get(key)
+        if gw is None:
+            if _backend_override is None and _configured_backend_name() == "fake":
+                # one shared fake for every account, so writes are visible to every reader
+                _backend_override = _fake_from_config()
+            if _backend_override is not None:
+                backend = _backend_override
+            else:
+                backend = GspreadBackend(service_account_info, service_account_file)
+            gw = _gateways[key] = SheetsGateway(backend)
+        return gw
@@ -0,0 +1,398 @@
+# write_queue.py
+"""
+Durable, batching background writer (replaces per-save daemon threads).
+
+Jobs are spooled to a local SQLite file before enqueue() returns, so a
+crash or restart does not lose them. One writer thread per process claims
+due jobs, groups them by (kind, target) and hands each group to a batch
+handler in a single call, e.g. all pending quiz submissions become one
+save_bulk_responses() and all pending rows for one sheet one append_rows().
+Failed groups are retried per job with exponential backoff; jobs that keep
+failing are parked as "dead" (still in the spool) instead of being dropped.
+A handler can raise RetryLater(seconds) (e.g. on a rate limit) to push the
+whole group back without it counting as a failure, or PermanentError for a
+job that can never succeed (bad data), which is parked as "dead" at once. Kinds registered with a
+flush policy (flush_interval / flush_rows) are held until their oldest job
+is that old or that many rows are waiting, so e.g. sheet rows from many
+sessions go out as one append.
+
+    from write_queue import get_write_queue
+    wq = get_write_queue()
+    wq.enqueue("db_responses", {"rows": rows, "attempt": attempt})
+    wq.stats()   # depth, lag_seconds, dead, processed, failures, deferred, last_error
+"""
+import atexit
+import contextlib
+import json
+import logging
+import os
+import random
+import sqlite3
+import threading
+import time
+import uuid
+
+log = logging.getLogger(__name__)
+
+SPOOL_PATH = os.environ.get("WRITE_QUEUE_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), ".write_queue.sqlite3"))
+
+
+class QueueFull(Exception):
+    pass
+
+
+class PermanentError(Exception):
+    """Raised by a handler when retrying cannot help; the job goes straight to "dead"."""
+
+
+class RetryLater(Exception):
+    """Raised by a handler to defer its whole batch by `delay` seconds (not a failure)."""
+
+    def __init__(self, delay, reason=""):
+        super().__init__(reason or f"retry in {delay:.1f}s")
+        self.delay = delay
+
+
+class WriteQueue:
+    def __init__(self, path=SPOOL_PATH, max_pending=10000, batch_size=500, linger=0.5,
+                 base_backoff=2.0, max_backoff=300.0, max_attempts=8, claim_timeout=120.0):
+        self.path = path
+        self.max_pending = max_pending
+        self.batch_size = batch_size
+        self.linger = linger
+        self.base_backoff = base_backoff
+        self.max_backoff = max_backoff
+        self.max_attempts = max_attempts
+        self.claim_timeout = claim_timeout
+        self.worker_id = uuid.uuid4().hex
+        self._handlers = {}
+        self._policies = {}           # kind -> (flush_interval, flush_rows)
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+        self._start_lock = threading.Lock()
+        self.processed = 0
+        self.failures = 0
+        self.deferred = 0
+        self.last_error = None
+        self._init_spool()
+
+    # ---------- spool ----------
+    def _open(self):
+        conn = sqlite3.connect(self.path, timeout=30, isolation_level=None, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    @contextlib.contextmanager
+    def _connect(self):
+        conn = self._open()
+        try:
+            yield conn
+        finally:
+            conn.close()
+
+    def _init_spool(self):
+        with self._connect() as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS jobs (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    kind TEXT NOT NULL,
+                    target TEXT NOT NULL DEFAULT '',
+                    payload TEXT NOT NULL,
+                    created_at REAL NOT NULL,
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    next_attempt_at REAL NOT NULL,
+                    claimed_by TEXT,
+                    claimed_at REAL,
+                    status TEXT NOT NULL DEFAULT 'pending',
+                    last_error TEXT
+                )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS ix_jobs_due ON jobs (status, next_attempt_at)")
+            cols = {r[1] for r in conn.execute("PRAGMA table_info(jobs)")}
+            if "size" not in cols:
+                # rows carried by the job, for flush_rows (spools from before it existed)
+                conn.execute("ALTER TABLE jobs ADD COLUMN size INTEGER NOT NULL DEFAULT 1")
+
+    # ---------- public API ----------
+    def register_handler(self, kind, fn, flush_interval=None, flush_rows=None):
+        """
+        fn(target, payloads) writes a whole batch; raise to have every job retried.
+        With flush_interval/flush_rows, jobs of this kind wait (per target) until the
+        oldest is flush_interval seconds old or flush_rows rows are pending.
+        """
+        self._handlers[kind] = fn
+        if flush_interval or flush_rows:
+            self._policies[kind] = (flush_interval or 0.0, flush_rows or 0)
+        else:
+            self._policies.pop(kind, None)
+        self._wake.set()
+
+    def enqueue(self, kind, payload, target="", block_timeout=5.0):
+        """Persist one job and wake the writer. Raises QueueFull if the spool stays full."""
+        self._ensure_started()
+        deadline = time.monotonic() + block_timeout
+        while self.depth() >= self.max_pending:
+            if time.monotonic() >= deadline:
+                raise QueueFull(f"write queue has {self.max_pending} pending jobs")
+            self._wake.set()
+            time.sleep(0.1)
+        now = time.time()
+        size = len(payload) if isinstance(payload, list) else 1
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT INTO jobs (kind, target, payload, created_at, next_attempt_at, size) VALUES (?, ?, ?, ?, ?, ?)",
+                (kind, target or "", json.dumps(payload, default=str), now, now, size),
+            )
+        self._wake.set()
+
+    def depth(self) -> int:
+        with self._connect() as conn:
+            return conn.execute("SELECT COUNT(*) FROM jobs WHERE status = 'pending'").fetchone()[0]
+
+    def stats(self) -> dict:
+        with self._connect() as conn:
+            depth, oldest = conn.execute(
+                "SELECT COUNT(*), MIN(created_at) FROM jobs WHERE status = 'pending'"
+            ).fetchone()
+            dead = conn.execute("SELECT COUNT(*) FROM jobs WHERE status = 'dead'").fetchone()[0]
+        return {
+            "depth": depth,
+            "lag_seconds": (time.time() - oldest) if oldest else 0.0,
+            "dead": dead,
+            "processed": self.processed,
+            "failures": self.failures,
+            "deferred": self.deferred,
+            "last_error": self.last_error,
+        }
+
+    def flush(self, timeout=10.0) -> bool:
+        """Drain due jobs synchronously, ignoring flush policies (used at shutdown). True if nothing due is left."""
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            if not self._process_once(linger=False, force=True):
+                return True
+        return False
+
+    def stop(self, timeout=10.0):
+        self._stop.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+        self.flush(timeout)
+
+    # ---------- worker ----------
+    def _ensure_started(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._start_lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="write-queue", daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                worked = self._process_once(linger=True)
+            except Exception as e:  # never let the writer thread die
+                log.exception("write queue iteration failed")
+                self.last_error = repr(e)
+                worked = False
+            if not worked:
+                self._wake.wait(1.0)
+                self._wake.clear()
+
+    def _held_groups(self, conn, now):
+        """(kind, target) groups under a flush policy that aren't due to flush yet."""
+        if not self._policies:
+            return []
+        kinds = list(self._policies)
+        marks = ",".join("?" * len(kinds))
+        held = []
+        for kind, target, oldest, rows in conn.execute(
+            f"""SELECT kind, target, MIN(created_at), SUM(size) FROM jobs
+                WHERE status = 'pending' AND next_attempt_at <= ? AND kind IN ({marks})
+                GROUP BY kind, target""",
+            [now, *kinds],
+        ):
+            interval, max_rows = self._policies[kind]
+            due = (interval and now - oldest >= interval) or (max_rows and rows >= max_rows)
+            if not due:
+                held.append((kind, target))
+        return held
+
+    def _claim(self, force=False):
+        now = time.time()
+        kinds = list(self._handlers)
+        if not kinds:
+            return []
+        marks = ",".join("?" * len(kinds))
+        conn = self._open()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            held = [] if force else self._held_groups(conn, now)
+            hold_sql = "".join(" AND NOT (kind = ? AND target = ?)" for _ in held)
+            rows = conn.execute(
+                f"""SELECT id, kind, target, payload, attempts FROM jobs
+                    WHERE status = 'pending' AND next_attempt_at <= ? AND kind IN ({marks})
+                      AND (claimed_by IS NULL OR claimed_at < ?){hold_sql}
+                    ORDER BY id LIMIT ?""",
+                [now, *kinds, now - self.claim_timeout, *[v for g in held for v in g], self.batch_size],
+            ).fetchall()
+            if rows:
+                conn.executemany(
+                    "UPDATE jobs SET claimed_by = ?, claimed_at = ? WHERE id = ?",
+                    [(self.worker_id, now, r[0]) for r in rows],
+                )
+            conn.execute("COMMIT")
+            return rows
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        finally:
+            conn.close()
+
+    def _process_once(self, linger, force=False) -> bool:
+        if linger and self.linger:
+            # let concurrent submissions pile up so they share one write
+            time.sleep(self.linger)
+        jobs = self._claim(force)
+        if not jobs:
+            return False
+        groups = {}
+        for job_id, kind, target, payload, attempts in jobs:
+            groups.setdefault((kind, target), []).append((job_id, json.loads(payload), attempts))
+        with self._heartbeat([j[0] for j in jobs]):
+            self._run_groups(groups)
+        return True
+
+    @contextlib.contextmanager
+    def _heartbeat(self, ids):
+        """
+        Keep our claim on `ids` fresh while the handlers run. An append that sits
+        in quota back-off can outlast claim_timeout; without this another worker
+        would re-claim the jobs and write the same (non-idempotent) sheet rows again.
+        """
+        done = threading.Event()
+
+        def beat():
+            while not done.wait(self.claim_timeout / 3):
+                try:
+                    with self._connect() as conn:
+                        conn.executemany(
+                            "UPDATE jobs SET claimed_at = ? WHERE id = ? AND claimed_by = ?",
+                            [(time.time(), i, self.worker_id) for i in ids],
+                        )
+                except Exception:
+                    log.exception("write queue claim heartbeat failed")
+
+        t = threading.Thread(target=beat, name="write-queue-heartbeat", daemon=True)
+        t.start()
+        try:
+            yield
+        finally:
+            done.set()
+            t.join()
+
+    def _run_groups(self, groups):
+        for (kind, target), items in groups.items():
+            handler = self._handlers[kind]
+            try:
+                handler(target, [p for _, p, _ in items])
+                self._done([i[0] for i in items])
+            except RetryLater as e:
+                self._defer([i[0] for i in items], e.delay)
+            except Exception as e:
+                if len(items) == 1:
+                    self._failed(items[0], e)
+                    continue
+                # isolate the bad job(s): retry the group one job at a time
+                for item in items:
+                    try:
+                        handler(target, [item[1]])
+                        self._done([item[0]])
+                    except RetryLater as e1:
+                        self._defer([item[0]], e1.delay)
+                    except Exception as e1:
+                        self._failed(item, e1)
+
+    def _done(self, ids):
+        with self._connect() as conn:
+            conn.executemany("DELETE FROM jobs WHERE id = ?", [(i,) for i in ids])
+        self.processed += len(ids)
+
+    def _defer(self, ids, delay):
+        self.deferred += len(ids)
+        with self._connect() as conn:
+            conn.executemany(
+                "UPDATE jobs SET next_attempt_at = ?, claimed_by = NULL, claimed_at = NULL WHERE id = ?",
+                [(time.time() + delay, i) for i in ids],
+            )
+
+    def _failed(self, item, exc):
+        job_id, _, attempts = item
+        attempts += 1
+        self.failures += 1
+        self.last_error = repr(exc)
+        log.warning("write job %s failed (attempt %s): %r", job_id, attempts, exc)
+        delay = min(self.max_backoff, self.base_backoff * (2 ** (attempts - 1)))
+        delay *= random.uniform(0.8, 1.2)
+        status = "dead" if attempts >= self.max_attempts or isinstance(exc, PermanentError) else "pending"
+        with self._connect() as conn:
+            conn.execute(
+                """UPDATE jobs SET attempts = ?, next_attempt_at = ?, status = ?, last_error = ?,
+                       claimed_by = NULL, claimed_at = NULL WHERE id = ?""",
+                (attempts, time.time() + delay, status, repr(exc)[:2000], job_id),
+            )
+
+
+# =============================================================
+# Built-in handlers
+# =============================================================
+
+def _save_responses_batch(target, payloads):
+    """
+    Coalesce queued submissions into one save_submissions transaction.
+    A payload is {"rows": [...], "bank": ..., "attempt": {...}} or, from older spools, a bare list of rows.
+    """
+    from sqlalchemy.exc import DataError, IntegrityError
+    from db import save_submissions, _is_duplicate_key
+    submissions = [p if isinstance(p, dict) else {"rows": p} for p in payloads]
+    if not submissions:
+        return
+    try:
+        save_submissions(submissions)
+    except DataError as e:
+        raise PermanentError(f"bad response data: {e.orig!r}") from e
+    except IntegrityError as e:
+        if _is_duplicate_key(e):
+            raise   # a concurrent writer won a race; the retry skips what it saved
+        raise PermanentError(f"response rows violate a constraint: {e.orig!r}") from e
+
+
+def _append_sheet_rows_batch(target, payloads):
+    """All queued rows for one spreadsheet in a single append_rows (see sheet_writer.py)."""
+    from sheet_writer import append_rows
+    append_rows(target, [row for payload in payloads for row in payload])
+
+
+# =============================================================
+# Process-wide singleton
+# =============================================================
+_queue = None
+_queue_lock = threading.Lock()
+
+
+def get_write_queue() -> WriteQueue:
+    global _queue
+    if _queue is None:
+        with _queue_lock:
+            if _queue is None:
+                _queue = WriteQueue()
+                _queue.register_handler("db_responses", _save_responses_batch)
+                from sheet_writer import FLUSH_INTERVAL, FLUSH_ROWS
+                _queue.register_handler("sheet_rows", _append_sheet_rows_batch,
+                                        flush_interval=FLUSH_INTERVAL, flush_rows=FLUSH_ROWS)
+                atexit.register(_queue.stop)
+    return _queue